@@ -0,0 +1,89 @@
+from .runner import (
+    HISTORY_PATH, BASELINE_PATH, run_benchmarks, read_history, append_to_history, read_json, write_json, compare_runs, format_time, format_memory
+)
+
+import argparse
+import fnmatch
+import sys
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Microbenchmarks, scaling benchmarks and import times of the beam shaping code.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List the benchmarks.")
+    list_parser.add_argument("patterns", nargs="*", help="Only list the benchmarks whose names match one of these glob patterns.")
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and append the results to the history.")
+    run_parser.add_argument("patterns", nargs="*", help="Only run the benchmarks whose names match one of these glob patterns, e.g. 'scaling.*'.")
+    run_parser.add_argument("--group", choices=["micro", "scaling", "import"], help="Only run the benchmarks of this group.")
+    run_parser.add_argument("--repeat", type=int, default=5, help="The number of timing loops per benchmark.")
+    run_parser.add_argument("--min-time", type=float, default=0.05, help="The shortest duration of a timing loop in s.")
+    run_parser.add_argument("--history", default=HISTORY_PATH, help="The JSON file the runs are appended to.")
+    run_parser.add_argument("--save-baseline", action="store_true", help="Also store the run as the baseline.")
+    run_parser.add_argument("--baseline", default=BASELINE_PATH, help="The JSON file of the baseline.")
+
+    baseline_parser = commands.add_parser("baseline", help="Store a run of the history as the baseline.")
+    baseline_parser.add_argument("--run", type=int, default=-1, help="The index of the run in the history, by default the latest one.")
+    baseline_parser.add_argument("--history", default=HISTORY_PATH)
+    baseline_parser.add_argument("--baseline", default=BASELINE_PATH)
+
+    compare_parser = commands.add_parser("compare", help="Compare a run of the history to the baseline; the exit code is 1 if any benchmark regressed.")
+    compare_parser.add_argument("--run", type=int, default=-1, help="The index of the run in the history, by default the latest one.")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="The relative increase of the fastest time flagged as a regression.")
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.1, help="The relative increase of the peak memory flagged as a regression.")
+    compare_parser.add_argument("--history", default=HISTORY_PATH)
+    compare_parser.add_argument("--baseline", default=BASELINE_PATH)
+
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for benchmark in _get_benchmarks(args.patterns):
+            print(f"{benchmark.name:<40} {benchmark.group:<8} {benchmark.params}")
+    elif args.command == "run":
+        benchmarks = _get_benchmarks(args.patterns, args.group)
+        if not benchmarks:
+            print("No benchmark matches the patterns.", file=sys.stderr)
+            return 2
+        report = lambda name, result: print(
+            f"{name:<40} {format_time(result['median']):>10} (min {format_time(result['min'])}, {result['number']} x {result['repeat']})"
+            f" {format_memory(result['peak_memory']):>10}", flush=True
+        )
+        run = run_benchmarks(benchmarks, args.repeat, args.min_time, report)
+        append_to_history(run, args.history)
+        if args.save_baseline:
+            write_json(run, args.baseline)
+    elif args.command == "baseline":
+        history = read_history(args.history)
+        if not history:
+            print(f"The history {args.history} has no runs.", file=sys.stderr)
+            return 2
+        write_json(history[args.run], args.baseline)
+    elif args.command == "compare":
+        history = read_history(args.history)
+        if not history:
+            print(f"The history {args.history} has no runs.", file=sys.stderr)
+            return 2
+        baseline, run = read_json(args.baseline), history[args.run]
+        print(f"Baseline {baseline['timestamp']} ({baseline['commit']}) vs run {run['timestamp']} ({run['commit']})")
+        comparisons = compare_runs(baseline, run, args.threshold, args.memory_threshold)
+        for c in comparisons:
+            flags = " ".join(flag for flag, regressed in [("TIME", c["time_regression"]), ("MEMORY", c["memory_regression"])] if regressed)
+            print(
+                f"{c['name']:<40} {format_time(c['baseline_time']):>10} -> {format_time(c['time']):>10} ({c['time_ratio']:5.2f}x)"
+                f" {format_memory(c['baseline_peak_memory']):>10} -> {format_memory(c['peak_memory']):>10} ({c['memory_ratio']:5.2f}x) {flags}"
+            )
+        regressions = [c for c in comparisons if c["time_regression"] or c["memory_regression"]]
+        print(f"{len(regressions)} of {len(comparisons)} benchmarks regressed.")
+        return 1 if regressions else 0
+    return 0
+
+def _get_benchmarks(patterns: list, group: str = None) -> list:
+    # The benchmarks import the package only when they are requested, so that the command line stays responsive
+    from .cases import get_benchmarks
+    return [
+        b for b in get_benchmarks()
+        if (not patterns or any(fnmatch.fnmatchcase(b.name, p) for p in patterns)) and (group is None or b.group == group)
+    ]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+from .runner import Benchmark
+from modules.elliptical_gaussian_beam_shape import (
+    EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble, CylindricalLens, SphericalLens, OpticalTable
+)
+
+from typing import List
+import numpy as np
+import subprocess
+import itertools
+import sys
+import os
+
+WAVELENGTH = 1064e-9 # The wavelength of every beam and lens in m
+TABLE_SIZES = (4, 16, 64, 256) # The numbers of nodes of the chains
+BRANCHING_FACTORS = (1, 2, 3, 4) # The numbers of children of every node of the trees
+TREE_DEPTH = 4 # The number of levels of edges of the trees
+BATCH_SIZES = (1, 64, 4096, 65536) # The numbers of beams of the ensembles
+IMAGE_SIZES = (64, 256, 1024) # The side lengths of the images in pixels
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The statements whose import time is measured in a new interpreter, as in a newly spawned worker process
+IMPORT_STATEMENTS = {
+    "python": "pass",
+    "modules.elliptical_gaussian_beam_shape": "import modules.elliptical_gaussian_beam_shape",
+    "toolkits.configs": "import toolkits.configs",
+    "toolkits.configs.Addresses": "from toolkits.configs import Addresses",
+    "toolkits.plotting_helper": "import toolkits.plotting_helper",
+    "toolkits.plotting_helper.ImagePlotter": "from toolkits.plotting_helper import ImagePlotter"
+}
+
+def get_benchmarks() -> List[Benchmark]:
+    """Returns every benchmark: the microbenchmarks of the single operations, the scaling benchmarks, and the import times."""
+    return [
+        Benchmark("beam.evolve", _setup_beam_evolve),
+        Benchmark("beam.apply_elliptical_lens", _setup_beam_apply_lens),
+        Benchmark("beam.get_beam_shape", _setup_beam_get_beam_shape),
+        Benchmark("table.evolve_beams", lambda: _setup_table_evolve_beams(_get_chain_table(16)), params={"n_nodes": 16}),
+        Benchmark("table.evolve_beams.incremental", lambda: _setup_table_tune_lens(_get_chain_table(16)), params={"n_nodes": 16}),
+        Benchmark("plotting.ImagePlotter.draw", lambda: _setup_image_plotter_draw(256), params={"image_size": 256}),
+        *[
+            Benchmark(f"scaling.table_size[{n}]", lambda n=n: _setup_table_evolve_beams(_get_chain_table(n)), "scaling", {"n_nodes": n})
+            for n in TABLE_SIZES
+        ],
+        *[
+            Benchmark(
+                f"scaling.branching_factor[{b}]", lambda b=b: _setup_table_evolve_beams(_get_tree_table(b, TREE_DEPTH)), "scaling",
+                {"branching_factor": b, "depth": TREE_DEPTH}
+            )
+            for b in BRANCHING_FACTORS
+        ],
+        *[
+            Benchmark(f"scaling.batch_size[{n}]", lambda n=n: _setup_ensemble_step(n), "scaling", {"n_beams": n})
+            for n in BATCH_SIZES
+        ],
+        *[
+            Benchmark(f"scaling.image_size[{n}]", lambda n=n: _setup_image_plotter_draw(n), "scaling", {"image_size": n})
+            for n in IMAGE_SIZES
+        ],
+        *[
+            Benchmark(f"import.{name}", lambda statement=statement: _setup_import(statement), "import", {"statement": statement})
+            for name, statement in IMPORT_STATEMENTS.items()
+        ]
+    ]
+
+def _get_beam() -> EllipticalGaussianBeam:
+    return EllipticalGaussianBeam(0, 0.1, 0.15, 0.3, 300e-6, 200e-6, WAVELENGTH)
+
+def _get_chain_table(n_nodes: int) -> OpticalTable:
+    """Returns a table of n_nodes in a row, 5 cm apart, with alternating cylindrical and spherical lenses and one beam path."""
+    table = OpticalTable()
+    ids = [table.add_node(f"n{i}") for i in range(n_nodes)]
+    for i, id in enumerate(ids):
+        lens = CylindricalLens(0.1 * i, WAVELENGTH, 0.2) if i % 2 == 0 else SphericalLens(WAVELENGTH, 0.25)
+        table.get_node(id).add_elliptical_lens(lens)
+    for id1, id2 in zip(ids[:-1], ids[1:]):
+        table.connect_two_nodes(id1, id2, 0.05)
+    table.add_beam_path(_get_beam(), ids[0])
+    return table
+
+def _get_tree_table(branching_factor: int, depth: int) -> OpticalTable:
+    """Returns a table whose nodes each split into branching_factor nodes down to the given depth, e.g. a chain of beam splitters,
+    with a lens at every node and one beam path from the root."""
+    table = OpticalTable()
+    level = [table.add_node("n")]
+    for d in range(depth):
+        next_level = []
+        for id in level:
+            for k in range(branching_factor):
+                child = table.add_node(f"{id}_{k}")
+                table.get_node(child).add_elliptical_lens(CylindricalLens(0.2 * k, WAVELENGTH, 0.2 + 0.05 * d))
+                table.connect_two_nodes(id, child, 0.05 + 0.01 * k)
+                next_level.append(child)
+        level = next_level
+    table.add_beam_path(_get_beam(), "n")
+    return table
+
+def _setup_beam_evolve():
+    beam = _get_beam()
+    return lambda: beam.evolve(1e-3)
+
+def _setup_beam_apply_lens():
+    beam, lens = _get_beam(), CylindricalLens(0.3, WAVELENGTH, 0.2)
+    return lambda: beam.apply_elliptical_lens(lens)
+
+def _setup_beam_get_beam_shape():
+    beam = _get_beam()
+    B_mat = beam.B_mat
+
+    def get_beam_shape():
+        # Setting the matrix clears the cached shape, so that every call computes it again
+        beam.B_mat = B_mat
+        return beam.get_beam_shape()
+    return get_beam_shape
+
+def _setup_table_evolve_beams(table: OpticalTable):
+    """Measures the full evaluation of a table, as after adding a node, including the compilation of its plan."""
+    def evolve_beams():
+        table._invalidate_plan()
+        table.evolve_beams()
+    return evolve_beams
+
+def _setup_table_tune_lens(table: OpticalTable):
+    """Measures the incremental evaluation of a table after tuning the lens of its middle node."""
+    table.evolve_beams()
+    lens = table.nodes[len(table.nodes) // 2].elliptical_lenses[0]
+    focal_lengths = itertools.cycle([0.21, 0.2])
+
+    def tune_lens():
+        lens.set_focal_lengths(fx=next(focal_lengths))
+        table.evolve_beams()
+    return tune_lens
+
+def _setup_ensemble_step(n_beams: int):
+    """Measures one step of a batch of beams: free space, a lens and the beam shapes."""
+    rng = np.random.default_rng(0)
+    ensemble = EllipticalGaussianBeamEnsemble(
+        0, rng.uniform(-0.1, 0.1, n_beams), rng.uniform(-0.1, 0.1, n_beams), rng.uniform(0, np.pi, n_beams),
+        rng.uniform(100e-6, 300e-6, n_beams), rng.uniform(100e-6, 300e-6, n_beams), WAVELENGTH
+    )
+    lens = CylindricalLens(0.3, WAVELENGTH, 0.2)
+
+    def step():
+        ensemble.evolve(1e-3)
+        ensemble.apply_elliptical_lens(lens)
+        return ensemble.get_beam_shapes()
+    return step
+
+def _setup_image_plotter_draw(image_size: int):
+    """Measures drawing and rendering an image on a new figure, as the images are drawn in practice."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import logging
+    from toolkits.plotting_helper import ImagePlotter, getStylishFigureAxes
+
+    # The style asks for fonts that are usually not installed, which would be reported on every call
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+    x = np.linspace(-1, 1, image_size)
+    image = np.exp(-(x[:, None]**2 + 2 * x[None, :]**2) / 0.2)
+
+    def draw():
+        fig, ax = getStylishFigureAxes(1, 1)
+        ImagePlotter(fig, ax, image, pixel_extent=(0, 1e-3, 0, 1e-3)).draw()
+        fig.canvas.draw()
+        plt.close(fig)
+    return draw
+
+def _setup_import(statement: str):
+    """Measures starting a new interpreter that runs an import statement from the root of the repository; the time of the
+    interpreter alone is the import.python benchmark."""
+    command = [sys.executable, "-c", statement]
+    return lambda: subprocess.run(command, cwd=REPOSITORY_DIRECTORY, check=True)
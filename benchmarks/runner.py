@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from typing import Callable, List
+from datetime import datetime, timezone
+import numpy as np
+import subprocess
+import tracemalloc
+import platform
+import time
+import json
+import os
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "results")
+HISTORY_PATH = os.path.join(RESULTS_DIRECTORY, "history.json")
+BASELINE_PATH = os.path.join(RESULTS_DIRECTORY, "baseline.json")
+MAX_NUMBER = 2**20 # The largest number of calls per timing loop
+
+@dataclass
+class Benchmark:
+    """A benchmark of one operation. setup builds the inputs outside of the measurement and returns the callable to measure,
+    which is called many times in a row, so it has to leave its inputs in a state in which it can be called again."""
+
+    name: str
+    setup: Callable[[], Callable]
+    group: str = "micro" # Either "micro" for single operations, "scaling" for an operation over a range of sizes, or "import"
+    params: dict = field(default_factory=dict) # The sizes of the inputs, recorded with the results
+
+
+def measure(benchmark: Benchmark, repeat: int = 5, min_time: float = 0.05) -> dict:
+    """Measures the wall time per call and the peak memory of one call of a benchmark.
+
+    The number of calls per timing loop is doubled until a loop takes at least min_time, so that the resolution of the clock
+    does not matter for fast operations, and the loop is then repeated. Other processes only ever slow a loop down, so the
+    fastest loop is the most reproducible time and the one that runs are compared by (c.f. compare_runs). The memory is
+    measured separately with tracemalloc, which slows down allocations, over a single call.
+
+    Args:
+        benchmark (Benchmark): The benchmark to measure.
+        repeat (int): The number of timing loops.
+        min_time (float): The shortest duration of a timing loop in s.
+
+    Returns:
+        dict: The times per call in s (median, min, max), the number of calls per loop, and the peak memory in bytes.
+    """
+    assert repeat > 0, f"The number of repeats must be positive, got {repeat}."
+    function = benchmark.setup()
+    function() # Warm up the caches and lazy imports
+
+    def time_loop(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        return time.perf_counter() - start
+
+    number = 1
+    elapsed = time_loop(number)
+    while elapsed < min_time and number < MAX_NUMBER:
+        number *= 2
+        elapsed = time_loop(number)
+    times = np.array([elapsed] + [time_loop(number) for _ in range(repeat - 1)]) / number
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "group": benchmark.group,
+        "params": benchmark.params,
+        "median": float(np.median(times)),
+        "min": float(times.min()),
+        "max": float(times.max()),
+        "number": number,
+        "repeat": repeat,
+        "peak_memory": peak_memory
+    }
+
+def run_benchmarks(benchmarks: List[Benchmark], repeat: int = 5, min_time: float = 0.05, report: Callable = None) -> dict:
+    """Measures a list of benchmarks (c.f. measure) and returns them as a run, with the environment they were measured in.
+    report is called with the name and the results of every benchmark as soon as it is measured."""
+    results = {}
+    for benchmark in benchmarks:
+        results[benchmark.name] = measure(benchmark, repeat, min_time)
+        if report is not None:
+            report(benchmark.name, results[benchmark.name])
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _get_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+
+def read_history(path: str = HISTORY_PATH) -> list:
+    """Returns the runs of a history file in the order they were recorded, or an empty list if it does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as file:
+        return json.load(file)["runs"]
+
+def append_to_history(run: dict, path: str = HISTORY_PATH):
+    write_json({"runs": read_history(path) + [run]}, path)
+
+def read_json(path: str) -> dict:
+    with open(path, "r") as file:
+        return json.load(file)
+
+def write_json(data: dict, path: str):
+    """Writes a JSON file through a temporary file, so that an interrupted run never leaves a truncated history behind."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w") as file:
+        json.dump(data, file, indent=1)
+    os.replace(path + ".tmp", path)
+
+def compare_runs(baseline: dict, run: dict, threshold: float = 0.1, memory_threshold: float = 0.1) -> list:
+    """Compares the benchmarks that two runs have in common.
+
+    Args:
+        baseline (dict): The reference run.
+        run (dict): The run to check.
+        threshold (float): The relative increase of the fastest time above which a benchmark is flagged as a regression.
+        memory_threshold (float): The relative increase of the peak memory above which a benchmark is flagged as a regression.
+
+    Returns:
+        list: One dict per common benchmark, with the times and peak memories of both runs, their ratios, and whether
+            the time or the memory regressed.
+    """
+    comparisons = []
+    for name, result in run["results"].items():
+        if name not in baseline["results"]:
+            continue
+        reference = baseline["results"][name]
+        time_ratio = result["min"] / reference["min"]
+        memory_ratio = (result["peak_memory"] + 1) / (reference["peak_memory"] + 1)
+        comparisons.append({
+            "name": name,
+            "baseline_time": reference["min"],
+            "time": result["min"],
+            "time_ratio": time_ratio,
+            "baseline_peak_memory": reference["peak_memory"],
+            "peak_memory": result["peak_memory"],
+            "memory_ratio": memory_ratio,
+            "time_regression": time_ratio > 1 + threshold,
+            "memory_regression": memory_ratio > 1 + memory_threshold
+        })
+    return comparisons
+
+def format_time(t: float) -> str:
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if t >= scale:
+            return f"{t / scale:.3g} {unit}"
+    return f"{t / 1e-9:.3g} ns"
+
+def format_memory(m: int) -> str:
+    for unit, scale in [("GiB", 2**30), ("MiB", 2**20), ("KiB", 2**10)]:
+        if m >= scale:
+            return f"{m / scale:.3g} {unit}"
+    return f"{m} B"
+
+def _get_commit() -> str:
+    """Returns the git commit of the repository, with a trailing + if the tree has uncommitted changes, or None outside of git."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if status.strip() else "")
@@ -4,14 +4,51 @@ from .spherical_lens import SphericalLens
 from .optical_table import OpticalTable, Node
 
 from .beam import EllipticalGaussianBeam
-from .beam_shape import BeamShape
+from .beam_ensemble import EllipticalGaussianBeamEnsemble
+from .beam_shape import BeamShape, BeamShapeArray, unwrap_orientation
+from .lens_pair_sweep import LensPairSweep, sweep_cylindrical_lens_pair
+from .lens_pair_solver import LensPairSolution, solve_cylindrical_lens_pair
+from .storage import save_beam_shapes, load_beam_shapes, render_intensity_to_file
+from .chunked_array import ChunkedArrayWriter, open_array
+from .beam_profiler import BeamProfile, profile_images
+from .caustic_fit import CausticFit, fit_caustics
+from .edge_extrema import EdgeExtrema
+from .tolerance_analysis import ToleranceAnalysis, analyze_tolerances
+from .instrumentation import Profile, profile
+from .table_storage import TableCache, save_table, load_table, read_table_header, get_table_hash
 
 __all__ = [
     "EllipticalLens",
     "CylindricalLens",
     "SphericalLens",
     "EllipticalGaussianBeam",
+    "EllipticalGaussianBeamEnsemble",
     "BeamShape",
+    "BeamShapeArray",
+    "unwrap_orientation",
+    "LensPairSweep",
+    "sweep_cylindrical_lens_pair",
+    "LensPairSolution",
+    "solve_cylindrical_lens_pair",
+    "save_beam_shapes",
+    "load_beam_shapes",
+    "render_intensity_to_file",
+    "ChunkedArrayWriter",
+    "open_array",
+    "BeamProfile",
+    "profile_images",
+    "CausticFit",
+    "fit_caustics",
+    "EdgeExtrema",
+    "ToleranceAnalysis",
+    "analyze_tolerances",
+    "Profile",
+    "profile",
+    "TableCache",
+    "save_table",
+    "load_table",
+    "read_table_header",
+    "get_table_hash",
     "OpticalTable",
     "Node"
 ]
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""Closed-form linear algebra kernels for stacks of 2x2 matrices.
+
+Every beam quantity in this package is a 2x2 matrix, for which the general LAPACK routines of numpy.linalg
+spend most of their time in dispatch. The functions below operate on arrays with the shape (..., 2, 2),
+broadcast over all the leading axes and work for both real and complex inputs.
+
+A single 2x2 matrix, e.g. the state of one EllipticalGaussianBeam, is handled with plain Python arithmetic on its
+four entries instead, since the elementwise array operations of the stacked kernels cost more than the arithmetic itself.
+"""
+from . import instrumentation
+
+import numpy as np
+import cmath
+import math
+
+def det2(A: np.ndarray) -> np.ndarray:
+    """Determinants of a stack of 2x2 matrices with the shape (..., 2, 2)."""
+    return A[..., 0, 0] * A[..., 1, 1] - A[..., 0, 1] * A[..., 1, 0]
+
+def inv2(A: np.ndarray) -> np.ndarray:
+    """Inverses of a stack of 2x2 matrices with the shape (..., 2, 2), computed from the adjugate.
+    A single singular matrix raises numpy.linalg.LinAlgError, as numpy.linalg.inv does."""
+    if instrumentation._active is not None:
+        instrumentation._active._add_call("inv2", A)
+    if A.ndim == 2:
+        (a, b), (c, d) = A.tolist()
+        det = a * d - b * c
+        if det == 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+        return np.array([[d / det, -b / det], [-c / det, a / det]], dtype=np.result_type(A, np.float64))
+
+    d = det2(A)
+    Ainv = np.empty(np.shape(A), dtype=np.result_type(A, np.float64))
+    Ainv[..., 0, 0] = A[..., 1, 1] / d
+    Ainv[..., 0, 1] = -A[..., 0, 1] / d
+    Ainv[..., 1, 0] = -A[..., 1, 0] / d
+    Ainv[..., 1, 1] = A[..., 0, 0] / d
+    return Ainv
+
+def eigvals2(A: np.ndarray):
+    """Eigenvalues of a stack of 2x2 matrices with the shape (..., 2, 2), returned as two complex arrays with the shape (...).
+    The matrices do not need to be Hermitian (e.g. the complex symmetric B matrices)."""
+    if instrumentation._active is not None:
+        instrumentation._active._add_call("eigvals2", A)
+    if A.ndim == 2:
+        (a, b), (c, d) = A.tolist()
+        m, r = (a + d) / 2, cmath.sqrt(((a - d) / 2)**2 + b * c)
+        return np.complex128(m - r), np.complex128(m + r)
+
+    m = (A[..., 0, 0] + A[..., 1, 1]) / 2
+    r = np.sqrt((((A[..., 0, 0] - A[..., 1, 1]) / 2)**2 + A[..., 0, 1] * A[..., 1, 0]).astype(np.complex128))
+    return m - r, m + r
+
+def eigh2(S: np.ndarray):
+    """Eigendecomposition of a stack of real symmetric 2x2 matrices with the shape (..., 2, 2).
+
+    Only the upper triangle of S is used. The eigenvalues are returned in ascending order with the shape (..., 2),
+    and the eigenvectors as the columns of an array with the shape (..., 2, 2), matching numpy.linalg.eigh.
+    Degenerate (circular) matrices return the reference axes as their eigenvectors.
+    """
+    if instrumentation._active is not None:
+        instrumentation._active._add_call("eigh2", S)
+    if S.ndim == 2:
+        (a, b), (_, c) = S.tolist()
+        lambda_1, lambda_2, vx, vy = _eigh2_scalar(a, b, c)
+        return np.array([lambda_1, lambda_2]), np.array([[-vy, vx], [vx, vy]])
+
+    a, b, c = S[..., 0, 0], S[..., 0, 1], S[..., 1, 1]
+    m = (a + c) / 2
+    h = (a - c) / 2
+    r = np.hypot(h, b)
+
+    # The eigenvector of the larger eigenvalue is (b, r - h) or (r + h, b); the one with the larger norm is used to avoid
+    # cancellation, and the reference x axis is used for degenerate (circular) matrices
+    use_first = h <= 0
+    vx = np.where(use_first, b, r + h)
+    vy = np.where(use_first, r - h, b)
+    norm = np.hypot(vx, vy)
+    degenerate = norm == 0
+    vx, vy = np.where(degenerate, 1, vx / np.where(degenerate, 1, norm)), np.where(degenerate, 0, vy / np.where(degenerate, 1, norm))
+
+    eigenvalues = np.stack([m - r, m + r], axis=-1)
+    eigenvectors = np.stack([
+        np.stack([-vy, vx], axis=-1),
+        np.stack([vx, vy], axis=-1)
+    ], axis=-1)
+    return eigenvalues, eigenvectors
+
+def eigvalsh2(S: np.ndarray) -> np.ndarray:
+    """Eigenvalues of a stack of real symmetric 2x2 matrices in ascending order, with the shape (..., 2)."""
+    if instrumentation._active is not None:
+        instrumentation._active._add_call("eigvalsh2", S)
+    if S.ndim == 2:
+        (a, b), (_, c) = S.tolist()
+        m, r = (a + c) / 2, math.hypot((a - c) / 2, b)
+        return np.array([m - r, m + r])
+
+    m = (S[..., 0, 0] + S[..., 1, 1]) / 2
+    r = np.hypot((S[..., 0, 0] - S[..., 1, 1]) / 2, S[..., 0, 1])
+    return np.stack([m - r, m + r], axis=-1)
+
+def _eigh2_scalar(a: float, b: float, c: float) -> tuple:
+    """eigh2 of the single symmetric matrix [[a, b], [b, c]] in plain Python arithmetic. Returns the eigenvalues in ascending
+    order and the unit eigenvector (vx, vy) of the larger one; the eigenvector of the smaller one is (-vy, vx)."""
+    m, h = (a + c) / 2, (a - c) / 2
+    r = math.hypot(h, b)
+    vx, vy = (b, r - h) if h <= 0 else (r + h, b)
+    norm = math.hypot(vx, vy)
+    if norm == 0:
+        return m - r, m + r, 1.0, 0.0
+    return m - r, m + r, vx / norm, vy / norm
@@ -1,7 +1,72 @@
 import numpy as np
-import numpy.linalg as la
 from .elliptical_lens import EllipticalLens
-from .beam_shape import BeamShape
+from .beam_shape import BeamShape, BeamShapeArray, unwrap_orientation
+from ._linalg import inv2, eigh2, eigvals2, _eigh2_scalar
+from . import instrumentation
+import math
+
+GOUY_PHASE_STEP = np.pi / 16 # The step of the Gouy phase of the initial grid of EllipticalGaussianBeam.trace_adaptive
+
+def _get_beam_shape_arrays(B_mat: np.ndarray):
+    """Vectorized equivalent of EllipticalGaussianBeam.get_beam_shape for a stack of B matrices with shape (..., 2, 2).
+    Returns the radius_x, radius_y, orientation and ellipticity arrays with shape (...)."""
+    eigenvalues, eigenvectors = eigh2(B_mat.real)
+
+    a = np.mod(np.arctan2(eigenvectors[..., 1, 0], eigenvectors[..., 0, 0]), np.pi)
+    x_first = a < np.pi / 2
+
+    r_1, r_2 = np.sqrt(1/eigenvalues[..., 0]), np.sqrt(1/eigenvalues[..., 1])
+    r_x, r_y = np.where(x_first, r_1, r_2), np.where(x_first, r_2, r_1)
+    orientation = np.where(x_first, a, a - np.pi / 2)
+    ellipticity = np.minimum(r_x, r_y) / np.maximum(r_x, r_y)
+    return r_x, r_y, orientation, ellipticity
+
+def _get_beam_shape_scalars(B_mat: np.ndarray) -> tuple:
+    """_get_beam_shape_arrays of a single B matrix with shape (2, 2) in plain Python arithmetic, returned as a tuple of floats."""
+    if instrumentation._active is not None:
+        instrumentation._active._add_call("eigh2", B_mat)
+    (a, b), (_, c) = B_mat.real.tolist()
+    lambda_1, lambda_2, vx, vy = _eigh2_scalar(a, b, c)
+    if not (lambda_1 > 0 and lambda_2 > 0):
+        # Non physical states (e.g. a negative definite real part) follow the array path, which returns nan radii
+        return tuple(float(v) for v in _get_beam_shape_arrays(B_mat))
+
+    angle = math.atan2(vx, -vy) % math.pi
+    r_1, r_2 = 1 / math.sqrt(lambda_1), 1 / math.sqrt(lambda_2)
+    if angle < math.pi / 2:
+        r_x, r_y, orientation = r_1, r_2, angle
+    else:
+        r_x, r_y, orientation = r_2, r_1, angle - math.pi / 2
+    return r_x, r_y, orientation, min(r_x, r_y) / max(r_x, r_y)
+
+def _get_waist_arrays(B_mat: np.ndarray, Binv_mat: np.ndarray, wavelength) -> tuple:
+    """Vectorized equivalent of EllipticalGaussianBeam.get_beam_waists and get_beam_waist_locations for a stack of beams with the
+    shape (..., 2, 2). Returns the waists in ascending order and the locations of the waists of the same modes, with the shape (..., 2).
+
+    The waists are the principal values of Re(Binv), and the locations follow from the eigenvalues of B. Each eigenvalue of B is
+    paired with the principal axis of Re(Binv) on which the diagonal of B is closest to it, which is exact for simple astigmatic beams.
+    """
+    eigenvalues, eigenvectors = eigh2(Binv_mat.real)
+    diagonal = np.einsum("...ik,...ij,...jk->...k", eigenvectors, B_mat, eigenvectors)
+    e1, e2 = eigvals2(B_mat)
+    swap = np.abs(e1 - diagonal[..., 0]) + np.abs(e2 - diagonal[..., 1]) > np.abs(e1 - diagonal[..., 1]) + np.abs(e2 - diagonal[..., 0])
+    e = np.stack([np.where(swap, e2, e1), np.where(swap, e1, e2)], axis=-1)
+    locations = np.pi / np.asarray(wavelength)[..., None] * np.sin(np.angle(e)) / np.abs(e)
+    return np.sqrt(eigenvalues), locations
+
+def _get_interpolation_errors(B_start: np.ndarray, B_stop: np.ndarray, B_mid: np.ndarray) -> np.ndarray:
+    """Returns the errors of the linear interpolation of the principal radii and the major axis at the midpoints of intervals,
+    relative to the larger radius at the midpoints (c.f. EllipticalGaussianBeam.trace_adaptive)."""
+    radii, angles = [], []
+    for B_mat in (B_start, B_stop, B_mid):
+        eigenvalues, eigenvectors = eigh2(B_mat.real)
+        radii.append(1 / np.sqrt(eigenvalues)) # (radius_max, radius_min)
+        angles.append(np.arctan2(eigenvectors[..., 1, 0], eigenvectors[..., 0, 0]))
+
+    wrap = lambda a: np.mod(a + np.pi / 2, np.pi) - np.pi / 2
+    radius_error = np.max(np.abs(radii[2] - (radii[0] + radii[1]) / 2), axis=-1)
+    angle_error = np.abs(wrap(angles[2] - angles[0] - wrap(angles[1] - angles[0]) / 2))
+    return np.maximum(radius_error, (radii[2][..., 0] - radii[2][..., 1]) * angle_error) / radii[2][..., 0]
 
 class EllipticalGaussianBeam:
 
@@ -16,21 +81,40 @@ class EllipticalGaussianBeam:
     m2: np.ndarray
     wavelength: float
 
+    # Only the representation that was updated last is kept up to date; the other one is computed on demand.
+    # The derived shape quantities are cached until the state of the beam changes.
+    _B_mat: np.ndarray
+    _Binv_mat: np.ndarray
+    _beam_shape: tuple
+    _beam_waists: tuple
+    _beam_waist_locations: tuple
+
     @classmethod
     def copy(cls, b: 'EllipticalGaussianBeam') -> 'EllipticalGaussianBeam':
-        b2 = EllipticalGaussianBeam(
-            0,
-            0,
-            0,
-            0,
-            1,
-            1,
-            b.wavelength    
+        if instrumentation._active is not None:
+            instrumentation._active._add_call("beam_copy")
+        b2 = EllipticalGaussianBeam._from_Bmats(
+            None if b._B_mat is None else np.array(b._B_mat),
+            None if b._Binv_mat is None else np.array(b._Binv_mat),
+            b.wavelength,
+            b.m2
         )
-        b2.B_mat = np.array(b.B_mat)
-        b2.Binv_mat = np.array(b.Binv_mat)
+        b2._beam_shape = b._beam_shape
+        b2._beam_waists = b._beam_waists
+        b2._beam_waist_locations = b._beam_waist_locations
         return b2
 
+    @classmethod
+    def _from_Bmats(cls, B_mat: np.ndarray, Binv_mat: np.ndarray, wavelength: float, m2: float = 1) -> 'EllipticalGaussianBeam':
+        """Creates a beam directly from its B and/or Binv matrices (at least one of them), without copying them."""
+        if instrumentation._active is not None:
+            instrumentation._active._add_call("beam_creation")
+        b = cls.__new__(cls)
+        b.wavelength = wavelength
+        b.m2 = m2
+        b._set_Bmats(B_mat, Binv_mat)
+        return b
+
     def __init__(self,
                  initial_z: float,
                  z0_x: float,
@@ -53,6 +137,8 @@ class EllipticalGaussianBeam:
         """
         self.wavelength = wavelength
         self.m2 = m2
+        self._B_mat, self._Binv_mat = None, None
+        self._invalidate_cache()
         self._initialize_Bmats(
             initial_z,
             z0_x,
@@ -62,6 +148,26 @@ class EllipticalGaussianBeam:
             w0_y
         )
 
+    @property
+    def B_mat(self) -> np.ndarray:
+        if self._B_mat is None:
+            self._B_mat = inv2(self._Binv_mat)
+        return self._B_mat
+
+    @B_mat.setter
+    def B_mat(self, B_mat: np.ndarray):
+        self._set_Bmats(np.asarray(B_mat, dtype=np.complex128), None)
+
+    @property
+    def Binv_mat(self) -> np.ndarray:
+        if self._Binv_mat is None:
+            self._Binv_mat = inv2(self._B_mat)
+        return self._Binv_mat
+
+    @Binv_mat.setter
+    def Binv_mat(self, Binv_mat: np.ndarray):
+        self._set_Bmats(None, np.asarray(Binv_mat, dtype=np.complex128))
+
     def evolve(self, z: float):
         """Implements the freespace evolution of the beam
 
@@ -85,58 +191,242 @@ class EllipticalGaussianBeam:
         Args:
             lens (EllipticalLens): The lens object which affects the shape of the beam
         """
-        self.B_mat += lens.get_phase_adjustment_matrix()
-        self.Binv_mat = np.linalg.inv(self.B_mat)
+        if instrumentation._active is not None:
+            instrumentation._active._add_call("lens_application")
+        self._set_Bmats(self.B_mat + lens.get_phase_adjustment_matrix(), None)
+
+    def trace(self, z: np.ndarray, lenses: dict = None, unwrap: bool = False) -> BeamShapeArray:
+        """Evaluates the beam shape at many positions along the propagation axis in one vectorized pass.
+        The beam itself is not modified.
+
+        Free space propagation only adds a multiple of the identity to Binv_mat, so the whole caustic between
+        two lens planes follows in closed form from the state at the start of that segment; the beam is only
+        re-seeded at the lens planes.
+
+        Args:
+            z (np.ndarray): The positions in m, relative to the current plane of the beam, at which to evaluate the shape.
+                It must be sorted in ascending order if lenses are provided.
+            lenses (dict, optional): Lenses along the path, as a map from either an index into z (int) or a position in m (float)
+                to an EllipticalLens or a list of them. A lens at index i is applied at z[i], so the shape at z[i] is taken after the lens,
+                matching evolve followed by apply_elliptical_lens. Similarly, a lens at position z_l affects all the positions z >= z_l.
+            unwrap (bool): If True, the orientation is made continuous along z and the radii follow the same physical axes (c.f. unwrap_orientation).
+
+        Returns:
+            BeamShapeArray: The shapes of the beam with the same length as z.
+        """
+        shapes = BeamShapeArray(*_get_beam_shape_arrays(inv2(self._get_trace_Binv_mats(z, lenses))))
+        return unwrap_orientation(shapes) if unwrap else shapes
+
+    def trace_adaptive(self,
+                       z_start: float,
+                       z_stop: float,
+                       lenses: dict = None,
+                       tolerance: float = 1e-3,
+                       max_points: int = 2**16,
+                       unwrap: bool = False):
+        """Evaluates the beam shape between two positions on a non uniform grid, which is dense only where the shape changes quickly,
+        e.g. near tight waists, and sparse in the far field. The beam itself is not modified.
+
+        Between the lens planes Binv(z) = Binv(z_l) + i lambda m2 (z - z_l) / pi, so the eigenvalues of Binv are the complex beam
+        parameters of two modes, with exact waist positions z0 and Rayleigh ranges zR. Each segment is first sampled at uniform steps
+        of the Gouy phase arctan((z - z0) / zR) of both modes (c.f. GOUY_PHASE_STEP). Every interval is then bisected as long as the shape
+        at its midpoint differs from the linear interpolation of its ends by more than the tolerance, until the whole trace is
+        accurate to the tolerance or max_points is reached. The difference is measured on the principal radii and on the displacement
+        (radius_max - radius_min) * delta_orientation of the ellipse due to its rotation, both relative to the larger radius; the
+        orientation of nearly round beams is therefore only refined as much as it affects their outline.
+
+        Args:
+            z_start (float): The first position in m, relative to the current plane of the beam.
+            z_stop (float): The last position in m, relative to the current plane of the beam.
+            lenses (dict, optional): Lenses along the path, as a map from a position in m to an EllipticalLens or a list of them,
+                with the same semantics as in trace. The lens planes are always part of the grid.
+            tolerance (float): The largest error of the linear interpolation between the points, relative to the beam radius.
+            max_points (int): The largest number of points of the trace.
+            unwrap (bool): If True, the orientation is made continuous along z and the radii follow the same physical axes (c.f. unwrap_orientation).
+
+        Returns:
+            tuple: The positions z in ascending order and the shapes of the beam as a BeamShapeArray of the same length.
+        """
+        assert z_stop > z_start, f"z_stop must be larger than z_start, got {z_start} and {z_stop}."
+        assert tolerance > 0, f"The tolerance must be positive, got {tolerance}."
+        for key in (lenses or {}).keys():
+            assert not isinstance(key, (int, np.integer)), "The lenses of an adaptive trace must be placed at positions in m, not at indices."
+
+        # The segments between the lens planes are sampled uniformly in the Gouy phases of the two modes of their first plane
+        boundaries = np.unique([z_start, z_stop] + [float(k) for k in (lenses or {}).keys() if z_start < k < z_stop])
+        a = self.wavelength * self.m2 / np.pi
+        z = [boundaries]
+        for z_a, z_b, mu in zip(boundaries[:-1], boundaries[1:], np.stack(eigvals2(self._get_trace_Binv_mats(boundaries, lenses)), axis=-1)):
+            for z0, zR in zip(z_a - mu.imag / a, np.abs(mu.real) / a):
+                psi = np.arctan((np.array([z_a, z_b]) - z0) / zR)
+                n = int(np.ceil((psi[1] - psi[0]) / GOUY_PHASE_STEP)) + 1
+                z.append(z0 + zR * np.tan(np.linspace(psi[0], psi[1], n)[1:-1]))
+        z = np.unique(np.concatenate(z))
+        B_mat = inv2(self._get_trace_Binv_mats(z, lenses))
+
+        # Every level bisects the intervals that are not yet accurate; the evaluated midpoints are always kept
+        refine = np.ones(len(z) - 1, dtype=bool)
+        while refine.any() and len(z) < max_points:
+            intervals = np.flatnonzero(refine)[:max_points - len(z)]
+            z_mid = (z[intervals] + z[intervals + 1]) / 2
+
+            # Intervals between consecutive floating point numbers cannot be bisected any further
+            divisible = (z_mid > z[intervals]) & (z_mid < z[intervals + 1])
+            intervals, z_mid = intervals[divisible], z_mid[divisible]
+            if len(intervals) == 0:
+                break
+            B_mid = inv2(self._get_trace_Binv_mats(z_mid, lenses))
+            error = _get_interpolation_errors(B_mat[intervals], B_mat[intervals + 1], B_mid)
+
+            order = np.argsort(np.concatenate([z, z_mid]), kind="stable")
+            z, B_mat = np.concatenate([z, z_mid])[order], np.concatenate([B_mat, B_mid])[order]
+            refine = np.zeros(len(z) - 1, dtype=bool)
+            new_index = np.flatnonzero(order >= len(order) - len(z_mid))
+            inaccurate = new_index[error > tolerance]
+            refine[inaccurate - 1], refine[inaccurate] = True, True
+
+        shapes = BeamShapeArray(*_get_beam_shape_arrays(B_mat))
+        return z, unwrap_orientation(shapes) if unwrap else shapes
+
+    def render_intensity(self,
+                         x: np.ndarray,
+                         y: np.ndarray,
+                         z: np.ndarray,
+                         lenses: dict = None,
+                         dtype = np.float64,
+                         out: np.ndarray = None,
+                         chunk_size: int = None,
+                         power: float = 1) -> np.ndarray:
+        """Renders the intensity of the beam over a 3D grid, e.g. for plot_transverse_beam. The beam itself is not modified.
+
+        The intensity at each plane is I(r) = 2 P sqrt(det Re(B)) / pi * exp(-2 r^T Re(B) r), so that the radii of get_beam_shape
+        are the 1/e^2 radii of the intensity. The volume is filled in chunks of planes along z, computed in place in the output
+        with a single reusable buffer of one chunk, so that no temporaries of the size of the volume are needed.
+
+        Args:
+            x (np.ndarray): The x coordinates of the grid in m, relative to the beam axis.
+            y (np.ndarray): The y coordinates of the grid in m, relative to the beam axis.
+            z (np.ndarray): The positions of the planes in m, relative to the current plane of the beam.
+            lenses (dict, optional): Lenses along the path, with the same semantics as in trace.
+            dtype: The floating point type of the output, e.g. np.float32 to halve the memory. Ignored if out is provided.
+            out (np.ndarray, optional): An array with the shape (Nz, Ny, Nx) to write into, e.g. a memory mapped array (c.f. np.lib.format.open_memmap).
+            chunk_size (int, optional): The number of planes computed at once. By default the chunks have about 2^22 grid points.
+            power (float): The total power of the beam in W, which sets the normalization of the intensity in W/m^2.
+
+        Returns:
+            np.ndarray: The intensity with the shape (Nz, Ny, Nx), which is out if it was provided.
+        """
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        z = np.atleast_1d(np.asarray(z, dtype=np.float64))
+        assert x.ndim == 1 and y.ndim == 1 and z.ndim == 1, "x, y and z must be 1D arrays."
+
+        shape = (len(z), len(y), len(x))
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        assert out.shape == shape, f"out must have the shape {shape}, got {out.shape}."
+        if chunk_size is None:
+            chunk_size = max(1, 2**22 // max(1, len(x) * len(y)))
+
+        # Only the real part of B enters the intensity; the quadratic form is split into its x^2, y^2 and xy terms
+        A = inv2(self._get_trace_Binv_mats(z, lenses)).real
+        norm = 2 * power * np.sqrt(A[:, 0, 0] * A[:, 1, 1] - A[:, 0, 1] * A[:, 1, 0]) / np.pi
+        x2, y2, xy = (x**2).astype(out.dtype), (y**2).astype(out.dtype)[:, None], np.multiply.outer(y, x).astype(out.dtype)
+        buffer = np.empty((min(chunk_size, len(z)),) + shape[1:], dtype=out.dtype)
+
+        for start in range(0, len(z), chunk_size):
+            chunk = slice(start, min(start + chunk_size, len(z)))
+            o, t = out[chunk], buffer[:chunk.stop - start]
+            a, b, c = [(-2 * A[chunk, i, j]).astype(out.dtype)[:, None, None] for i, j in ((0, 0), (0, 1), (1, 1))]
+
+            np.multiply(a, x2, out=o)
+            o += c * y2
+            np.multiply(2 * b, xy, out=t)
+            o += t
+            np.exp(o, out=o)
+            o *= norm[chunk].astype(out.dtype)[:, None, None]
+        return out
+
+    def _get_trace_Binv_mats(self, z: np.ndarray, lenses: dict = None) -> np.ndarray:
+        """Returns the Binv matrices of the beam at the positions z with the shape (len(z), 2, 2), c.f. trace."""
+        z = np.asarray(z, dtype=np.float64)
+        assert z.ndim == 1, "z must be a 1D array."
+        lens_planes = self._get_trace_lens_planes(z, lenses)
+
+        seed_indices = np.zeros(len(z), dtype=int)
+        seed_z = [0.0]
+        seed_Binv_mats = [self.Binv_mat]
+        Binv_mat, z_prev = self.Binv_mat, 0.0
+        for z_lens, start, plane_lenses in lens_planes:
+            B_mat = inv2(Binv_mat + 1j * self.wavelength * self.m2 * (z_lens - z_prev) / np.pi * np.eye(2))
+            for l in plane_lenses:
+                B_mat = B_mat + l.get_phase_adjustment_matrix()
+            Binv_mat, z_prev = inv2(B_mat), z_lens
+
+            seed_indices[start:] += 1
+            seed_z.append(z_lens)
+            seed_Binv_mats.append(Binv_mat)
+
+        seed_z, seed_Binv_mats = np.array(seed_z), np.array(seed_Binv_mats)
+        return seed_Binv_mats[seed_indices] + (1j * self.wavelength * self.m2 * (z - seed_z[seed_indices]) / np.pi)[:, None, None] * np.eye(2)
 
     def get_beam_shape(self) -> BeamShape:
-        eigenvalues, eigenvectors = la.eig(self.B_mat.real)
-        eigenvalues, eigenvectors = np.real(eigenvalues), np.real(eigenvectors)
-        
-        a1, a2 = np.arctan2(eigenvectors[1,0],eigenvectors[0,0]), np.arctan2(eigenvectors[1,1],eigenvectors[0,1])
-        a1, a2 = self._find_equivalent_angle_first_second_quadrant(a1), self._find_equivalent_angle_first_second_quadrant(a2)
-
-        x_ind = 0 if a1 < a2 else 1
-        y_ind = 1 - x_ind
-
-        r_x, r_y = np.sqrt(1/eigenvalues[x_ind]), np.sqrt(1/eigenvalues[y_ind])
-        orientation = min(a1, a2)
-        ellipticity = min(r_x, r_y) / max(r_x, r_y)
-        return BeamShape(
-            r_x,
-            r_y,
-            orientation,
-            ellipticity
-        )
+        if self._beam_shape is None:
+            self._beam_shape = _get_beam_shape_scalars(self.B_mat)
+        return BeamShape(*self._beam_shape)
     
     def get_beam_waists(self) -> float:
-        eigenvalues, _ = la.eig(self.Binv_mat.real)
-
-        return np.sqrt(eigenvalues[0]), np.sqrt(eigenvalues[1])
+        """Returns the waists of the two modes of the beam in ascending order. The i-th waist is located at the i-th distance of
+        get_beam_waist_locations."""
+        if self._beam_waists is None:
+            self._set_waists()
+        return self._beam_waists
     
     def get_beam_waist_locations(self) -> float:
-        eigenvalues, _ = la.eig(self.B_mat)
+        """Returns the distances to the waists of the two modes of the beam, in the order of get_beam_waists."""
+        if self._beam_waist_locations is None:
+            self._set_waists()
+        return self._beam_waist_locations
+
+    def _set_waists(self):
+        waists, locations = _get_waist_arrays(self.B_mat, self.Binv_mat, self.wavelength)
+        self._beam_waists, self._beam_waist_locations = (waists[0], waists[1]), (locations[0], locations[1])
+
+    def _get_trace_lens_planes(self, z: np.ndarray, lenses: dict):
+        if not lenses:
+            return []
+        assert np.all(np.diff(z) >= 0), "z must be sorted in ascending order when lenses are provided."
 
-        t1, t2 = np.arctan2(eigenvalues[0].imag, eigenvalues[0].real), np.arctan2(eigenvalues[1].imag, eigenvalues[1].real)
-        m1, m2 = np.abs(eigenvalues[0]), np.abs(eigenvalues[1])
+        lens_planes = []
+        for key, plane_lenses in lenses.items():
+            if isinstance(plane_lenses, EllipticalLens):
+                plane_lenses = [plane_lenses]
+            if isinstance(key, (int, np.integer)):
+                assert 0 <= key < len(z), f"The lens index {key} is out of the range of z."
+                z_lens, start = z[key], int(key)
+            else:
+                z_lens, start = float(key), int(np.searchsorted(z, key, side="left"))
+            lens_planes.append((z_lens, start, list(plane_lenses)))
+        return sorted(lens_planes, key=lambda p: (p[0], p[1]))
 
-        return np.pi / self.wavelength * np.sin(t1)/m1, np.pi / self.wavelength * np.sin(t2)/m2
+    def _set_Bmats(self, B_mat: np.ndarray, Binv_mat: np.ndarray):
+        self._B_mat, self._Binv_mat = B_mat, Binv_mat
+        self._invalidate_cache()
 
-    def _find_equivalent_angle_first_second_quadrant(self, angle):
-        if angle <= -np.pi/2:
-            return angle + np.pi
-        elif angle < 0:
-            return angle + np.pi
-        else:
-            return angle
+    def _invalidate_cache(self):
+        self._beam_shape = None
+        self._beam_waists = None
+        self._beam_waist_locations = None
 
     def _free_space_propagation(self, z):
-        self.Binv_mat += 1j * self.wavelength * self.m2 * z / np.pi * np.eye(2)
-        self.B_mat = np.linalg.inv(self.Binv_mat)
+        if instrumentation._active is not None:
+            instrumentation._active._add_call("free_space_propagation")
+        self._set_Bmats(None, self.Binv_mat + 1j * self.wavelength * self.m2 * z / np.pi * np.eye(2))
 
     def _free_space_propagation_along_axis(self, z, theta):
+        if instrumentation._active is not None:
+            instrumentation._active._add_call("free_space_propagation")
         axis = np.array([[np.cos(theta), np.sin(theta)]])
-        self.Binv_mat += 1j * self.wavelength * self.m2 * z / np.pi * axis.T.dot(axis)
-        self.B_mat = np.linalg.inv(self.Binv_mat)
+        self._set_Bmats(None, self.Binv_mat + 1j * self.wavelength * self.m2 * z / np.pi * axis.T.dot(axis))
 
     def _initialize_Bmats(self,
                             initial_z: float,
@@ -146,7 +436,6 @@ class EllipticalGaussianBeam:
                             w0_x: float,
                             w0_y: float):
         self.B_mat = self._rotation_matrix(theta).dot(np.diag([1/w0_x**2, 1/w0_y**2]).dot(self._rotation_matrix(-theta))).astype(np.complex128)
-        self.Binv_mat = np.linalg.inv(self.B_mat)
         self._free_space_propagation_along_axis(-z0_x + initial_z, theta)
         self._free_space_propagation_along_axis(-z0_y + initial_z, theta + np.pi/2)
     
@@ -0,0 +1,178 @@
+import numpy as np
+from typing import Sequence, Union
+from .beam import EllipticalGaussianBeam, _get_beam_shape_arrays, _get_waist_arrays
+from .elliptical_lens import EllipticalLens
+from .beam_shape import BeamShapeArray
+from ._linalg import inv2
+
+class EllipticalGaussianBeamEnsemble:
+    """A collection of N elliptical Gaussian beams stored as stacks of (N, 2, 2) B matrices,
+    so that the whole collection is propagated with a single vectorized call."""
+
+    B_mat: np.ndarray # Shape (N, 2, 2)
+    Binv_mat: np.ndarray # Shape (N, 2, 2)
+    m2: np.ndarray # Shape (N,)
+    wavelength: np.ndarray # Shape (N,) in m
+
+    @classmethod
+    def copy(cls, e: 'EllipticalGaussianBeamEnsemble') -> 'EllipticalGaussianBeamEnsemble':
+        return cls.from_B_mats(e.B_mat, e.wavelength, e.m2, Binv_mat = e.Binv_mat)
+
+    @classmethod
+    def from_beams(cls, beams: Sequence[EllipticalGaussianBeam]) -> 'EllipticalGaussianBeamEnsemble':
+        """Stacks a sequence of single beam objects into an ensemble.
+
+        Args:
+            beams (Sequence[EllipticalGaussianBeam]): The beams to be stacked, in order.
+        """
+        assert len(beams) > 0, "At least one beam is required to create an ensemble."
+        return cls.from_B_mats(
+            np.array([b.B_mat for b in beams]),
+            np.array([b.wavelength for b in beams]),
+            np.array([b.m2 for b in beams]),
+            Binv_mat = np.array([b.Binv_mat for b in beams])
+        )
+
+    @classmethod
+    def from_B_mats(cls,
+                    B_mat: np.ndarray,
+                    wavelength: Union[float, np.ndarray],
+                    m2: Union[float, np.ndarray] = 1,
+                    Binv_mat: np.ndarray = None) -> 'EllipticalGaussianBeamEnsemble':
+        """Creates an ensemble directly from a stack of B matrices.
+
+        Args:
+            B_mat (np.ndarray): The B matrices of the beams with shape (N, 2, 2).
+            wavelength (Union[float, np.ndarray]): The wavelength of the beams in m, shared or one per beam.
+            m2 (Union[float, np.ndarray]): The beam quality factor, shared or one per beam.
+            Binv_mat (np.ndarray, optional): The inverses of B_mat, if already known.
+        """
+        B_mat = np.array(B_mat, dtype=np.complex128)
+        assert B_mat.ndim == 3 and B_mat.shape[1:] == (2, 2), f"B_mat must have the shape (N, 2, 2), got {B_mat.shape}."
+
+        e = cls.__new__(cls)
+        e.B_mat = B_mat
+        e.Binv_mat = inv2(B_mat) if Binv_mat is None else np.array(Binv_mat, dtype=np.complex128)
+        e.wavelength = e._broadcast_per_beam(wavelength, "wavelength")
+        e.m2 = e._broadcast_per_beam(m2, "m2")
+        return e
+
+    def __init__(self,
+                 initial_z: Union[float, np.ndarray],
+                 z0_x: Union[float, np.ndarray],
+                 z0_y: Union[float, np.ndarray],
+                 theta: Union[float, np.ndarray],
+                 w0_x: Union[float, np.ndarray],
+                 w0_y: Union[float, np.ndarray],
+                 wavelength: Union[float, np.ndarray],
+                 m2: Union[float, np.ndarray] = 1):
+        """Initialization of an ensemble of beams. Every argument is either a scalar shared by all the beams
+        or a 1D array with one entry per beam; the number of beams is set by the broadcast of all arguments.
+
+        Args:
+            initial_z (Union[float, np.ndarray]): The position of the beams with respect to the reference in m.
+            z0_x (Union[float, np.ndarray]): The position of the x axis waists with respect to the center of coordinates in m
+            z0_y (Union[float, np.ndarray]): The position of the y axis waists with respect to the center of coordinates in m
+            theta (Union[float, np.ndarray]): The angle between the beam x axes and the reference x axis in rad
+            w0_x (Union[float, np.ndarray]): The radius of the beam waists along the x axis in m
+            w0_y (Union[float, np.ndarray]): The radius of the beam waists along the y axis in m
+            wavelength (Union[float, np.ndarray]): The wavelength of the beams in m
+            m2 (Union[float, np.ndarray]): The beam quality factor of the beams
+        """
+        initial_z, z0_x, z0_y, theta, w0_x, w0_y, wavelength, m2 = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (initial_z, z0_x, z0_y, theta, w0_x, w0_y, wavelength, m2)]
+        )
+        assert initial_z.ndim == 1, "The beam parameters must be scalars or 1D arrays."
+
+        self.wavelength = np.array(wavelength)
+        self.m2 = np.array(m2)
+        self._initialize_Bmats(initial_z, z0_x, z0_y, theta, w0_x, w0_y)
+
+    def __len__(self) -> int:
+        return self.B_mat.shape[0]
+
+    def get_beam(self, i: int) -> EllipticalGaussianBeam:
+        """Returns a copy of the i-th beam of the ensemble as a single beam object."""
+        return EllipticalGaussianBeam._from_Bmats(np.array(self.B_mat[i]), np.array(self.Binv_mat[i]), self.wavelength[i], self.m2[i])
+
+    def evolve(self, z: Union[float, np.ndarray]):
+        """Implements the freespace evolution of all the beams
+
+        Args:
+            z (Union[float, np.ndarray]): The length of the free space propagation in m, shared or one per beam.
+        """
+        self._free_space_propagation(z)
+
+    def evolve_along_axis(self, z: Union[float, np.ndarray], theta: Union[float, np.ndarray]):
+        """Implements the freespace evolution of all the beams along only one axis
+
+        Args:
+            z (Union[float, np.ndarray]): The length of the free space propagation in m, shared or one per beam.
+            theta (Union[float, np.ndarray]): The angle of the axis along which to evolve, shared or one per beam.
+        """
+        self._free_space_propagation_along_axis(z, theta)
+
+    def apply_elliptical_lens(self, lens: Union[EllipticalLens, Sequence[EllipticalLens], np.ndarray], chromatic: bool = False):
+        """Apply an elliptical lens to all the beams
+
+        Args:
+            lens (Union[EllipticalLens, Sequence[EllipticalLens], np.ndarray]): Either a single lens shared by all the beams,
+                a sequence with one lens per beam, or the phase adjustment matrices themselves with shape (2, 2) or (N, 2, 2).
+            chromatic (bool): Whether to evaluate the lenses at the wavelength of every beam rather than at their own
+                (c.f. EllipticalLens.get_phase_adjustment_matrix), so that the beams of a whole spectrum pass through the same lens.
+                Ignored if the phase adjustment matrices are given.
+        """
+        self.B_mat = self.B_mat + self._get_phase_adjustment_matrices(lens, chromatic)
+        self.Binv_mat = inv2(self.B_mat)
+
+    def get_beam_shapes(self) -> BeamShapeArray:
+        """Returns the shapes of all the beams, with one entry per beam."""
+        return BeamShapeArray(*_get_beam_shape_arrays(self.B_mat))
+
+    def get_beam_waists(self):
+        """Returns the waists of the two modes of every beam in ascending order, c.f. EllipticalGaussianBeam.get_beam_waists."""
+        waists, _ = _get_waist_arrays(self.B_mat, self.Binv_mat, self.wavelength)
+        return waists[:, 0], waists[:, 1]
+
+    def get_beam_waist_locations(self):
+        """Returns the distances to the waists of the two modes of every beam, in the order of get_beam_waists."""
+        _, z = _get_waist_arrays(self.B_mat, self.Binv_mat, self.wavelength)
+        return z[:, 0], z[:, 1]
+
+    def _broadcast_per_beam(self, value, name: str) -> np.ndarray:
+        value = np.asarray(value, dtype=np.float64)
+        assert value.ndim == 0 or value.shape == (len(self),), f"{name} must be a scalar or have the shape ({len(self)},), got {value.shape}."
+        return np.array(np.broadcast_to(value, (len(self),)))
+
+    def _get_phase_adjustment_matrices(self, lens, chromatic: bool = False) -> np.ndarray:
+        if isinstance(lens, EllipticalLens):
+            return lens.get_phase_adjustment_matrix(self.wavelength if chromatic else None)
+        if isinstance(lens, np.ndarray):
+            assert lens.shape in [(2, 2), (len(self), 2, 2)], f"The phase adjustment matrices must have the shape (2, 2) or ({len(self)}, 2, 2), got {lens.shape}."
+            return lens
+        assert len(lens) == len(self), f"One lens per beam is required: got {len(lens)} lenses for {len(self)} beams."
+        return np.array([l.get_phase_adjustment_matrix(w if chromatic else None) for l, w in zip(lens, self.wavelength)])
+
+    def _free_space_propagation(self, z):
+        z = self._broadcast_per_beam(z, "z")
+        self.Binv_mat = self.Binv_mat + (1j * self.wavelength * self.m2 * z / np.pi)[:, None, None] * np.eye(2)
+        self.B_mat = inv2(self.Binv_mat)
+
+    def _free_space_propagation_along_axis(self, z, theta):
+        z = self._broadcast_per_beam(z, "z")
+        theta = self._broadcast_per_beam(theta, "theta")
+        axis = np.stack([np.cos(theta), np.sin(theta)], axis=-1)
+        projector = axis[:, :, None] * axis[:, None, :]
+        self.Binv_mat = self.Binv_mat + (1j * self.wavelength * self.m2 * z / np.pi)[:, None, None] * projector
+        self.B_mat = inv2(self.Binv_mat)
+
+    def _initialize_Bmats(self, initial_z, z0_x, z0_y, theta, w0_x, w0_y):
+        c, s = np.cos(theta), np.sin(theta)
+        rotation = np.stack([np.stack([c, -s], axis=-1), np.stack([s, c], axis=-1)], axis=-2)
+        diagonal = np.zeros(rotation.shape)
+        diagonal[:, 0, 0], diagonal[:, 1, 1] = 1/w0_x**2, 1/w0_y**2
+
+        self.B_mat = (rotation @ diagonal @ rotation.transpose(0, 2, 1)).astype(np.complex128)
+        self.Binv_mat = inv2(self.B_mat)
+        self._free_space_propagation_along_axis(-z0_x + initial_z, theta)
+        self._free_space_propagation_along_axis(-z0_y + initial_z, theta + np.pi/2)
@@ -0,0 +1,155 @@
+from .beam import _get_beam_shape_arrays
+from .beam_ensemble import EllipticalGaussianBeamEnsemble
+from .beam_shape import BeamShapeArray
+from ._linalg import inv2
+
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Union
+import numpy as np
+
+INITIAL_THRESHOLD = 0.05 # The fraction of the peak of a frame above which the pixels enter the first estimate of the moments
+
+@dataclass
+class BeamProfile:
+    """The second moment profiles of a stack of N camera frames (c.f. profile_images)."""
+
+    shapes: BeamShapeArray # The beam shapes, whose radii are twice the second moment widths
+    centroids: np.ndarray # The first moments (x, y) in m with the shape (N, 2)
+    moments: np.ndarray # The second moment matrices in m^2 with the shape (N, 2, 2)
+    converged: np.ndarray # Whether the integration area of each frame converged, with the shape (N,)
+    beams: EllipticalGaussianBeamEnsemble # The fitted beams, or None if no wavelength was given
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+
+def profile_images(images: Union[np.ndarray, Iterable[np.ndarray]],
+                   pixel_size: Union[float, tuple],
+                   background: Union[str, float, np.ndarray] = "border",
+                   border_fraction: float = 0.05,
+                   roi_factor: float = 3,
+                   max_iterations: int = 20,
+                   tolerance: float = 1e-3,
+                   batch_size: int = 256,
+                   wavelength: float = None,
+                   m2: float = 1) -> BeamProfile:
+    """Measures the second moments of the beam in every frame of an image stack, following ISO 11146.
+
+    The frames are processed in batches of batch_size, so that only one batch is held in memory at a time; a memory mapped
+    stack (c.f. chunked_array.open_array) or a generator of frames can be profiled without loading it. In every batch the
+    background is subtracted, and the centroid and second moments are evaluated within a rectangular integration area around
+    the centroid, whose sides are roi_factor times the beam diameters (4 sigma) along x and y. The area starts as the whole frame
+    and is iterated until the diameters change by less than the relative tolerance.
+
+    The beam shapes follow the conventions of EllipticalGaussianBeam.get_beam_shape: a Gaussian beam whose intensity is
+    proportional to exp(-2 r^T Re(B) r) has the second moment matrix M = inv(4 Re(B)), so its radii are twice the second moment widths.
+    A single plane carries no information about the wavefront, so the fitted beams have a real B = inv(4 M), i.e. they are at a waist.
+
+    Args:
+        images (Union[np.ndarray, Iterable[np.ndarray]]): The frames with the shape (N, H, W), or an iterable of (H, W) frames.
+        pixel_size (Union[float, tuple]): The size of the pixels in m, either shared or as (x, y).
+        background (Union[str, float, np.ndarray]): Either "border" to subtract the mean of the pixels near the edges of each frame,
+            a constant, a (H, W) dark frame, or None to skip the subtraction.
+        border_fraction (float): The fraction of the width and height of the frames used as the border.
+        roi_factor (float): The size of the integration area relative to the beam diameters.
+        max_iterations (int): The maximum number of iterations of the integration area.
+        tolerance (float): The relative change of the diameters below which the integration area is considered converged.
+        batch_size (int): The number of frames processed at once.
+        wavelength (float, optional): The wavelength of the beams in m, required for the fitted beams.
+        m2 (float): The beam quality factor of the fitted beams.
+
+    Returns:
+        BeamProfile: The shapes, centroids, second moments and fitted beams of all the frames.
+    """
+    pixel_x, pixel_y = (pixel_size, pixel_size) if np.ndim(pixel_size) == 0 else pixel_size
+
+    centroids, moments, converged = [], [], []
+    for batch in _iterate_batches(images, batch_size):
+        batch = _subtract_background(batch, background, border_fraction)
+        x, y = np.arange(batch.shape[2]) * pixel_x, np.arange(batch.shape[1]) * pixel_y
+        c, m, done = _get_moments(batch, x, y, roi_factor, max_iterations, tolerance)
+        centroids.append(c)
+        moments.append(m)
+        converged.append(done)
+
+    centroids, moments, converged = np.concatenate(centroids), np.concatenate(moments), np.concatenate(converged)
+    B_mat = inv2(4 * moments)
+    beams = None if wavelength is None else EllipticalGaussianBeamEnsemble.from_B_mats(B_mat, wavelength, m2)
+    return BeamProfile(BeamShapeArray(*_get_beam_shape_arrays(B_mat)), centroids, moments, converged, beams)
+
+def _iterate_batches(images, batch_size: int):
+    """Yields the frames in float batches with the shape (n, H, W), slicing arrays and consuming other iterables lazily."""
+    assert batch_size > 0, f"The batch size must be positive, got {batch_size}."
+    if hasattr(images, "shape"):
+        assert len(images.shape) == 3, f"The image stack must have the shape (N, H, W), got {images.shape}."
+        for start in range(0, images.shape[0], batch_size):
+            yield np.asarray(images[start:start + batch_size], dtype=np.float64)
+        return
+
+    frames = iter(images)
+    while True:
+        batch = list(islice(frames, batch_size))
+        if len(batch) == 0:
+            return
+        yield np.asarray(batch, dtype=np.float64)
+
+def _subtract_background(batch: np.ndarray, background, border_fraction: float) -> np.ndarray:
+    if background is None:
+        return batch
+    if isinstance(background, str):
+        assert background == "border", f"Unknown background estimate: {background}, expected 'border', a value or a dark frame."
+        h, w = batch.shape[1:]
+        bh, bw = max(1, int(round(h * border_fraction))), max(1, int(round(w * border_fraction)))
+        border = np.ones((h, w), dtype=bool)
+        border[bh:h - bh, bw:w - bw] = False
+        return batch - batch[:, border].mean(axis=-1)[:, None, None]
+    return batch - background
+
+def _get_moments(batch: np.ndarray, x: np.ndarray, y: np.ndarray, roi_factor: float, max_iterations: int, tolerance: float):
+    """Returns the centroids (n, 2), the second moment matrices (n, 2, 2) and the convergence flags (n,) of a batch of frames.
+    The integration areas are rectangles, so their masks are the products of one mask along x and one along y."""
+    n = batch.shape[0]
+    moments = np.full((n, 5), np.nan) # cx, cy, sxx, syy, sxy
+    converged = np.zeros(n, dtype=bool)
+
+    # The noise of the background dominates the moments over the whole frame, so the first estimate only uses the pixels
+    # above a small fraction of the peak of each frame
+    active = np.arange(n)
+    peaks = batch.max(axis=(1, 2))[:, None, None]
+    moments[:] = _get_masked_moments(np.where(batch > INITIAL_THRESHOLD * peaks, batch, 0), x, y)
+    for _ in range(max_iterations):
+        cx, cy, sxx, syy, _ = moments[active].T
+        half_widths = roi_factor * 4 * np.sqrt(np.stack([sxx, syy], axis=-1)) / 2
+        mask_x = np.abs(x[None, :] - cx[:, None]) <= half_widths[:, :1]
+        mask_y = np.abs(y[None, :] - cy[:, None]) <= half_widths[:, 1:]
+        new_moments = _get_masked_moments(batch[active] * mask_y[:, :, None] * mask_x[:, None, :], x, y)
+
+        # Frames whose variances are no longer positive keep their last moments, and are not converged
+        valid = np.all(new_moments[:, 2:4] > 0, axis=-1)
+        moments[active[valid]] = new_moments[valid]
+
+        # The diameters are proportional to the square roots of the variances
+        with np.errstate(invalid="ignore"):
+            change = np.abs(np.sqrt(new_moments[:, 2:4] / moments[active, 2:4]) - 1)
+        done = valid & np.all(change <= tolerance, axis=-1)
+        converged[active[done]] = True
+        active = active[valid & ~done]
+        if len(active) == 0:
+            break
+
+    cx, cy, sxx, syy, sxy = moments.T
+    centroids = np.stack([cx, cy], axis=-1)
+    second_moments = np.stack([np.stack([sxx, sxy], axis=-1), np.stack([sxy, syy], axis=-1)], axis=-2)
+    return centroids, second_moments, converged
+
+def _get_masked_moments(I: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Returns the centroids and second moments (cx, cy, sxx, syy, sxy) of a stack of masked frames with the shape (n, 5)."""
+    I_x, I_y = I.sum(axis=1), I.sum(axis=2)
+    P = I_x.sum(axis=-1)
+
+    cx, cy = (I_x @ x) / P, (I_y @ y) / P
+    sxx = (I_x @ x**2) / P - cx**2
+    syy = (I_y @ y**2) / P - cy**2
+    sxy = np.einsum("nh,nh->n", I @ x, np.broadcast_to(y, I_y.shape)) / P - cx * cy
+    return np.stack([cx, cy, sxx, syy, sxy], axis=-1)
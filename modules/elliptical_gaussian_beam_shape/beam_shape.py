@@ -1,9 +1,145 @@
 from dataclasses import dataclass
+from typing import Sequence
+import numpy as np
 
 @dataclass
 class BeamShape:
 
+    __slots__ = ("radius_x", "radius_y", "orientation", "ellipticity")
+
     radius_x: float
     radius_y: float
     orientation: float # In radians between -90 degrees (exclusive) to +90 degrees (exclusive)
-    ellipticity: float
\ No newline at end of file
+    ellipticity: float
+
+class BeamShapeArray:
+    """Columnar container for many beam shapes, e.g. a trace along z or the shapes of a beam ensemble.
+
+    All the fields are stored in one float array with the shape (4, ...), in the order of BeamShape.__slots__,
+    so that radius_x, radius_y, orientation and ellipticity are zero-copy views with the shape (...).
+    Indexing with an integer (for 1D arrays) returns a BeamShape, while slices, masks and index arrays
+    return a new BeamShapeArray.
+    """
+
+    __slots__ = ("data",)
+
+    data: np.ndarray # Shape (4, ...)
+
+    @classmethod
+    def from_data(cls, data: np.ndarray) -> 'BeamShapeArray':
+        """Wraps an existing array with the shape (4, ...) without copying it."""
+        assert np.ndim(data) >= 1 and np.shape(data)[0] == len(BeamShape.__slots__), f"The data must have the shape (4, ...), got {np.shape(data)}."
+        s = cls.__new__(cls)
+        s.data = data
+        return s
+
+    @classmethod
+    def from_shapes(cls, shapes: Sequence[BeamShape]) -> 'BeamShapeArray':
+        return cls(
+            [s.radius_x for s in shapes],
+            [s.radius_y for s in shapes],
+            [s.orientation for s in shapes],
+            [s.ellipticity for s in shapes]
+        )
+
+    @classmethod
+    def concatenate(cls, arrays: Sequence['BeamShapeArray'], axis: int = 0) -> 'BeamShapeArray':
+        """Concatenates several shape arrays along one of their axes."""
+        axis = axis if axis < 0 else axis + 1
+        return cls.from_data(np.concatenate([a.data for a in arrays], axis=axis))
+
+    def __init__(self, radius_x, radius_y, orientation, ellipticity):
+        self.data = np.stack(np.broadcast_arrays(
+            *[np.asarray(v, dtype=np.float64) for v in (radius_x, radius_y, orientation, ellipticity)]
+        ))
+
+    @property
+    def radius_x(self) -> np.ndarray:
+        return self.data[0]
+
+    @radius_x.setter
+    def radius_x(self, value):
+        self.data[0] = value
+
+    @property
+    def radius_y(self) -> np.ndarray:
+        return self.data[1]
+
+    @radius_y.setter
+    def radius_y(self, value):
+        self.data[1] = value
+
+    @property
+    def orientation(self) -> np.ndarray:
+        return self.data[2]
+
+    @orientation.setter
+    def orientation(self, value):
+        self.data[2] = value
+
+    @property
+    def ellipticity(self) -> np.ndarray:
+        return self.data[3]
+
+    @ellipticity.setter
+    def ellipticity(self, value):
+        self.data[3] = value
+
+    @property
+    def shape(self) -> tuple:
+        return self.data.shape[1:]
+
+    def __len__(self) -> int:
+        return self.data.shape[1]
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        data = self.data[(slice(None),) + key]
+        if data.ndim == 1:
+            return BeamShape(*data.tolist())
+        return BeamShapeArray.from_data(data)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f"BeamShapeArray(shape={self.shape})"
+
+    def copy(self) -> 'BeamShapeArray':
+        return BeamShapeArray.from_data(np.array(self.data))
+
+    def to_shapes(self) -> list:
+        """Returns the shapes of a 1D array as a list of BeamShape objects."""
+        assert self.data.ndim == 2, "Only 1D shape arrays can be converted to a list."
+        return [BeamShape(*d) for d in self.data.T.tolist()]
+
+def unwrap_orientation(shapes: BeamShapeArray, axis: int = -1) -> BeamShapeArray:
+    """Makes the orientation of consecutive shapes continuous along one axis, e.g. along z for a trace.
+
+    The shapes returned by get_beam_shape label the axis with the smaller angle in [0, 90) degrees as the x axis,
+    so the orientation jumps by multiples of 90 degrees whenever the axes cross that boundary. Every jump larger than
+    45 degrees is undone by shifting the orientation by the nearest multiple of 90 degrees, and radius_x and radius_y
+    are swapped wherever the accumulated shift is an odd multiple, so that each radius keeps following the same physical axis.
+
+    Args:
+        shapes (BeamShapeArray): The shapes to be unwrapped, e.g. one trace or a batch of traces.
+        axis (int): The axis of the shape array along which the shapes are consecutive.
+
+    Returns:
+        BeamShapeArray: A new array with the continuous orientation and relabelled radii.
+    """
+    orientation = shapes.orientation
+    jumps = np.diff(orientation, axis=axis)
+    steps = np.where(np.abs(jumps) > np.pi / 4, -np.round(jumps / (np.pi / 2)), 0)
+
+    zero = np.zeros_like(np.take(orientation, [0], axis=axis))
+    k = np.cumsum(np.concatenate([zero, steps], axis=axis), axis=axis)
+    swap = np.mod(k, 2) == 1
+
+    return BeamShapeArray(
+        np.where(swap, shapes.radius_y, shapes.radius_x),
+        np.where(swap, shapes.radius_x, shapes.radius_y),
+        orientation + k * np.pi / 2,
+        shapes.ellipticity
+    )
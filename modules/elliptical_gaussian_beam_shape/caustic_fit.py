@@ -0,0 +1,127 @@
+from .beam_ensemble import EllipticalGaussianBeamEnsemble
+from .beam_shape import BeamShapeArray
+from ._linalg import eigh2
+
+from dataclasses import dataclass
+from typing import Union
+import numpy as np
+
+@dataclass
+class CausticFit:
+    """The simple astigmatic beams fitted to N series of second moments along z (c.f. fit_caustics).
+    The waists of the two axes of every beam are labelled as in EllipticalGaussianBeam, with the x axis at theta."""
+
+    z0: np.ndarray # The positions of the x and y axis waists in m with the shape (N, 2)
+    w0: np.ndarray # The radii of the x and y axis waists in m with the shape (N, 2)
+    theta: np.ndarray # The angles between the beam x axes and the reference x axis in rad, in [0, pi/2), with the shape (N,)
+    m2: np.ndarray # The beam quality factors, the geometric means of m2_axes, with the shape (N,)
+    m2_axes: np.ndarray # The beam quality factors of the x and y axes with the shape (N, 2)
+    residuals: np.ndarray # The root mean square residuals of the second moments in m^2 with the shape (N,)
+    n_points: np.ndarray # The number of planes with a finite measurement in every series, with the shape (N,)
+    wavelength: np.ndarray # The wavelengths of the beams in m with the shape (N,)
+
+    def __len__(self) -> int:
+        return len(self.theta)
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Whether every parameter of a fit is finite, i.e. it had at least 3 planes and both axes have a focus."""
+        return np.all(np.isfinite(self.z0), axis=-1) & np.all(np.isfinite(self.w0), axis=-1) & np.isfinite(self.theta) & np.isfinite(self.m2)
+
+    def get_beams(self, initial_z: float = 0) -> EllipticalGaussianBeamEnsemble:
+        """Returns the fitted beams as an ensemble located at initial_z; the fits that are not valid have NaN matrices."""
+        return EllipticalGaussianBeamEnsemble(
+            initial_z, self.z0[:, 0], self.z0[:, 1], self.theta, self.w0[:, 0], self.w0[:, 1], self.wavelength, self.m2
+        )
+
+
+def fit_caustics(z: np.ndarray,
+                 moments: Union[np.ndarray, BeamShapeArray],
+                 wavelength: Union[float, np.ndarray]) -> CausticFit:
+    """Fits the waist positions, waist radii, orientation and beam quality factor of N beams to their second moments at several planes.
+
+    Along free space the Binv matrix of a beam grows linearly, Binv(z) = Binv(0) + i lambda m2 z / pi, so every entry of its second
+    moment matrix M(z) = inv(4 Re(B(z))) is a quadratic polynomial of z (c.f. ISO 11146). The three polynomials of each series are
+    found with one batched linear least squares problem, and the beam axes are the angle that diagonalizes the fitted moments best
+    over the measured planes. Along each axis the diameter follows (2 w(z))^2 = 4 w0^2 + 4 (lambda m2 / (pi w0))^2 (z - z0)^2, from
+    which the waist and the beam quality factor of the axis follow in closed form. No iterative optimization is involved, so
+    thousands of series are fitted in milliseconds.
+
+    The beams are modelled as simple astigmatic, with fixed axes; for a beam with general astigmatism the axes are the best
+    compromise over the planes. Missing measurements are given as NaN and are left out of their series. A series with fewer than
+    3 planes, or whose moments do not curve upwards along both axes, gets NaN parameters (c.f. CausticFit.valid).
+
+    Args:
+        z (np.ndarray): The positions of the planes in m, either shared with the shape (n_z,) or per series with the shape (N, n_z).
+        moments (Union[np.ndarray, BeamShapeArray]): The second moment matrices in m^2 with the shape (N, n_z, 2, 2), e.g. the moments
+            of a BeamProfile, or the measured beam shapes with the shape (N, n_z), whose radii are twice the second moment widths.
+        wavelength (Union[float, np.ndarray]): The wavelength of the beams in m, shared or one per series.
+
+    Returns:
+        CausticFit: The fitted parameters of every series.
+    """
+    if isinstance(moments, BeamShapeArray):
+        moments = _get_moments_from_shapes(moments)
+    moments = np.asarray(moments, dtype=np.float64)
+    assert moments.ndim == 4 and moments.shape[2:] == (2, 2), f"The moments must have the shape (N, n_z, 2, 2), got {moments.shape}."
+    n, n_z = moments.shape[:2]
+    z = np.broadcast_to(np.asarray(z, dtype=np.float64), (n, n_z))
+    wavelength = np.broadcast_to(np.asarray(wavelength, dtype=np.float64), (n,)).copy()
+
+    # The components (sxx, syy, sxy) at every plane, with the missing planes left out through zero weights
+    y = np.stack([moments[..., 0, 0], moments[..., 1, 1], (moments[..., 0, 1] + moments[..., 1, 0]) / 2], axis=-1)
+    weights = np.all(np.isfinite(y), axis=-1) & np.isfinite(z)
+    y, t = np.where(weights[..., None], y, 0), np.where(weights, z, 0)
+    n_points = weights.sum(axis=-1)
+
+    # The planes are centered and scaled per series, so that the normal equations stay well conditioned
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = t.sum(axis=-1) / n_points
+        scale = np.sqrt(np.where(weights, (t - center[:, None])**2, 0).sum(axis=-1) / n_points)
+        scale = np.where(scale > 0, scale, 1)
+        t = np.where(weights, (t - center[:, None]) / scale[:, None], 0)
+    V = np.stack([np.ones_like(t), t, t**2], axis=-1) * weights[..., None] # (N, n_z, 3)
+
+    fitted = n_points >= 3
+    G = np.einsum("nki,nkj->nij", V, V)
+    G[~fitted] = np.eye(3)
+    coefficients = np.linalg.solve(G, np.einsum("nki,nkc->nic", V, y)) # (N, 3, 3) for (1, t, t^2) x (sxx, syy, sxy)
+    coefficients[~fitted] = np.nan
+
+    residuals = np.sqrt(np.sum(((V @ coefficients - y) * weights[..., None])**2, axis=(1, 2)) / (3 * n_points))
+
+    theta = _get_axes_angle(coefficients, G)
+    c, s = np.cos(theta)[:, None], np.sin(theta)[:, None]
+    p, q, r = coefficients[..., 0], coefficients[..., 1], coefficients[..., 2]
+    axes = np.stack([p * c**2 + q * s**2 + 2 * r * c * s, p * s**2 + q * c**2 - 2 * r * c * s], axis=1) # (N, 2, 3) variances per axis
+
+    # Per axis the variance is alpha + beta t + gamma t^2 = (w0^2 + (lambda m2 / (pi w0))^2 (z - z0)^2) / 4
+    alpha, beta, gamma = axes[..., 0], axes[..., 1], axes[..., 2]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gamma = np.where(gamma > 0, gamma, np.nan)
+        t0 = -beta / (2 * gamma)
+        w0 = np.sqrt(4 * (alpha - beta**2 / (4 * gamma)))
+        z0 = center[:, None] + scale[:, None] * t0
+        m2_axes = np.pi * w0 * 2 * np.sqrt(gamma) / (scale[:, None] * wavelength[:, None])
+
+    return CausticFit(z0, w0, theta, np.sqrt(m2_axes[:, 0] * m2_axes[:, 1]), m2_axes, residuals, n_points, wavelength)
+
+def _get_axes_angle(coefficients: np.ndarray, G: np.ndarray) -> np.ndarray:
+    """Returns the angles in [0, pi/2) of the axes that minimize the sum of squares of the off diagonal moments over the planes.
+
+    Rotated by theta, the off diagonal moment is r cos(2 theta) + (q - p) / 2 sin(2 theta), which is linear in the fitted coefficients,
+    so its sum of squares over the planes is a quadratic form in (cos(2 theta), sin(2 theta)) through the Gram matrix G of the planes.
+    Its smallest eigenvector gives 2 theta."""
+    p, q, r = coefficients[..., 0], coefficients[..., 1], coefficients[..., 2]
+    uv = np.stack([r, (q - p) / 2], axis=-1) # (N, 3, 2)
+    _, eigenvectors = eigh2(np.swapaxes(uv, -1, -2) @ G @ uv)
+    return np.mod(np.arctan2(eigenvectors[..., 1, 0], eigenvectors[..., 0, 0]) / 2, np.pi / 2)
+
+def _get_moments_from_shapes(shapes: BeamShapeArray) -> np.ndarray:
+    """Returns the second moment matrices with the shape (..., 2, 2) of beam shapes with the shape (...)."""
+    c, s = np.cos(shapes.orientation), np.sin(shapes.orientation)
+    vx, vy = shapes.radius_x**2 / 4, shapes.radius_y**2 / 4
+    return np.stack([
+        np.stack([vx * c**2 + vy * s**2, (vx - vy) * c * s], axis=-1),
+        np.stack([(vx - vy) * c * s, vx * s**2 + vy * c**2], axis=-1)
+    ], axis=-2)
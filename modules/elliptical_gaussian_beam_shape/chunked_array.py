@@ -0,0 +1,160 @@
+import numpy as np
+import hashlib
+import json
+import os
+
+METADATA_SUFFIX = ".json"
+
+def get_metadata_path(path: str) -> str:
+    return path + METADATA_SUFFIX
+
+def read_metadata(path: str) -> dict:
+    """Returns the sidecar of a .npy file written by a ChunkedArrayWriter."""
+    with open(get_metadata_path(path), "r") as file:
+        return json.load(file)
+
+def open_array(path: str, mode: str = "r") -> np.memmap:
+    """Opens a .npy file as a memory map, so that only the slices that are accessed are read from the disk."""
+    return np.load(path, mmap_mode=mode)
+
+def get_inputs_hash(*inputs) -> str:
+    """Returns the SHA-256 digest of the numerical inputs an array is computed from, e.g. the parameters of a beam, so that a
+    ChunkedArrayWriter only resumes a file that was computed from the same inputs. Every input is converted to a NumPy array."""
+    digest = hashlib.sha256()
+    for v in inputs:
+        array = np.ascontiguousarray(v)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def is_complete(path: str) -> bool:
+    """Whether all the chunks of a .npy file written by a ChunkedArrayWriter have been written."""
+    if not os.path.exists(path) or not os.path.exists(get_metadata_path(path)):
+        return False
+    metadata = read_metadata(path)
+    return len(metadata["completed"]) == metadata["n_chunks"]
+
+
+class ChunkedArrayWriter:
+    """Writes a .npy file chunk by chunk along one axis through a memory map, so that the array never has to fit in memory.
+
+    The layout and the progress of the file are recorded in a small JSON sidecar next to it (c.f. get_metadata_path), which is
+    updated after every chunk, together with the metadata and the digest of the inputs of the array (c.f. get_inputs_hash).
+    Opening the same path again with the same layout, metadata and inputs resumes an interrupted write: get_missing_chunks
+    only returns the chunks that were not recorded as written. An existing file that does not match is never resumed, since its
+    completed chunks would be mixed with chunks of a different array.
+    """
+
+    path: str
+    shape: tuple
+    dtype: np.dtype
+    axis: int
+    chunk_size: int
+    metadata: dict
+    inputs_hash: str
+    array: np.memmap
+    completed: set
+
+    def __init__(self,
+                 path: str,
+                 shape: tuple,
+                 dtype = np.float64,
+                 axis: int = 0,
+                 chunk_size: int = 1,
+                 metadata: dict = None,
+                 inputs_hash: str = None,
+                 resume: bool = True,
+                 overwrite: bool = False):
+        """
+        Args:
+            path (str): The path of the .npy file.
+            shape (tuple): The shape of the whole array.
+            dtype: The type of the array.
+            axis (int): The axis along which the array is split into chunks.
+            chunk_size (int): The number of entries of each chunk along the axis; the last chunk may be shorter.
+            metadata (dict, optional): Additional JSON serializable information stored in the sidecar, e.g. the grids of the array.
+            inputs_hash (str, optional): The digest of the inputs the array is computed from (c.f. get_inputs_hash), which are not
+                part of the metadata, e.g. the beam.
+            resume (bool): Whether to continue an existing file with the same layout, metadata and inputs, rather than starting it again.
+            overwrite (bool): Whether to start an existing file that does not match again when resuming, rather than raising a ValueError.
+        """
+        self.path = path
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.axis = axis % len(self.shape)
+        self.chunk_size = int(chunk_size)
+        self.metadata = {} if metadata is None else metadata
+        self.inputs_hash = inputs_hash
+        assert self.chunk_size > 0, f"The chunk size must be positive, got {chunk_size}."
+
+        resume = resume and os.path.exists(path) and os.path.exists(get_metadata_path(path))
+        if resume:
+            mismatches = self._get_mismatches(read_metadata(path))
+            if mismatches and not overwrite:
+                raise ValueError(f"The existing file {path} does not match the array being written, so it cannot be resumed: "
+                                 f"its {', '.join(mismatches)} differ. Pass overwrite=True to start it again.")
+            resume = not mismatches
+        if resume:
+            self.array = np.lib.format.open_memmap(path, mode="r+")
+            self.completed = set(read_metadata(path)["completed"])
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.array = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=self.shape)
+            self.completed = set()
+        self._save_metadata()
+
+    @property
+    def n_chunks(self) -> int:
+        return -(-self.shape[self.axis] // self.chunk_size)
+
+    def get_chunk_slice(self, i: int) -> tuple:
+        """Returns the index of the i-th chunk into the whole array."""
+        index = [slice(None)] * len(self.shape)
+        index[self.axis] = slice(i * self.chunk_size, min((i + 1) * self.chunk_size, self.shape[self.axis]))
+        return tuple(index)
+
+    def get_missing_chunks(self) -> list:
+        return [i for i in range(self.n_chunks) if i not in self.completed]
+
+    def is_complete(self) -> bool:
+        return len(self.completed) == self.n_chunks
+
+    def write_chunk(self, i: int, data: np.ndarray = None):
+        """Writes the i-th chunk and records it in the sidecar. Without data, the chunk is only recorded, e.g. after it has been
+        filled in place through array[get_chunk_slice(i)]."""
+        assert 0 <= i < self.n_chunks, f"The chunk index {i} is out of the range of the {self.n_chunks} chunks."
+        if data is not None:
+            self.array[self.get_chunk_slice(i)] = data
+        self.array.flush()
+        self.completed.add(i)
+        self._save_metadata()
+
+    def _get_layout(self) -> dict:
+        return {
+            "shape": list(self.shape),
+            "dtype": self.dtype.str,
+            "axis": self.axis,
+            "chunk_size": self.chunk_size,
+            "n_chunks": self.n_chunks
+        }
+
+    def _get_mismatches(self, sidecar: dict) -> list:
+        """Returns the names of the parts of an existing sidecar that differ from the array being written."""
+        layout = self._get_layout()
+        mismatches = [k for k in layout.keys() if sidecar.get(k) != layout[k]]
+        # The metadata is compared as it is stored, e.g. with tuples turned into lists
+        if sidecar.get("metadata") != json.loads(json.dumps(self.metadata)):
+            mismatches.append("metadata")
+        if sidecar.get("inputs_hash") != self.inputs_hash:
+            mismatches.append("inputs")
+        return mismatches
+
+    def _save_metadata(self):
+        # The sidecar is replaced atomically, so that an interruption never leaves it half written
+        sidecar = dict(self._get_layout(), completed=sorted(self.completed), metadata=self.metadata, inputs_hash=self.inputs_hash)
+        temporary_path = get_metadata_path(self.path) + ".tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(sidecar, file)
+        os.replace(temporary_path, get_metadata_path(self.path))
@@ -19,4 +19,8 @@ class CylindricalLens(EllipticalLens):
             theta,
             wavelength,
             fx = f,
-        )
\ No newline at end of file
+        )
+
+    def set_focal_length(self, f: float):
+        """Tunes the focal length of the cylindrical lens in m."""
+        self.set_focal_lengths(fx = f)
\ No newline at end of file
@@ -0,0 +1,92 @@
+from .beam import _get_beam_shape_arrays
+from ._linalg import inv2, eigh2
+
+from dataclasses import dataclass
+import numpy as np
+
+ROOT_TOLERANCE = 1e-9 # The tolerance relative to the length of an edge within which the roots at its ends are kept
+
+@dataclass
+class EdgeExtrema:
+    """The positions of the extrema of every beam path along every edge of an OpticalTable (c.f. OpticalTable.get_edge_extrema).
+
+    The positions are distances in m from the node where the beam path enters the edge, i.e. from the first node of the edge for
+    forward beam paths and from the second one for backward beam paths, and lie within [0, distance]. The arrays have the shape
+    (n_beam_paths, n_edges) in the order of beam_paths and edges, with a trailing axis of 2 for the conditions that can be met twice
+    along an edge; the entries of the edges a beam path does not cross, and the conditions that are not met within an edge, are NaN.
+    """
+
+    edges: list # The edges of the table, in the order of the arrays (c.f. PropagationPlan.edges)
+    min_radius_positions: np.ndarray # The positions of the smallest rms radius sqrt((radius_x^2 + radius_y^2) / 2)
+    min_radii: np.ndarray # The smallest rms radii in m
+    round_positions: np.ndarray # The positions where the beam is round (ellipticity 1), with the shape (..., 2)
+    round_ellipticities: np.ndarray # The ellipticities at round_positions, below 1 for beams with general astigmatism
+    stigmatic_positions: np.ndarray # The positions where the wavefront curvature is equal along both axes, with the shape (..., 2)
+
+    def get_edge_index(self, edge) -> int:
+        return next(j for j, e in enumerate(self.edges) if e is edge)
+
+
+def _get_free_space_extrema(Binv_mat: np.ndarray, propagation_factor: np.ndarray, distance: np.ndarray):
+    """Solves for the extrema of beams propagating in free space over the distances [0, distance], given their Binv matrices at
+    the start with the shape (..., 2, 2) and their propagation factors lambda m2 / pi and distances broadcast to the shape (...).
+
+    Along free space Binv(s) = Q + i a s I, so the width matrix W(s) = inv(Re(B(s))), i.e. 4 times the second moments, is the quadratic
+    W(s) = inv(Br) - a s (inv(Br) Bi + Bi inv(Br)) + a^2 s^2 (Br + Bi inv(Br) Bi) of the B = Br + i Bi matrix at the start, and its
+    trace has a single minimum. The traceless part of B(s) = adj(Binv(s)) / P(s) is d / P(s) with the constant d = ((r - p) / 2, -q)
+    of Q = [[p, q], [q, r]] and the quadratic P(s) = det(Binv(s)). The beam is round where Re(d conj(P(s))) vanishes and its
+    wavefront is stigmatic where Im(d conj(P(s))) vanishes. Both conditions are quadratics along the direction u of d = c u, which
+    is real for beams with simple astigmatism; beams with general astigmatism, whose d is not real up to a phase, are never exactly
+    round or stigmatic, and the roots along the dominant direction of d are returned instead.
+
+    Returns:
+        tuple: The positions and values of the smallest rms radius with the shape (...), the round positions and the ellipticities
+            there, and the stigmatic positions with the shape (..., 2).
+    """
+    a, distance = propagation_factor[..., None, None], np.asarray(distance, dtype=np.float64)
+
+    B_mat = inv2(Binv_mat)
+    Br, Bi = B_mat.real, B_mat.imag
+    Br_inv = inv2(Br)
+    W1 = -a * (Br_inv @ Bi + Bi @ Br_inv)
+    W2 = a**2 * (Br + Bi @ Br_inv @ Bi)
+    tr = lambda M: M[..., 0, 0] + M[..., 1, 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s = np.clip(-tr(W1) / (2 * tr(W2)), 0, distance)
+    min_radii = np.sqrt(tr(Br_inv + s[..., None, None] * W1 + s[..., None, None]**2 * W2) / 2)
+
+    # The traceless part of B(s) is d / P(s), with its dominant real direction u and the complex amplitude c = u^T d
+    p, q, r = Binv_mat[..., 0, 0], Binv_mat[..., 0, 1], Binv_mat[..., 1, 1]
+    d = np.stack([(r - p) / 2, -q], axis=-1)
+    _, eigenvectors = eigh2((d[..., :, None] * d[..., None, :].conj()).real)
+    c = np.sum(eigenvectors[..., :, 1] * d, axis=-1)
+
+    # c conj(P(s)) with P(s) = det(Q) + i a s tr(Q) - a^2 s^2
+    a = propagation_factor
+    coefficients = [c * np.conj(p * r - q**2), -1j * a * c * np.conj(p + r), -a**2 * c]
+    round_positions = _get_quadratic_roots(*[k.real for k in coefficients], distance)
+    stigmatic_positions = _get_quadratic_roots(*[k.imag for k in coefficients], distance)
+
+    # The ellipticities are evaluated at the start of the edge where there is no root, and masked afterwards
+    missing = np.isnan(round_positions)
+    Binv_round = Binv_mat[..., None, :, :] + 1j * (a[..., None] * np.where(missing, 0, round_positions))[..., None, None] * np.eye(2)
+    round_ellipticities = np.where(missing, np.nan, _get_beam_shape_arrays(inv2(Binv_round))[3])
+    return s, min_radii, round_positions, round_ellipticities, stigmatic_positions
+
+def _get_quadratic_roots(c0: np.ndarray, c1: np.ndarray, c2: np.ndarray, distance: np.ndarray) -> np.ndarray:
+    """Returns the real roots of c0 + c1 s + c2 s^2 within [0, distance] in ascending order with the shape (..., 2), padded with NaN.
+    A polynomial that vanishes identically has the single root 0."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discriminant = c1**2 - 4 * c0 * c2
+        sqrt_discriminant = np.sqrt(np.where(discriminant >= 0, discriminant, np.nan))
+
+        # The numerically stable form of the two roots, which also gives the single root -c0 / c1 of the linear case c2 = 0
+        k = -(c1 + np.where(c1 >= 0, 1, -1) * sqrt_discriminant) / 2
+        roots = np.stack([k / c2, c0 / k], axis=-1)
+        roots = np.where(((c0 == 0) & (c1 == 0) & (c2 == 0))[..., None], np.stack([np.zeros_like(c0), np.full_like(c0, np.nan)], axis=-1), roots)
+
+        # The roots at the ends of the edge, e.g. right after a cylindrical lens on a round beam, are kept despite rounding errors
+        tolerance = ROOT_TOLERANCE * distance[..., None]
+        inside = (roots >= -tolerance) & (roots <= distance[..., None] + tolerance)
+    return np.sort(np.where(inside, np.clip(roots, 0, distance[..., None]), np.nan), axis=-1)
@@ -1,3 +1,4 @@
+from typing import Union
 import numpy as np
 
 class EllipticalLens:
@@ -25,23 +26,78 @@ class EllipticalLens:
         self.theta = theta
         self.wavelength = wavelength
         self.phase_adjustment_matrix = self._calculate_phase_adjustment_matrix()
+        self._nodes = []
 
-    def get_phase_adjustment_matrix(self):
-        return self.phase_adjustment_matrix
+    @classmethod
+    def _from_phase_adjustment_matrix(cls, theta: float, wavelength: float, fx: float, fy: float, phase_adjustment_matrix: np.ndarray) -> 'EllipticalLens':
+        """Creates a lens of any of the lens classes from its focal lengths and its phase adjustment matrix, without evaluating the
+        matrix again, e.g. with the matrices of many lenses evaluated at once (c.f. _get_phase_adjustment_matrices)."""
+        l = cls.__new__(cls)
+        l.fx, l.fy, l.theta, l.wavelength = fx, fy, theta, wavelength
+        l.phase_adjustment_matrix = phase_adjustment_matrix
+        l._nodes = []
+        return l
+
+    def get_phase_adjustment_matrix(self, wavelength: Union[float, np.ndarray] = None) -> np.ndarray:
+        """Returns the phase adjustment matrix of the lens, at its own wavelength or at any other wavelengths.
+
+        The focal lengths are taken as independent of the wavelength, so the matrix scales as 1 / wavelength; beams of several
+        wavelengths can therefore share one lens object (c.f. the chromatic options of EllipticalGaussianBeamEnsemble and PropagationPlan).
+
+        Args:
+            wavelength (Union[float, np.ndarray], optional): The wavelengths in m at which to evaluate the matrix, e.g. the wavelengths
+                of a beam ensemble. By default the wavelength of the lens.
+
+        Returns:
+            np.ndarray: The matrix with the shape (2, 2), or with the shape (..., 2, 2) for an array of wavelengths.
+        """
+        if wavelength is None:
+            return self.phase_adjustment_matrix
+        return _get_phase_adjustment_matrices(self.theta, np.asarray(wavelength, dtype=np.float64), self.fx, self.fy)
+
+    def set_focal_lengths(self, fx: float = None, fy: float = None):
+        """Tunes the focal lengths of the lens. The nodes holding the lens are notified of the change.
+
+        Args:
+            fx (float, optional): The new focal length along the x axis of the lens in m. Unchanged if not provided.
+            fy (float, optional): The new focal length along the y axis of the lens in m. Unchanged if not provided.
+        """
+        self.fx = self.fx if fx is None else fx
+        self.fy = self.fy if fy is None else fy
+        self._update()
+
+    def set_theta(self, theta: float):
+        """Rotates the lens. The nodes holding the lens are notified of the change.
+
+        Args:
+            theta (float): The new angle between the x-axis of the lens and the reference x axis in rad.
+        """
+        self.theta = theta
+        self._update()
+
+    def _update(self):
+        self.phase_adjustment_matrix = self._calculate_phase_adjustment_matrix()
+        for n in self._nodes:
+            n._mark_dirty()
 
     def _calculate_phase_adjustment_matrix(self):
-        c = np.cos(self.theta)
-        s = np.sin(self.theta)
+        return _get_phase_adjustment_matrices(self.theta, self.wavelength, self.fx, self.fy)
+
+def _get_phase_adjustment_matrices(theta, wavelength, fx = np.inf, fy = np.inf) -> np.ndarray:
+    """Vectorized equivalent of EllipticalLens.get_phase_adjustment_matrix. All the arguments are broadcast together,
+    and the phase adjustment matrices are returned with the shape (..., 2, 2)."""
+    c = np.cos(theta)[..., None, None]
+    s = np.sin(theta)[..., None, None]
+    fx, fy, wavelength = np.asarray(fx)[..., None, None], np.asarray(fy)[..., None, None], np.asarray(wavelength)[..., None, None]
 
-        adjustment_x = +1j * np.pi / self.wavelength / self.fx * np.array([
-            [c**2, c * s],
-            [c * s, s**2]
-        ])
+    adjustment_x = +1j * (np.pi / wavelength / fx) * np.block([
+        [c**2, c * s],
+        [c * s, s**2]
+    ])
 
-        adjustment_y = +1j * np.pi / self.wavelength / self.fy * np.array([
-            [s**2, -s*c],
-            [-s*c, c**2]
-        ])
+    adjustment_y = +1j * (np.pi / wavelength / fy) * np.block([
+        [s**2, -s*c],
+        [-s*c, c**2]
+    ])
 
-        return adjustment_x + adjustment_y
-        
\ No newline at end of file
+    return adjustment_x + adjustment_y
\ No newline at end of file
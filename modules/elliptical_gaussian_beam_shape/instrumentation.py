@@ -0,0 +1,152 @@
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+import tracemalloc
+import threading
+import time
+
+# The profile that is currently recording (c.f. profile), or None while the instrumentation is disabled. The instrumented code
+# only checks this variable, so a disabled instrumentation costs a global lookup per instrumented call. It is shared by all the
+# threads of the process, so the work of a ThreadPoolExecutor is recorded too.
+_active = None
+
+@dataclass
+class Profile:
+    """The counters and timings recorded while a profile is active (c.f. profile).
+
+    A table evaluation propagates the states of every level of a route graph at once (c.f. RouteGraph), so the time of each level
+    is split evenly between the states it computes, and credited to their nodes. The propagation is not split by edge: the time
+    of an edge only covers expanding the routes along it (c.f. PropagationPlan._build_route_graph).
+
+    The counters are recorded by every thread of the process while the profile is active, including the workers of a
+    ThreadPoolExecutor, and are updated under a lock. An evaluation on a ProcessPoolExecutor only records the work done
+    outside of the workers, which run in other processes.
+    """
+
+    timings: dict = field(default_factory=dict) # The total time in s spent in each phase, e.g. "propagate", and in the whole profile, "total"
+    calls: dict = field(default_factory=dict) # The number of calls of each counted operation, e.g. "inv2" or "beam_copy"
+    matrices: dict = field(default_factory=dict) # The number of 2x2 matrices processed by each linear algebra kernel, e.g. "eigh2"
+    node_timings: dict = field(default_factory=dict) # The time in s spent computing the beam states at each node id
+    node_states: dict = field(default_factory=dict) # The number of beam states computed at each node id
+    edge_expansion_timings: dict = field(default_factory=dict) # The time in s spent expanding the routes along each edge, keyed by its node ids (id1, id2)
+    edge_traversals: dict = field(default_factory=dict) # The number of times the routes were expanded along each edge
+    allocated_bytes: int = 0 # The bytes of the beam state arrays allocated by the evaluations
+    peak_memory: int = None # The peak memory traced in bytes, if the profile traces memory
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def get_hot_nodes(self, n: int = 10) -> list:
+        """Returns the n nodes that took the longest, as (node id, time in s) pairs in descending order."""
+        return sorted(self.node_timings.items(), key=lambda item: -item[1])[:n]
+
+    def get_hot_edges(self, n: int = 10) -> list:
+        """Returns the n edges whose routes took the longest to expand, as ((id1, id2), time in s) pairs in descending order."""
+        return sorted(self.edge_expansion_timings.items(), key=lambda item: -item[1])[:n]
+
+    def get_summary(self, n: int = 10) -> str:
+        """Returns a printable summary of the phases, the operation counts, and the n slowest nodes and edges."""
+        lines = ["Phases:"]
+        lines += [f"  {name:<24} {t * 1e3:10.3f} ms" for name, t in sorted(self.timings.items(), key=lambda item: -item[1])]
+        lines += ["Operations:"]
+        lines += [
+            f"  {name:<24} {count:10d} calls" + (f" {self.matrices[name]:12d} matrices" if name in self.matrices else "")
+            for name, count in sorted(self.calls.items())
+        ]
+        lines += [f"Allocated state arrays: {self.allocated_bytes} B"]
+        if self.peak_memory is not None:
+            lines += [f"Peak traced memory: {self.peak_memory} B"]
+        lines += ["Slowest nodes:"]
+        lines += [f"  {str(id):<24} {t * 1e3:10.3f} ms {self.node_states[id]:8d} states" for id, t in self.get_hot_nodes(n)]
+        lines += ["Slowest edges to expand:"]
+        lines += [f"  {f'{e[0]} -> {e[1]}':<24} {t * 1e3:10.3f} ms {self.edge_traversals[e]:8d} traversals" for e, t in self.get_hot_edges(n)]
+        return "\n".join(lines)
+
+    def _add_time(self, name: str, elapsed: float):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def _add_call(self, name: str, A = None):
+        """Counts a call of an operation, and the 2x2 matrices of its input A with the shape (..., 2, 2) if given."""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if A is not None:
+                self.matrices[name] = self.matrices.get(name, 0) + A.size // 4
+
+    def _add_states(self, node_ids: list, elapsed: float):
+        """Credits the time of computing one state at each of the given nodes, split evenly."""
+        share = elapsed / len(node_ids)
+        with self._lock:
+            for id in node_ids:
+                self.node_timings[id] = self.node_timings.get(id, 0.0) + share
+                self.node_states[id] = self.node_states.get(id, 0) + 1
+
+    def _add_traversal(self, edge_key: tuple, elapsed: float):
+        with self._lock:
+            self.edge_expansion_timings[edge_key] = self.edge_expansion_timings.get(edge_key, 0.0) + elapsed
+            self.edge_traversals[edge_key] = self.edge_traversals.get(edge_key, 0) + 1
+
+    def _add_allocation(self, n_bytes: int):
+        with self._lock:
+            self.allocated_bytes += n_bytes
+
+
+class _Timer:
+    """Adds the time spent within a with block to a phase of a profile."""
+
+    __slots__ = ("profile", "name", "start")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profile._add_time(self.name, time.perf_counter() - self.start)
+
+
+_NULL_TIMER = nullcontext()
+
+def timer(name: str):
+    """Returns a context manager that adds the time spent within it to the phase name of the active profile, or does nothing."""
+    return _NULL_TIMER if _active is None else _Timer(_active, name)
+
+def is_enabled() -> bool:
+    return _active is not None
+
+@contextmanager
+def profile(trace_memory: bool = False):
+    """Records the operations of OpticalTable, Node and EllipticalGaussianBeam within a with block, e.g.
+
+        with profile() as p:
+            table.evolve_beams()
+        print(p.get_summary())
+
+    The instrumentation is disabled outside of the block. Nested profiles record into the innermost one only. The profile records
+    the work of every thread of the process while the block runs, so profiles should not be entered by several threads at once.
+
+    Args:
+        trace_memory (bool): Whether to also trace the peak memory allocated within the block with tracemalloc, which slows
+            down every allocation.
+
+    Yields:
+        Profile: The profile that records the operations, complete once the block exits.
+    """
+    global _active
+    p, previous = Profile(), _active
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif trace_memory:
+        tracemalloc.reset_peak()
+
+    _active = p
+    start = time.perf_counter()
+    try:
+        yield p
+    finally:
+        p.timings["total"] = time.perf_counter() - start
+        _active = previous
+        if trace_memory:
+            p.peak_memory = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
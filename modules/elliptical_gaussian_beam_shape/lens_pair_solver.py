@@ -0,0 +1,270 @@
+from .beam import EllipticalGaussianBeam
+from .beam_ensemble import EllipticalGaussianBeamEnsemble
+from .cylindrical_lens import CylindricalLens
+from .lens_pair_sweep import SWEEP_AXES
+from ._linalg import inv2
+
+from dataclasses import dataclass
+from typing import Sequence, Union
+import numpy as np
+import time
+
+NON_NEGATIVE_PARAMETERS = ("separation", "z") # The distances, which are kept non negative when they are free
+
+@dataclass
+class LensPairSolution:
+    """The result of solve_cylindrical_lens_pair, with one entry per input beam."""
+
+    parameters: dict # The solved value of every parameter in SWEEP_AXES with the shape (N,)
+    wavelength: np.ndarray # Shape (N,) in m
+    cost: np.ndarray # Half the sum of the squared residuals, with the shape (N,)
+    converged: np.ndarray # Whether each solve met the tolerance with a physical geometry, with the shape (N,)
+    iterations: np.ndarray # The number of iterations of each solve, with the shape (N,)
+    n_evaluations: int # The number of batched evaluations of the residuals and their Jacobians
+    elapsed: float # The wall time of the whole batch in s
+
+    def get_lenses(self, i: int) -> tuple:
+        """Returns the two solved CylindricalLens objects of the i-th beam."""
+        p = {name: v[i] for name, v in self.parameters.items()}
+        return (
+            CylindricalLens(p["theta1"], self.wavelength[i], f = p["f1"]),
+            CylindricalLens(p["theta2"], self.wavelength[i], f = p["f2"])
+        )
+
+
+def solve_cylindrical_lens_pair(beams: Union[EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble, Sequence[EllipticalGaussianBeam]],
+                                initial: dict,
+                                free: Sequence[str] = SWEEP_AXES,
+                                target_radius: Union[float, np.ndarray] = None,
+                                n_angle_starts: int = 2,
+                                max_iterations: int = 100,
+                                tolerance: float = 1e-20,
+                                damping: float = 1e-3) -> LensPairSolution:
+    """Finds the parameters of a pair of cylindrical lenses that turn each input beam into a round and stigmatic waist
+    at the observation plane, with the same geometry as sweep_cylindrical_lens_pair.
+
+    The B matrix at the observation plane is matched to the target with a batched Levenberg-Marquardt solver. The residuals
+    are the anisotropy of Re(B) and the whole of Im(B) relative to the mean of the diagonal of Re(B), or, if a target radius
+    is given, the difference between B and the B matrix of a round waist with that radius. Their Jacobians with respect to
+    the free parameters are propagated analytically through the lenses and the free space propagations. The lenses are solved
+    for their optical powers 1/f, so that the focal lengths can pass through infinity and change sign.
+
+    The problem has many local minima, so every beam is solved from several starting points in the same batch and the best
+    solution is kept: the free lens angles are offset by multiples of 180 / n_angle_starts degrees, and every combination
+    is also started with the sign of f1 or f2 flipped if they are free.
+
+    Args:
+        beams (Union[EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble, Sequence[EllipticalGaussianBeam]]): The N beams arriving at the first lens.
+        initial (dict): The initial value of every parameter in SWEEP_AXES, either a scalar or one value per beam.
+            The parameters that are not free keep their initial value. The free distances must not be negative.
+        free (Sequence[str]): The names of the parameters to solve for, by default all of them. With the observation distance z
+            fixed, most beams have no physical solution, i.e. one with non negative distances.
+        target_radius (Union[float, np.ndarray], optional): The radius of the target waist in m. By default any radius is accepted.
+        n_angle_starts (int): The number of starting angles per free lens angle.
+        max_iterations (int): The maximum number of iterations.
+        tolerance (float): The solve of a beam stops once its cost or the squared relative length of its step is below the tolerance.
+        damping (float): The initial Levenberg-Marquardt damping factor.
+
+    Returns:
+        LensPairSolution: The solved parameters and the convergence and timing statistics.
+    """
+    start = time.perf_counter()
+    if isinstance(beams, EllipticalGaussianBeam):
+        beams = [beams]
+    if not isinstance(beams, EllipticalGaussianBeamEnsemble):
+        beams = EllipticalGaussianBeamEnsemble.from_beams(beams)
+
+    for name in SWEEP_AXES:
+        assert name in initial, f"The initial value of {name} is missing."
+    for name in free:
+        assert name in SWEEP_AXES, f"Unknown parameter: {name}, expected one of {SWEEP_AXES}."
+    assert n_angle_starts > 0, f"The number of starting angles must be positive, got {n_angle_starts}."
+    free_indices = np.array([SWEEP_AXES.index(name) for name in free], dtype=int)
+    lower_bounds = np.array([0 if name in NON_NEGATIVE_PARAMETERS else -np.inf for name in free], dtype=np.float64)
+
+    p = np.stack([beams._broadcast_per_beam(initial[name], name) for name in SWEEP_AXES], axis=-1)
+    assert np.all(p[:, free_indices] >= lower_bounds), f"The initial values of the free parameters {NON_NEGATIVE_PARAMETERS} must not be negative."
+    with np.errstate(divide="ignore"):
+        p[:, :2] = 1 / p[:, :2]
+    p = _get_starting_points(p, free, n_angle_starts)
+    n_starts, n_beams = p.shape[0], len(beams)
+
+    # All the starting points of all the beams are solved as one batch
+    target = None if target_radius is None else np.tile(beams._broadcast_per_beam(target_radius, "target_radius"), n_starts)
+    B_mat, wavelength = np.tile(beams.B_mat, (n_starts, 1, 1)), np.tile(beams.wavelength, n_starts)
+    propagation_factor = 1j * wavelength * np.tile(beams.m2, n_starts) / np.pi
+
+    def evaluate(indices, p):
+        return _get_residuals(
+            B_mat[indices], wavelength[indices], propagation_factor[indices], p, free_indices,
+            None if target is None else target[indices]
+        )
+
+    p, cost, converged, iterations, n_evaluations = _levenberg_marquardt(
+        evaluate, p.reshape(-1, len(SWEEP_AXES)), free_indices, max_iterations, tolerance, damping, np.tile(np.arange(n_beams), n_starts),
+        lower_bounds
+    )
+    converged &= np.all(p[:, free_indices] >= lower_bounds, axis=-1)
+
+    best = np.argmin(np.where(np.isnan(cost), np.inf, cost).reshape(n_starts, n_beams), axis=0)
+    best = best * n_beams + np.arange(n_beams)
+    p = p[best]
+    with np.errstate(divide="ignore"):
+        p[:, :2] = 1 / p[:, :2]
+
+    return LensPairSolution(
+        {name: p[:, i] for i, name in enumerate(SWEEP_AXES)},
+        np.array(beams.wavelength),
+        cost[best],
+        converged[best],
+        iterations.reshape(n_starts, n_beams).sum(axis=0),
+        n_evaluations,
+        time.perf_counter() - start
+    )
+
+def _get_starting_points(p: np.ndarray, free: Sequence[str], n_angle_starts: int = 2) -> np.ndarray:
+    """Returns the starting points of every beam with the shape (n_starts, N, 6), c.f. solve_cylindrical_lens_pair."""
+    offsets = {name: np.arange(n_angle_starts) * np.pi / n_angle_starts if name in free else [0] for name in ("theta1", "theta2")}
+    signs = [(1, 1)] + [s for s, name in [((-1, 1), "f1"), ((1, -1), "f2")] if name in free]
+
+    starts = []
+    for offset1 in offsets["theta1"]:
+        for offset2 in offsets["theta2"]:
+            for sign1, sign2 in signs:
+                q = p.copy()
+                q[:, 0] *= sign1
+                q[:, 1] *= sign2
+                q[:, 2] += offset1
+                q[:, 3] += offset2
+                starts.append(q)
+    return np.stack(starts)
+
+def _levenberg_marquardt(evaluate,
+                         p: np.ndarray,
+                         free_indices: np.ndarray,
+                         max_iterations: int,
+                         tolerance: float,
+                         damping: float,
+                         groups: np.ndarray = None,
+                         lower_bounds: np.ndarray = None):
+    """Batched Levenberg-Marquardt iterations over the rows of p, where evaluate(indices, p[indices]) returns the residuals
+    and their Jacobians. Every row stops independently, and only the active rows are evaluated. If the rows are grouped,
+    e.g. the starting points of one beam, the whole group stops once one of its rows reaches a cost below the tolerance.
+    The free parameters are projected onto their lower bounds, if given with the shape (K,), after every step."""
+    r, J = evaluate(slice(None), p)
+    cost = 0.5 * np.sum(r**2, axis=-1)
+    mu = np.full(len(p), damping)
+    converged = cost <= tolerance
+    active = ~converged
+    iterations = np.zeros(len(p), dtype=int)
+    n_evaluations = 1
+
+    identity = np.eye(len(free_indices))
+    while active.any() and n_evaluations <= max_iterations:
+        a = np.flatnonzero(active)
+        JtJ = np.swapaxes(J[a], -1, -2) @ J[a]
+        g = np.swapaxes(J[a], -1, -2) @ r[a][..., None]
+        # Marquardt scaling by the diagonal of JtJ, kept positive definite for parameters that the residuals do not depend on
+        diagonal = np.diagonal(JtJ, axis1=-2, axis2=-1)
+        scaling = (diagonal + 1e-12 * np.mean(diagonal, axis=-1, keepdims=True) + 1e-300)[..., None] * identity
+        A = JtJ + mu[a, None, None] * scaling
+        try:
+            step = -np.linalg.solve(A, g)[..., 0]
+        except np.linalg.LinAlgError:
+            step = -(np.linalg.pinv(A) @ g)[..., 0]
+
+        p_new = p[a].copy()
+        p_new[:, free_indices] += step
+        if lower_bounds is not None:
+            p_new[:, free_indices] = np.maximum(p_new[:, free_indices], lower_bounds)
+            step = p_new[:, free_indices] - p[a][:, free_indices]
+        r_new, J_new = evaluate(a, p_new)
+        cost_new = 0.5 * np.sum(r_new**2, axis=-1)
+        n_evaluations += 1
+        iterations[a] += 1
+
+        # Steps that reduce the cost are accepted and relax the damping, the others are retried with more damping
+        accept = cost_new < cost[a]
+        b = a[accept]
+        p[b], r[b], J[b], cost[b] = p_new[accept], r_new[accept], J_new[accept], cost_new[accept]
+        mu[a] = np.where(accept, np.maximum(mu[a] / 3, 1e-9), mu[a] * 2)
+
+        x = p[a][:, free_indices]
+        small_step = np.sum((step / (np.abs(x) + 1e-12))**2, axis=-1) <= tolerance
+        converged[a] = (cost[a] <= tolerance) | (accept & small_step)
+        active[a] = ~converged[a] & (mu[a] < 1e16)
+        if groups is not None:
+            active &= ~np.isin(groups, groups[cost <= tolerance])
+
+    return p, cost, converged, iterations, n_evaluations
+
+def _get_residuals(B_mat, wavelength, propagation_factor, p, free_indices, target = None):
+    """Returns the residuals with the shape (N, M) and their Jacobians with respect to the free parameters with the shape (N, M, K).
+    The columns of p follow SWEEP_AXES, except that the lenses are given by their optical powers 1/f1 and 1/f2."""
+    power1, power2, theta1, theta2, separation, z = p.T
+    n, k = len(p), len(free_indices)
+    identity = np.eye(2)
+
+    def derivative(name, value):
+        """Returns a (N, K, 2, 2) array with the derivative of a stage with respect to one parameter, zero if it is not free."""
+        d = np.zeros((n, k, 2, 2), dtype=np.complex128)
+        i = np.flatnonzero(free_indices == SWEEP_AXES.index(name))
+        if len(i) > 0:
+            d[:, i[0]] = value
+        return d
+
+    P1, dP1_dpower, dP1_dtheta = _get_cylindrical_lens_derivatives(theta1, power1, wavelength)
+    P2, dP2_dpower, dP2_dtheta = _get_cylindrical_lens_derivatives(theta2, power2, wavelength)
+    a = propagation_factor[:, None, None] * identity
+
+    # Forward mode differentiation of B1 = B0 + P1, Q2 = inv(B1) + a d, B2 = inv(Q2) + P2, Q3 = inv(B2) + a z, B3 = inv(Q3)
+    B1 = B_mat + P1
+    dB1 = derivative("f1", dP1_dpower) + derivative("theta1", dP1_dtheta)
+    Q1 = inv2(B1)
+    Q2 = Q1 + separation[:, None, None] * a
+    dQ2 = -Q1[:, None] @ dB1 @ Q1[:, None] + derivative("separation", a)
+    C2 = inv2(Q2)
+    B2 = C2 + P2
+    dB2 = -C2[:, None] @ dQ2 @ C2[:, None] + derivative("f2", dP2_dpower) + derivative("theta2", dP2_dtheta)
+    D2 = inv2(B2)
+    Q3 = D2 + z[:, None, None] * a
+    dQ3 = -D2[:, None] @ dB2 @ D2[:, None] + derivative("z", a)
+    B3 = inv2(Q3)
+    dB3 = -B3[:, None] @ dQ3 @ B3[:, None]
+
+    if target is not None:
+        # Relative difference to the B matrix of a round waist with the target radius
+        s = 1 / target**2
+        u = _get_components(B3 - s[:, None, None] * identity)
+        return u / s[:, None], _get_components(dB3) / s[:, None, None]
+
+    # The anisotropy of Re(B) and Im(B) relative to the mean eigenvalue of Re(B), all zero for a round and stigmatic waist
+    u, du = _get_components(B3, round_waist = True), _get_components(dB3, round_waist = True)
+    s = (B3[..., 0, 0].real + B3[..., 1, 1].real) / 2
+    ds = (dB3[..., 0, 0].real + dB3[..., 1, 1].real) / 2
+    return u / s[:, None], du / s[:, None, None] - u[..., None] * (ds / s[:, None]**2)[:, None, :]
+
+def _get_components(B: np.ndarray, round_waist: bool = False) -> np.ndarray:
+    """Stacks the independent real components of a stack of complex symmetric matrices with the shape (..., 2, 2)
+    along the second to last axis for Jacobians (..., K, 2, 2), or the last axis for matrices (N, 2, 2)."""
+    axis = -1 if B.ndim == 3 else -2
+    xx, xy, yy = B[..., 0, 0], B[..., 0, 1], B[..., 1, 1]
+    if round_waist:
+        components = [(xx.real - yy.real) / 2, xy.real, xx.imag, xy.imag, yy.imag]
+    else:
+        components = [xx.real, xy.real, yy.real, xx.imag, xy.imag, yy.imag]
+    return np.stack(components, axis=axis)
+
+def _get_cylindrical_lens_derivatives(theta: np.ndarray, power: np.ndarray, wavelength: np.ndarray):
+    """Returns the phase adjustment matrices of cylindrical lenses with the optical power 1/f and their derivatives
+    with respect to the power and theta, each with the shape (N, 2, 2)."""
+    c, s = np.cos(theta)[:, None, None], np.sin(theta)[:, None, None]
+    dP_dpower = 1j * (np.pi / wavelength)[:, None, None] * np.block([
+        [c**2, c * s],
+        [c * s, s**2]
+    ])
+    dP_dtheta = 1j * (np.pi / wavelength * power)[:, None, None] * np.block([
+        [-2 * c * s, c**2 - s**2],
+        [c**2 - s**2, 2 * c * s]
+    ])
+    return power[:, None, None] * dP_dpower, dP_dpower, dP_dtheta
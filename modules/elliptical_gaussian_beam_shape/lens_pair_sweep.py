@@ -0,0 +1,156 @@
+from .beam import EllipticalGaussianBeam, _get_beam_shape_arrays
+from .beam_shape import BeamShapeArray
+from .elliptical_lens import _get_phase_adjustment_matrices
+from ._linalg import inv2, eigvals2, eigvalsh2
+
+from .chunked_array import ChunkedArrayWriter, get_inputs_hash, open_array, read_metadata
+from dataclasses import dataclass
+import numpy as np
+import os
+
+SWEEP_AXES = ("f1", "f2", "theta1", "theta2", "separation", "z")
+SWEEP_FILES = ("shapes.npy", "astigmatism.npy", "waist_mismatch.npy")
+
+@dataclass
+class LensPairSweep:
+    """The maps of a cylindrical lens pair sweep (c.f. sweep_cylindrical_lens_pair). Every map has the shape
+    (n_f1, n_f2, n_theta1, n_theta2, n_separation, n_z), with one axis per grid in the order of SWEEP_AXES."""
+
+    grids: dict # The 1D grid of every axis, keyed by the names in SWEEP_AXES
+    shapes: BeamShapeArray # The beam shapes at the observation planes
+    astigmatism: np.ndarray # The distance between the waists of the two axes of the beam in m
+    waist_mismatch: np.ndarray # One minus the ratio of the smaller to the larger waist radius, 0 for matched waists
+
+    @classmethod
+    def load(cls, path: str, mode: str = "r") -> 'LensPairSweep':
+        """Opens the maps of a sweep written to a directory (c.f. sweep_cylindrical_lens_pair) as memory maps, without reading them."""
+        shapes, astigmatism, waist_mismatch = [open_array(os.path.join(path, name), mode) for name in SWEEP_FILES]
+        metadata = read_metadata(os.path.join(path, SWEEP_FILES[0]))["metadata"]
+        grids = {name: np.array(metadata[name]) for name in SWEEP_AXES}
+        return cls(grids, BeamShapeArray.from_data(shapes), astigmatism, waist_mismatch)
+
+    @property
+    def ellipticity(self) -> np.ndarray:
+        return self.shapes.ellipticity
+
+    def get_best_index(self, weights: tuple = (1, 1, 1), astigmatism_scale: float = None) -> tuple:
+        """Returns the grid index with the roundest and least astigmatic beam, by minimizing the weighted sum of
+        (1 - ellipticity), astigmatism / astigmatism_scale and waist_mismatch.
+
+        Args:
+            weights (tuple): The weights of the ellipticity, astigmatism and waist mismatch terms.
+            astigmatism_scale (float, optional): The length scale of the astigmatism term in m. By default the median astigmatism of the sweep.
+        """
+        if astigmatism_scale is None:
+            astigmatism_scale = np.nanmedian(self.astigmatism)
+        cost = weights[0] * (1 - self.ellipticity) + weights[1] * self.astigmatism / astigmatism_scale + weights[2] * self.waist_mismatch
+        return np.unravel_index(np.nanargmin(cost), cost.shape)
+
+    def get_parameters(self, index: tuple) -> dict:
+        """Returns the value of every swept parameter at a grid index, e.g. the one of get_best_index."""
+        return {name: self.grids[name][i] for name, i in zip(SWEEP_AXES, index)}
+
+
+def sweep_cylindrical_lens_pair(beam: EllipticalGaussianBeam,
+                                f1: np.ndarray,
+                                f2: np.ndarray,
+                                theta1: np.ndarray,
+                                theta2: np.ndarray,
+                                separation: np.ndarray,
+                                z: np.ndarray,
+                                chunk_size: int = 2**18,
+                                path: str = None,
+                                resume: bool = True,
+                                overwrite: bool = False) -> LensPairSweep:
+    """Evaluates the beam after a pair of cylindrical lenses over the Cartesian product of the given grids.
+
+    The beam passes through the first lens, propagates over the separation to the second lens, passes through it and
+    propagates to the observation plane at z after the second lens. Every stage is evaluated only over the grids it depends on,
+    and the product is processed in blocks of the f1 and f2 axes of at most about chunk_size grid points, so that the
+    memory stays bounded for large grids.
+
+    If a path is given, the maps are written to .npy files in that directory (c.f. SWEEP_FILES) as each block of f1 values is
+    completed, rather than being kept in memory, and an interrupted sweep with the same arguments is resumed from the blocks
+    that are missing (c.f. ChunkedArrayWriter). The returned maps are then memory maps of those files (c.f. LensPairSweep.load).
+    A directory holding a sweep of different grids, a different beam or a different chunk size raises a ValueError rather than
+    being resumed, unless overwrite is set.
+
+    Args:
+        beam (EllipticalGaussianBeam): The beam arriving at the first lens.
+        f1 (np.ndarray): The focal lengths of the first lens in m.
+        f2 (np.ndarray): The focal lengths of the second lens in m.
+        theta1 (np.ndarray): The angles of the first lens in rad.
+        theta2 (np.ndarray): The angles of the second lens in rad.
+        separation (np.ndarray): The distances between the two lenses in m.
+        z (np.ndarray): The distances between the second lens and the observation plane in m.
+        chunk_size (int): The approximate number of grid points evaluated at once.
+        path (str, optional): The directory to write the maps to.
+        resume (bool): Whether to continue an existing sweep in the directory, rather than starting it again.
+        overwrite (bool): Whether to start an existing sweep that does not match the arguments again, rather than raising a ValueError.
+
+    Returns:
+        LensPairSweep: The beam shapes, astigmatism and waist mismatch maps over the grids.
+    """
+    grids = {name: np.atleast_1d(np.asarray(g, dtype=np.float64)) for name, g in zip(SWEEP_AXES, (f1, f2, theta1, theta2, separation, z))}
+    for name, g in grids.items():
+        assert g.ndim == 1, f"The grid of {name} must be a scalar or a 1D array, got the shape {g.shape}."
+    assert chunk_size > 0, f"The chunk size must be positive, got {chunk_size}."
+
+    shape = tuple(len(g) for g in grids.values())
+
+    # The number of grid points per f2 value sets how many f1 and f2 values fit in a chunk
+    n_f1, n_f2, inner = shape[0], shape[1], int(np.prod(shape[2:]))
+    f2_step = int(np.clip(chunk_size // inner, 1, n_f2))
+    f1_step = max(1, chunk_size // (n_f2 * inner)) if f2_step == n_f2 else 1
+
+    if path is None:
+        writers = []
+        outputs = [np.empty((4,) + shape), np.empty(shape), np.empty(shape)]
+        f1_blocks = range(-(-n_f1 // f1_step))
+    else:
+        metadata = {name: g.tolist() for name, g in grids.items()}
+        inputs_hash = get_inputs_hash(beam.B_mat, beam.wavelength, beam.m2)
+        writers = [
+            ChunkedArrayWriter(os.path.join(path, name), (4,) + shape if name == SWEEP_FILES[0] else shape, axis = int(name == SWEEP_FILES[0]),
+                               chunk_size = f1_step, metadata = metadata, inputs_hash = inputs_hash, resume = resume, overwrite = overwrite)
+            for name in SWEEP_FILES
+        ]
+        outputs = [w.array for w in writers]
+        f1_blocks = sorted(set().union(*[w.get_missing_chunks() for w in writers]))
+
+    shapes, astigmatism, waist_mismatch = outputs
+    for i in f1_blocks:
+        for j in range(0, n_f2, f2_step):
+            block = (slice(i * f1_step, (i + 1) * f1_step), slice(j, j + f2_step))
+            B_mat, Binv_mat = _propagate_lens_pair(beam, *[g[b] for g, b in zip(grids.values(), block)], *list(grids.values())[2:])
+
+            shapes[(slice(None),) + block] = _get_beam_shape_arrays(B_mat)
+            astigmatism[block], waist_mismatch[block] = _get_waist_maps(B_mat, Binv_mat, beam.wavelength)
+        for w in writers:
+            w.write_chunk(i)
+
+    if path is not None:
+        return LensPairSweep.load(path)
+    return LensPairSweep(grids, BeamShapeArray.from_data(shapes), astigmatism, waist_mismatch)
+
+def _propagate_lens_pair(beam: EllipticalGaussianBeam, f1, f2, theta1, theta2, separation, z):
+    """Returns the B and Binv matrices at the observation planes with the shape (n_f1, n_f2, n_theta1, n_theta2, n_separation, n_z, 2, 2)."""
+    propagation_factor = 1j * beam.wavelength * beam.m2 / np.pi
+    identity = np.eye(2)
+
+    # Each stage only depends on the grids before it, so the broadcast dimensions are introduced one stage at a time
+    P1 = _get_phase_adjustment_matrices(theta1[None, None, :, None, None, None], beam.wavelength, f1[:, None, None, None, None, None])
+    P2 = _get_phase_adjustment_matrices(theta2[None, None, None, :, None, None], beam.wavelength, f2[None, :, None, None, None, None])
+    separation = separation[None, None, None, None, :, None, None, None]
+    z = z[None, None, None, None, None, :, None, None]
+
+    Binv_mat = inv2(beam.B_mat + P1) + propagation_factor * separation * identity
+    Binv_mat = inv2(inv2(Binv_mat) + P2) + propagation_factor * z * identity
+    return inv2(Binv_mat), Binv_mat
+
+def _get_waist_maps(B_mat: np.ndarray, Binv_mat: np.ndarray, wavelength: float):
+    """Returns the astigmatism and the waist mismatch of a stack of beams, c.f. EllipticalGaussianBeam.get_beam_waist_locations
+    and EllipticalGaussianBeam.get_beam_waists."""
+    locations = [np.pi / wavelength * np.sin(np.angle(e)) / np.abs(e) for e in eigvals2(B_mat)]
+    waists = np.sqrt(eigvalsh2(Binv_mat.real))
+    return np.abs(locations[0] - locations[1]), 1 - waists[..., 0] / waists[..., 1]
@@ -1,8 +1,13 @@
 from .beam import EllipticalGaussianBeam
 from .elliptical_lens import EllipticalLens
+from .propagation_plan import PropagationPlan, RouteGraph, _propagate_route_graph
+from .edge_extrema import EdgeExtrema, _get_free_space_extrema
+from . import instrumentation
 
+from concurrent.futures import Executor
 from typing import List
-from collections import deque
+import numpy as np
+import warnings
 
 class OpticalTable:
 
@@ -12,12 +17,36 @@ class OpticalTable:
     beam_paths: List['BeamPath']
     beam_paths_dict: dict
 
-    def __init__(self):
+    chromatic: bool # Whether the lenses are evaluated at the wavelength of every beam path (c.f. PropagationPlan.propagate)
+
+    # The B and Binv matrices of every beam path at every node after its lenses, with the shape (n_beam_paths, n_nodes, 2, 2)
+    # in the order of beam_paths and nodes, and NaN where a beam path does not reach a node (c.f. get_states)
+    B_states: np.ndarray
+    Binv_states: np.ndarray
+
+    # State of the last evaluation, reused by evolve_beams to recompute only what changed since then
+    _plan: PropagationPlan
+    _path_states: dict
+    _dirty_nodes: set
+    _beam_path_index: dict
+
+    def __init__(self, chromatic: bool = False):
+        """Initialization of an empty optical table.
+
+        Args:
+            chromatic (bool): Whether every beam path sees the lenses at its own wavelength rather than at the wavelengths of
+                the lenses (c.f. EllipticalLens.get_phase_adjustment_matrix), so that beam paths of several wavelengths, e.g.
+                one per laser, share the same lens objects and are all evaluated by a single evolve_beams.
+        """
+        self.chromatic = chromatic
         self.nodes = []
         self.nodes_dict = {}
 
         self.beam_paths = []
         self.beam_paths_dict = {}
+        self._beam_path_index = {}
+
+        self._invalidate_plan()
 
     def add_node(self, id: str = None) -> str:
         if id is None:
@@ -25,8 +54,10 @@ class OpticalTable:
         assert id not in self.nodes_dict.keys(), f"A node with this id: '{id}' already exists in the object."
 
         n = Node(id = id)
+        n._table = self
         self.nodes.append(n)
         self.nodes_dict[id] = n
+        self._invalidate_plan()
         return id
     
     def get_nodes(self) -> dict:
@@ -53,38 +84,183 @@ class OpticalTable:
         b2 = EllipticalGaussianBeam.copy(b)
         bpath = BeamPath(beam_path_id, b2, n, forward)
 
+        self._beam_path_index[beam_path_id] = len(self.beam_paths)
         self.beam_paths.append(bpath)
         self.beam_paths_dict[beam_path_id] = bpath
+        self._invalidate_plan()
 
         return beam_path_id
 
-    def evolve_beams(self):
-        for path_id in self.beam_paths_dict.keys():
-            self._evolve_beam_path(path_id)
-            
-    def _evolve_beam_path(self, id: str):
+    def compile(self) -> PropagationPlan:
+        """Compiles the table into a propagation plan, which can push single beams or beam ensembles
+        through the table without walking the graph again. The plan has to be recompiled after the table is modified."""
+        return PropagationPlan(self)
+
+    def evolve_beams(self, executor: Executor = None):
+        """Evaluates the beam of every beam path at all the nodes it reaches.
+
+        Every beam path is expanded into its distinct routes (c.f. RouteGraph): routes that arrive at a node in the same state are
+        merged, and tables with cycles reachable from an initial node are rejected. Node.get_beam returns the beam of the last route
+        arriving at the node in breadth-first order over all the routes (c.f. RouteGraph.last_states), and Node.get_route_beams
+        returns all the distinct ones.
+
+        The states of the previous evaluation are kept, so after tuning lenses (c.f. EllipticalLens.set_focal_lengths), changing
+        the lenses of a node (c.f. Node.elliptical_lenses) or changing distances (c.f. Edge.distance) only the states downstream of
+        the changes are recomputed. Changing distances or whether a node has lenses also expands the routes of the beam paths through
+        them again, and adding nodes, connections or beam paths triggers a full evaluation.
+
+        Args:
+            executor (Executor, optional): A concurrent.futures executor, e.g. a ThreadPoolExecutor or a ProcessPoolExecutor,
+                on which the beam paths are propagated concurrently. The routes are expanded beforehand and the results are
+                stored afterwards in the order of beam_paths, so the results are identical to the serial evaluation.
+
+        The evaluation can be profiled by running it within instrumentation.profile.
+        """
+        with instrumentation.timer("evolve_beams"):
+            if self._plan is None:
+                with instrumentation.timer("compile"):
+                    self._plan = self.compile()
+                shape = (len(self.beam_paths), len(self.nodes), 2, 2)
+                self.B_states = np.full(shape, np.nan, dtype=np.complex128)
+                self.Binv_states = np.full(shape, np.nan, dtype=np.complex128)
+                if instrumentation._active is not None:
+                    instrumentation._active._add_allocation(self.B_states.nbytes + self.Binv_states.nbytes)
+
+            with instrumentation.timer("prepare"):
+                jobs = [self._prepare_beam_path(path_id) for path_id in self.beam_paths_dict.keys()]
+                jobs = [job for job in jobs if job is not None]
+            with instrumentation.timer("propagate"):
+                if executor is None:
+                    results = [_propagate_route_graph(*args) for _, _, args in jobs]
+                else:
+                    futures = [executor.submit(_propagate_route_graph, *args) for _, _, args in jobs]
+                    results = [f.result() for f in futures]
+
+            with instrumentation.timer("store"):
+                for (id, store, (route_graph, *_)), states in zip(jobs, results):
+                    self._store_beam_path(id, route_graph, states, store)
+            self._dirty_nodes = set()
+
+    def get_states(self, inverse: bool = False) -> np.ndarray:
+        """Returns the results of the last evaluation (c.f. evolve_beams) as a single array, without copying it.
+
+        Args:
+            inverse (bool): Whether to return the Binv matrices instead of the B matrices.
+
+        Returns:
+            np.ndarray: The matrices of every beam path at every node after its lenses, with the shape (n_beam_paths, n_nodes, 2, 2)
+                in the order of beam_paths and nodes. The entries of the nodes that a beam path does not reach are NaN.
+        """
+        assert self._plan is not None, "The table has to be evaluated first (c.f. evolve_beams)."
+        return self.Binv_states if inverse else self.B_states
+
+    def get_edge_extrema(self) -> EdgeExtrema:
+        """Solves in closed form where the beam of every beam path is smallest, round and stigmatic along every edge it crosses,
+        for all the edges and beam paths at once (c.f. _get_free_space_extrema). No sampling along the edges is involved.
+
+        Every edge starts from the beam stored at the node the beam path enters it from (c.f. get_states), so a beam path reaching
+        that node through several distinct routes uses the same route as Node.get_beam. The table has to be evaluated first.
+
+        Returns:
+            EdgeExtrema: The positions of the extrema with the shape (n_beam_paths, n_edges).
+        """
+        assert self._plan is not None, "The table has to be evaluated first (c.f. evolve_beams)."
+        plan = self._plan
+
+        edge_nodes = np.array([[plan.node_index[n.get_id()] for n in e.get_nodes()] for e in plan.edges], dtype=int).reshape(-1, 2)
+        forward = np.array([p.is_forward() for p in self.beam_paths], dtype=bool)
+        start_nodes = np.where(forward[:, None], edge_nodes[:, 0], edge_nodes[:, 1])
+
+        beams = [p.get_beam() for p in self.beam_paths]
+        propagation_factor = np.array([b.wavelength * b.m2 / np.pi for b in beams], dtype=np.float64)
+        Binv_mat = np.take_along_axis(self.Binv_states, start_nodes[..., None, None], axis=1)
+        extrema = _get_free_space_extrema(Binv_mat, propagation_factor[:, None] * np.ones(len(plan.edges)), plan.distances[None, :])
+        return EdgeExtrema(list(plan.edges), *extrema)
+
+    def _prepare_beam_path(self, id: str):
+        """Expands the routes of a beam path and returns the arguments of its propagation (c.f. _propagate_route_graph)
+        together with the mask of the states to store in the table (None for all), or None if none of its states changed."""
         beam_path: BeamPath = self.beam_paths_dict.get(id)
         assert beam_path is not None, f"The beam path with id: {id} has not been defined in this object."
 
-        beam: EllipticalGaussianBeam = beam_path.get_beam()
-        node: Node = beam_path.get_initial_node()
-        
-        q = deque()
-        
-        q.append((node, EllipticalGaussianBeam.copy(beam)))
-        while len(q) > 0:
-            node, beam = q.popleft()
-            node.add_beam(id, beam)
-
-            beam = node.get_beam(id)
-            index = beam_path.is_forward()
-            edges = node.get_forward_edges() if beam_path.is_forward() else node.get_backward_edges()
-            for edge in edges:
-                beam_evolved: EllipticalGaussianBeam = EllipticalGaussianBeam.copy(beam)
-                beam_evolved.evolve(edge.get_distance())
-                q.append((
-                    edge.get_nodes()[index], beam_evolved
-                ))
+        plan = self._plan
+        beam = beam_path.get_beam()
+        route_graph = plan.get_route_graph(beam_path.get_initial_node().get_id(), beam_path.is_forward())
+
+        # The previous states are updated in place if the routes of the path have not been expanded again since then. Otherwise,
+        # e.g. after a distance changed, the states that are the same in both expansions are carried over, and only the others
+        # (i.e. the states downstream of the change) are propagated
+        previous_graph, states = self._path_states.get(id, (None, None))
+        if previous_graph is route_graph:
+            dirty = store = plan._get_dirty_states(route_graph, self._dirty_nodes)
+            if not dirty.any():
+                return None
+        else:
+            dirty, store = None, None
+            if previous_graph is not None:
+                reused = plan._get_reused_states(previous_graph, route_graph)
+                dirty = plan._get_dirty_states(route_graph, self._dirty_nodes, reused < 0)
+                kept = np.flatnonzero(~dirty)
+                states = tuple(np.empty((len(route_graph),) + s.shape[1:], dtype=s.dtype) for s in states)
+                for new, old in zip(states, self._path_states[id][1]):
+                    new[kept] = old[reused[kept]]
+            p = self._beam_path_index[id]
+            self.B_states[p], self.Binv_states[p] = np.nan, np.nan
+
+        phase_matrices = plan._get_phase_matrices(beam, self.chromatic)
+        return id, store, (route_graph, phase_matrices, plan.has_lens, *plan._get_beam_arrays(beam), states, dirty)
+
+    def _store_beam_path(self, id: str, route_graph: RouteGraph, states: tuple, dirty: np.ndarray = None):
+        B_states, Binv_states = states
+        self._path_states[id] = (route_graph, states)
+
+        # Only the last state arriving at each node is stored in the table, c.f. Node.get_route_beams for the others
+        p = self._beam_path_index[id]
+        last_states = np.fromiter(route_graph.last_states.values(), dtype=int)
+        if dirty is not None:
+            last_states = last_states[dirty[last_states]]
+        nodes = route_graph.nodes[last_states]
+        self.B_states[p, nodes] = B_states[last_states, 0]
+        self.Binv_states[p, nodes] = Binv_states[last_states, 0]
+
+    def _get_beam(self, id: str, n: 'Node') -> EllipticalGaussianBeam:
+        if self._plan is None or id not in self._beam_path_index:
+            return None
+        p, i = self._beam_path_index[id], self._plan.node_index[n.get_id()]
+        if np.isnan(self.B_states[p, i, 0, 0]):
+            return None
+
+        # The beam holds copies of the matrices, since the next evaluation overwrites the table arrays in place
+        beam = self.beam_paths[p].get_beam()
+        return EllipticalGaussianBeam._from_Bmats(np.array(self.B_states[p, i]), np.array(self.Binv_states[p, i]), beam.wavelength, beam.m2)
+
+    def _set_beam(self, id: str, n: 'Node', b: EllipticalGaussianBeam):
+        assert self._plan is not None and id in self._beam_path_index, f"The beam path with id: {id} has not been evaluated."
+        p, i = self._beam_path_index[id], self._plan.node_index[n.get_id()]
+        self.B_states[p, i], self.Binv_states[p, i] = b.B_mat, b.Binv_mat
+
+    def _get_route_beams(self, id: str, n: 'Node') -> List[EllipticalGaussianBeam]:
+        route_graph, (B_states, Binv_states) = self._path_states[id]
+        beam = self.beam_paths_dict[id].get_beam()
+        return [
+            self._plan._get_beam(beam, B_states[s], Binv_states[s])
+            for s in route_graph.node_states.get(self._plan.node_index[n.get_id()], [])
+        ]
+
+    def _mark_node_dirty(self, n: 'Node'):
+        if self._plan is not None:
+            self._plan._update_node(n)
+            self._dirty_nodes.add(self._plan.node_index[n.get_id()])
+
+    def _mark_edge_dirty(self, e: 'Edge'):
+        if self._plan is not None:
+            self._plan._update_edge(e)
+
+    def _invalidate_plan(self):
+        self._plan = None
+        self._path_states = {}
+        self._dirty_nodes = set()
+        self.B_states, self.Binv_states = None, None
 
 
 class BeamPath:
@@ -118,26 +294,56 @@ class Node:
     id: str
     forward_edges: List['Edge']
     backward_edges: List['Edge']
-    elliptical_lenses = List[EllipticalLens]
-    beams_dict: dict
+    _elliptical_lenses: '_LensList'
+    _table: OpticalTable
     
     def __init__(self, id: str):
         self.id = id
         self.forward_edges = []
         self.backward_edges = []
-        self.elliptical_lenses = []
-        self.beams_dict = {}
+        self._elliptical_lenses = _LensList(self, [])
+        self._table = None
 
     def get_id(self) -> str:
         return self.id
 
+    @property
+    def elliptical_lenses(self) -> List[EllipticalLens]:
+        """The lenses of the node. Changing the list in place, e.g. node.elliptical_lenses.append(l), or assigning a new list
+        is the same as add_elliptical_lens and remove_elliptical_lens: the table is notified of the change (c.f. _LensList)."""
+        return self._elliptical_lenses
+
+    @elliptical_lenses.setter
+    def elliptical_lenses(self, lenses: List[EllipticalLens]):
+        previous = list(self._elliptical_lenses)
+        self._elliptical_lenses = _LensList(self, lenses)
+        self._update_lenses(previous)
+
     def add_elliptical_lens(self, l: EllipticalLens):
         self.elliptical_lenses.append(l)
 
+    def remove_elliptical_lens(self, l: EllipticalLens):
+        self.elliptical_lenses.remove(l)
+
+    def _update_lenses(self, previous: List[EllipticalLens]):
+        """Registers the node with its current lenses instead of the previous ones, so that tuning them notifies the node,
+        and notifies the table."""
+        for l in previous:
+            l._nodes.remove(self)
+        for l in self._elliptical_lenses:
+            l._nodes.append(self)
+        self._mark_dirty()
+
     def connect_to_node(self, n2: 'Node', distance: float):
         e = Edge(self, n2, distance)
         self.add_forward_edge(e)
         n2.add_backward_edge(e)
+        if self._table is not None:
+            self._table._invalidate_plan()
+
+    def _mark_dirty(self):
+        if self._table is not None:
+            self._table._mark_node_dirty(self)
 
     def get_forward_edges(self):
         return self.forward_edges
@@ -152,30 +358,96 @@ class Node:
         self.backward_edges.append(e)
 
     def add_beam(self, id: str, b: EllipticalGaussianBeam):
+        """Deprecated: the beams are computed by OpticalTable.evolve_beams. Stores a copy of a beam arriving at this node, after
+        the lenses of the node, as the beam of an evaluated beam path of the table. The beam is kept until the next evaluation
+        recomputes the node."""
+        warnings.warn("Node.add_beam is deprecated, the beams are computed by OpticalTable.evolve_beams.", DeprecationWarning, stacklevel=2)
         b = EllipticalGaussianBeam.copy(b)
         for l in self.elliptical_lenses:
             b.apply_elliptical_lens(l)
-        self.beams_dict[id] = b
+        assert self._table is not None, f"The node with id: {self.id} is not part of a table."
+        self._table._set_beam(id, self, b)
 
     def get_beam(self, id: str) -> EllipticalGaussianBeam:
-        return self.beams_dict.get(id)
+        """Returns the beam of a beam path at this node after its lenses, or None if the beam path does not reach it.
+        The beam is a copy of the results of the last evaluation (c.f. OpticalTable.get_states), which is not affected by
+        later evaluations of the table."""
+        if self._table is None:
+            return None
+        return self._table._get_beam(id, self)
     
     def get_beams(self) -> dict:
-        return dict(self.beams_dict)
+        if self._table is None:
+            return {}
+        beams = {id: self.get_beam(id) for id in self._table.beam_paths_dict.keys()}
+        return {id: b for id, b in beams.items() if b is not None}
+
+    @property
+    def beams_dict(self) -> dict:
+        """The beams of every beam path reaching this node, by the id of the beam path (c.f. get_beams). The beams are built from
+        the table on every access, so changes to the dict are not stored."""
+        return self.get_beams()
+
+    def get_route_beams(self, id: str) -> List[EllipticalGaussianBeam]:
+        """Returns the beams of all the distinct routes of a beam path arriving at this node, in breadth-first order.
+        The table has to be evaluated first (c.f. OpticalTable.evolve_beams)."""
+        assert self._table is not None and id in self._table._path_states, f"The beam path with id: {id} has not been evaluated."
+        return self._table._get_route_beams(id, self)
+
+class _LensList(list):
+    """The list of the lenses of a node (c.f. Node.elliptical_lenses), which notifies the node after every change in place."""
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node: Node, lenses: List[EllipticalLens]):
+        super().__init__(lenses)
+        self._node = node
+
+    def __reduce__(self):
+        # Copies and pickles are rebuilt with their items at once, without notifying the node
+        return _LensList, (self._node, list(self))
+
+def _get_notifying_method(name: str):
+    method = getattr(list, name)
+    def notifying_method(self, *args):
+        previous = list(self)
+        result = method(self, *args)
+        self._node._update_lenses(previous)
+        return result
+    notifying_method.__name__ = name
+    return notifying_method
+
+for _name in ("append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse", "__setitem__", "__delitem__", "__iadd__", "__imul__"):
+    setattr(_LensList, _name, _get_notifying_method(_name))
+
 
 class Edge:
 
     n1: Node
     n2: Node
-    distance: float
+    _distance: float
 
     def __init__(self, n1: 'Node', n2: 'Node', distance: float):
         self.n1 = n1
         self.n2 = n2
-        self.distance = distance
+        self._distance = distance
+
+    @property
+    def distance(self) -> float:
+        """The length of the edge in m. Setting it notifies the table, so that only the states downstream of the edge are recomputed."""
+        return self._distance
+
+    @distance.setter
+    def distance(self, distance: float):
+        self._distance = distance
+        if self.n1._table is not None:
+            self.n1._table._mark_edge_dirty(self)
 
     def get_nodes(self):
         return self.n1, self.n2
     
     def get_distance(self):
-        return self.distance
\ No newline at end of file
+        return self.distance
+
+    def set_distance(self, distance: float):
+        self.distance = distance
\ No newline at end of file
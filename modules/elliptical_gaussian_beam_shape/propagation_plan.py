@@ -0,0 +1,374 @@
+from .beam import EllipticalGaussianBeam
+from .beam_ensemble import EllipticalGaussianBeamEnsemble
+from .elliptical_lens import _get_phase_adjustment_matrices
+from ._linalg import inv2
+from . import instrumentation
+
+from typing import Dict, List, Union
+from collections import deque
+import numpy as np
+import time
+
+OFFSET_DECIMALS = 15 # Free space offsets equal up to 1 fm are considered the same when merging routes
+
+class RouteGraph:
+    """The distinct beam states a beam reaches through an optical table from one node in one direction.
+
+    Free space propagations commute, so the state of a beam at a node only depends on the last node with lenses on its route
+    (its anchor) and the total distance travelled since then (its offset). Routes that reach the same node with the same anchor
+    and offset, e.g. the two arms of a diamond with equal lengths, are merged into a single state, and every other distinct route
+    is stored exactly once. State 0 is the initial node, and the states are numbered in breadth-first order of discovery.
+    """
+
+    nodes: np.ndarray # Node index of each state
+    anchors: np.ndarray # The state from which each state is propagated, -1 for the initial state
+    offsets: np.ndarray # The free space distance between the anchor and each state in m
+    levels: List[np.ndarray] # The states grouped by the number of anchors before them, which can be computed together
+    transitions: np.ndarray # Shape (n_transitions, 3); every (state, edge, next state) traversal found while expanding the routes
+    node_states: Dict[int, List[int]] # The distinct states arriving at each reached node
+    last_states: Dict[int, int] # The state of the last route arriving at each reached node (c.f. _get_last_states)
+    node_ids: List[str] # The ids of the nodes of the plan, by which the instrumentation reports the states (c.f. profile)
+
+    def __init__(self, nodes: List[int], anchors: List[int], offsets: List[float], transitions: List[tuple], node_ids: List[str] = None):
+        self.nodes = np.array(nodes, dtype=int)
+        self.node_ids = node_ids
+        self.anchors = np.array(anchors, dtype=int)
+        self.offsets = np.array(offsets, dtype=np.float64)
+        self.transitions = np.array(transitions, dtype=int).reshape(-1, 3)
+
+        generations = np.zeros(len(nodes), dtype=int)
+        for s in range(1, len(nodes)):
+            generations[s] = generations[anchors[s]] + 1
+        self.levels = [np.flatnonzero(generations == g) for g in range(generations.max() + 1)]
+
+        self.node_states = {}
+        for s, n in enumerate(nodes):
+            self.node_states.setdefault(n, []).append(s)
+        self.last_states = self._get_last_states()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _get_last_states(self) -> Dict[int, int]:
+        """Returns the state of the route that arrives last at each node in a breadth-first walk over all the routes, without
+        merging them, i.e. the route with the most edges and, among those, the last one in the order of the edges of every node.
+
+        The merged states are discovered in a different order than the routes arrive (e.g. a state reached through routes of
+        several lengths is only expanded once), so the last route into every state is found by following the transitions in
+        topological order, comparing the routes by their length and then by the transitions they take in the order they were found.
+        """
+        outgoing, incoming = [[] for _ in range(len(self.nodes))], [0] * len(self.nodes)
+        for k, (s, _, t) in enumerate(self.transitions.tolist()):
+            outgoing[s].append((k, t))
+            incoming[t] += 1
+
+        routes = [None] * len(self.nodes) # The (length, transitions) of the last route into every state
+        routes[0] = (0, ())
+        ready = [0]
+        while len(ready) > 0:
+            s = ready.pop()
+            length, transitions = routes[s]
+            for k, t in outgoing[s]:
+                route = (length + 1, transitions + (k,))
+                if routes[t] is None or route > routes[t]:
+                    routes[t] = route
+                incoming[t] -= 1
+                if incoming[t] == 0:
+                    ready.append(t)
+
+        last_states = {}
+        for s, n in enumerate(self.nodes.tolist()):
+            if n not in last_states or routes[s] > routes[last_states[n]]:
+                last_states[n] = s
+        return last_states
+
+
+def _propagate_route_graph(route_graph: RouteGraph,
+                           phase_matrices: np.ndarray,
+                           has_lens: np.ndarray,
+                           B_mat: np.ndarray,
+                           propagation_factor: np.ndarray,
+                           previous: tuple = None,
+                           states: np.ndarray = None):
+    """Implementation of PropagationPlan._propagate_states, with the phase matrices of PropagationPlan._get_phase_matrices.
+    It only depends on arrays and the route graph, so that it can also run in worker processes (c.f. OpticalTable.evolve_beams)."""
+    profile = instrumentation._active
+    if previous is None:
+        n_states, n_beams = len(route_graph), B_mat.shape[0]
+        B_states = np.empty((n_states, n_beams, 2, 2), dtype=np.complex128)
+        Binv_states = np.empty((n_states, n_beams, 2, 2), dtype=np.complex128)
+        states = np.ones(n_states, dtype=bool)
+        if profile is not None:
+            profile._add_allocation(B_states.nbytes + Binv_states.nbytes)
+    else:
+        B_states, Binv_states = previous
+
+    if states[0]:
+        start = time.perf_counter() if profile is not None else 0
+        root = route_graph.nodes[0]
+        B_states[0] = B_mat + phase_matrices[root]
+        Binv_states[0] = inv2(B_states[0])
+        if profile is not None:
+            profile._add_states(_get_state_node_ids(route_graph, [0]), time.perf_counter() - start)
+
+    for level in route_graph.levels[1:]:
+        indices = level[states[level]]
+        if len(indices) == 0:
+            continue
+        start = time.perf_counter() if profile is not None else 0
+        nodes = route_graph.nodes[indices]
+        offsets = route_graph.offsets[indices]
+
+        # The offsets are either shared by the beams or given per beam with the shape (n_states, N), c.f. analyze_tolerances.
+        # Free space only adds to the diagonal of Binv, which is updated in place in the gathered copy of the anchor states
+        Binv_mat = Binv_states[route_graph.anchors[indices]]
+        propagation = offsets.reshape(len(indices), -1) * propagation_factor
+        Binv_mat[..., 0, 0] += propagation
+        Binv_mat[..., 1, 1] += propagation
+        B_mat = inv2(Binv_mat) + phase_matrices[nodes]
+
+        # Only the nodes with lenses change B after the propagation, so the others keep the propagated Binv
+        lens_mask = has_lens[nodes]
+        Binv_mat[lens_mask] = inv2(B_mat[lens_mask])
+
+        B_states[indices], Binv_states[indices] = B_mat, Binv_mat
+        if profile is not None:
+            profile._add_states(_get_state_node_ids(route_graph, indices), time.perf_counter() - start)
+    return B_states, Binv_states
+
+def _get_state_node_ids(route_graph: RouteGraph, indices) -> list:
+    nodes = route_graph.nodes[indices]
+    return [int(n) for n in nodes] if route_graph.node_ids is None else [route_graph.node_ids[n] for n in nodes]
+
+
+class PropagationPlan:
+    """A compiled form of an OpticalTable that can propagate single beams or beam ensembles.
+
+    The nodes are fixed in the order of the table, the lenses of every node are summed into a single phase adjustment matrix,
+    and the distinct routes from each initial node are expanded once into a RouteGraph and reused for every beam. The plan is
+    a snapshot of the table at the time of compilation, so the table has to be compiled again after it is modified.
+    """
+
+    node_ids: List[str]
+    node_index: Dict[str, int]
+    phase_matrices: np.ndarray # Shape (n_nodes, 2, 2)
+    lens_parameters: list # The (theta, fx, fy) of the lenses of every node with the shape (n_lenses, 3), c.f. _get_phase_matrices
+    has_lens: np.ndarray # Shape (n_nodes,)
+    edges: list
+    distances: np.ndarray # Shape (n_edges,)
+    route_graphs: dict
+
+    def __init__(self, table):
+        nodes = table.nodes
+        self.node_ids = [n.get_id() for n in nodes]
+        self.node_index = {id: i for i, id in enumerate(self.node_ids)}
+        self.route_graphs = {}
+
+        self.phase_matrices = np.zeros((len(nodes), 2, 2), dtype=np.complex128)
+        self.lens_parameters = [None] * len(nodes)
+        self.has_lens = np.zeros(len(nodes), dtype=bool)
+        for n in nodes:
+            self._update_node(n)
+
+        self.edges = [e for n in nodes for e in n.get_forward_edges()]
+        self._edge_index = {id(e): i for i, e in enumerate(self.edges)}
+        self.distances = np.array([e.get_distance() for e in self.edges], dtype=np.float64)
+
+        # The (edge index, next node index) pairs of every node in each direction are copied, so that connecting nodes after the
+        # compilation does not change the routes of the plan
+        self._adjacency = {
+            forward: [
+                [(self._edge_index[id(e)], self.node_index[e.get_nodes()[int(forward)].get_id()]) for e in (n.get_forward_edges() if forward else n.get_backward_edges())]
+                for n in nodes
+            ]
+            for forward in (True, False)
+        }
+
+    def get_route_graph(self, node_id: str, forward: bool = True) -> RouteGraph:
+        key = (self.node_index[node_id], forward)
+        if key not in self.route_graphs:
+            self.route_graphs[key] = self._build_route_graph(*key)
+        return self.route_graphs[key]
+
+    def propagate(self,
+                  beam: Union[EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble],
+                  node_id: str,
+                  forward: bool = True,
+                  chromatic: bool = False) -> dict:
+        """Propagates a beam, or all the beams of an ensemble at once, through the table.
+
+        Args:
+            beam (Union[EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble]): The beam(s) arriving at the initial node, before its lenses.
+            node_id (str): The id of the initial node.
+            forward (bool): Whether the beam follows the forward or the backward edges of the table.
+            chromatic (bool): Whether to evaluate the lenses at the wavelength of every beam rather than at their own
+                (c.f. EllipticalLens.get_phase_adjustment_matrix), so that an ensemble spanning a whole spectrum is propagated at once.
+
+        Returns:
+            dict: A map from the id of each reached node to the beam (or ensemble) after the lenses of that node.
+                A node reached through several distinct routes keeps the last route to arrive in breadth-first order (c.f.
+                RouteGraph.last_states and propagate_routes).
+        """
+        assert node_id in self.node_index, f"A node with this id: {node_id} does not exist in the plan."
+        route_graph = self.get_route_graph(node_id, forward)
+
+        states = self._propagate_states(route_graph, beam, chromatic = chromatic)
+        return self._get_beams(route_graph, beam, *states)
+
+    def propagate_routes(self,
+                         beam: Union[EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble],
+                         node_id: str,
+                         forward: bool = True,
+                         chromatic: bool = False) -> dict:
+        """Same as propagate, but returns the beams of all the distinct routes arriving at each node.
+
+        Returns:
+            dict: A map from the id of each reached node to the list of its distinct beams (or ensembles), in breadth-first order.
+        """
+        assert node_id in self.node_index, f"A node with this id: {node_id} does not exist in the plan."
+        route_graph = self.get_route_graph(node_id, forward)
+
+        B_states, Binv_states = self._propagate_states(route_graph, beam, chromatic = chromatic)
+        return {
+            self.node_ids[n]: [self._get_beam(beam, B_states[s], Binv_states[s]) for s in states]
+            for n, states in route_graph.node_states.items()
+        }
+
+    def _get_beam(self, beam, B_mat: np.ndarray, Binv_mat: np.ndarray):
+        """Wraps the state of one route into a beam (or ensemble) like the initial beam."""
+        if isinstance(beam, EllipticalGaussianBeamEnsemble):
+            return EllipticalGaussianBeamEnsemble.from_B_mats(B_mat, beam.wavelength, beam.m2, Binv_mat = Binv_mat)
+        return EllipticalGaussianBeam._from_Bmats(np.array(B_mat[0]), np.array(Binv_mat[0]), beam.wavelength, beam.m2)
+
+    def _get_beams(self, route_graph: RouteGraph, beam, B_states: np.ndarray, Binv_states: np.ndarray) -> dict:
+        """Wraps the last state at each reached node into a beam (or ensemble) like the initial beam."""
+        return {
+            self.node_ids[n]: self._get_beam(beam, B_states[s], Binv_states[s])
+            for n, s in route_graph.last_states.items()
+        }
+
+    def _propagate_states(self, route_graph: RouteGraph, beam, previous: tuple = None, states: np.ndarray = None, chromatic: bool = False):
+        """Computes the B and Binv matrices of every state of a route graph for all the N beams of the input at once,
+        and returns them as two arrays with the shape (n_states, N, 2, 2).
+
+        If the results of a previous evaluation are given together with a boolean mask of states, only the masked states
+        are recomputed in place. The mask must contain every state whose anchor is masked.
+        """
+        phase_matrices = self._get_phase_matrices(beam, chromatic)
+        return _propagate_route_graph(route_graph, phase_matrices, self.has_lens, *self._get_beam_arrays(beam), previous, states)
+
+    def _get_phase_matrices(self, beam, chromatic: bool = False) -> np.ndarray:
+        """Returns the summed phase adjustment matrices of every node for the N beams of the input, evaluated at the wavelength of
+        every beam with the shape (n_nodes, N, 2, 2) if chromatic, or else at the wavelengths of the lenses with the shape (n_nodes, 1, 2, 2)."""
+        if not chromatic:
+            return self.phase_matrices[:, None]
+
+        wavelength = np.atleast_1d(np.asarray(beam.wavelength, dtype=np.float64))
+        phase_matrices = np.zeros((len(self.node_ids), len(wavelength), 2, 2), dtype=np.complex128)
+        for i in np.flatnonzero(self.has_lens):
+            theta, fx, fy = self.lens_parameters[i].T[..., None]
+            phase_matrices[i] = _get_phase_adjustment_matrices(theta, wavelength, fx, fy).sum(axis=0)
+        return phase_matrices
+
+    def _get_beam_arrays(self, beam):
+        """Returns the (N, 2, 2) B matrices of a beam (or ensemble) and its (N,) free space propagation factors."""
+        propagation_factor = 1j * np.atleast_1d(beam.wavelength) * np.atleast_1d(beam.m2) / np.pi
+        return beam.B_mat.reshape(-1, 2, 2), propagation_factor
+
+    def _get_dirty_states(self, route_graph: RouteGraph, node_indices: set, dirty: np.ndarray = None) -> np.ndarray:
+        """Returns the boolean mask of the states affected by a change of the lenses of the given nodes, and of the states of an
+        optional initial mask, i.e. those states and all the states propagated from them."""
+        dirty = np.isin(route_graph.nodes, list(node_indices)) if dirty is None else dirty | np.isin(route_graph.nodes, list(node_indices))
+        for level in route_graph.levels[1:]:
+            dirty[level] |= dirty[route_graph.anchors[level]]
+        return dirty
+
+    def _get_reused_states(self, previous: RouteGraph, route_graph: RouteGraph) -> np.ndarray:
+        """Returns the index of every state of a route graph in a previous expansion of the same routes, or -1 for the states that
+        are not in the previous one. A state is the same if it is at the same node, with the same offset from the same anchor state,
+        so the states upstream of a changed edge or node are found again, and the states downstream of it are not."""
+        previous_index = {
+            (n, a, round(o, OFFSET_DECIMALS)): s
+            for s, (n, a, o) in enumerate(zip(previous.nodes.tolist(), previous.anchors.tolist(), previous.offsets.tolist()))
+        }
+        reused = np.full(len(route_graph), -1, dtype=int)
+        reused[0] = 0 if previous.nodes[0] == route_graph.nodes[0] else -1
+
+        nodes, anchors, offsets = route_graph.nodes.tolist(), route_graph.anchors.tolist(), route_graph.offsets.tolist()
+        for level in route_graph.levels[1:]:
+            for s in level.tolist():
+                anchor = reused[anchors[s]]
+                if anchor >= 0:
+                    reused[s] = previous_index.get((nodes[s], int(anchor), round(offsets[s], OFFSET_DECIMALS)), -1)
+        return reused
+
+    def _update_node(self, node):
+        """Refreshes the summed phase adjustment matrix of a node after its lenses change. Adding the first lens to a node
+        or removing its last one changes which routes can be merged, so the route graphs through the node are expanded again."""
+        i = self.node_index[node.get_id()]
+        self.phase_matrices[i] = 0
+        for l in node.elliptical_lenses:
+            self.phase_matrices[i] += l.get_phase_adjustment_matrix()
+        self.lens_parameters[i] = np.array([(l.theta, l.fx, l.fy) for l in node.elliptical_lenses], dtype=np.float64).reshape(-1, 3)
+
+        has_lens = len(node.elliptical_lenses) > 0
+        if has_lens != self.has_lens[i]:
+            self.has_lens[i] = has_lens
+            self.route_graphs = {k: g for k, g in self.route_graphs.items() if i not in g.node_states}
+
+    def _update_edge(self, edge):
+        """Refreshes the distance of an edge after it changes. The offsets of the routes through the edge change,
+        so the route graphs through it are expanded again."""
+        j = self._edge_index[id(edge)]
+        self.distances[j] = edge.get_distance()
+        self.route_graphs = {k: g for k, g in self.route_graphs.items() if not np.any(g.transitions[:, 1] == j)}
+
+    def _build_route_graph(self, node_index: int, forward: bool) -> RouteGraph:
+        self._assert_acyclic(node_index, forward)
+
+        nodes, anchors, offsets, transitions = [node_index], [-1], [0.0], []
+        state_index = {}
+        profile = instrumentation._active
+
+        q = deque([0])
+        while len(q) > 0:
+            s = q.popleft()
+
+            # The initial state and the states at nodes with lenses are the anchors of the states after them
+            is_anchor = s == 0 or self.has_lens[nodes[s]]
+            anchor, offset = (s, 0.0) if is_anchor else (anchors[s], offsets[s])
+
+            for j, n in self._adjacency[forward][nodes[s]]:
+                start = time.perf_counter() if profile is not None else 0
+                key = (n, anchor, round(offset + self.distances[j], OFFSET_DECIMALS))
+                if key not in state_index:
+                    state_index[key] = len(nodes)
+                    nodes.append(n)
+                    anchors.append(anchor)
+                    offsets.append(offset + self.distances[j])
+                    q.append(state_index[key])
+                transitions.append((s, j, state_index[key]))
+                if profile is not None:
+                    edge_key = (self.node_ids[nodes[s]], self.node_ids[n]) if forward else (self.node_ids[n], self.node_ids[nodes[s]])
+                    profile._add_traversal(edge_key, time.perf_counter() - start)
+
+        return RouteGraph(nodes, anchors, offsets, transitions, self.node_ids)
+
+    def _assert_acyclic(self, node_index: int, forward: bool):
+        """Checks with a depth first search that no cycle can be reached from the initial node, since a beam would go around it forever."""
+        state = {node_index: 0} # 0: on the current search path, 1: finished
+        stack = [(node_index, iter(self._get_next_nodes(node_index, forward)))]
+        while len(stack) > 0:
+            n, next_nodes = stack[-1]
+            m = next(next_nodes, None)
+            if m is None:
+                state[n] = 1
+                stack.pop()
+                continue
+            assert state.get(m) != 0, f"The table has a cycle through the node: {self.node_ids[m]}, which is reachable from the node: {self.node_ids[node_index]}."
+            if m not in state:
+                state[m] = 0
+                stack.append((m, iter(self._get_next_nodes(m, forward))))
+
+    def _get_next_nodes(self, node_index: int, forward: bool) -> List[int]:
+        return [n for _, n in self._adjacency[forward][node_index]]
@@ -19,4 +19,8 @@ class SphericalLens(EllipticalLens):
             wavelength,
             fx = f,
             fy = f
-        )
\ No newline at end of file
+        )
+
+    def set_focal_length(self, f: float):
+        """Tunes the focal length of the spherical lens in m."""
+        self.set_focal_lengths(fx = f, fy = f)
\ No newline at end of file
@@ -0,0 +1,69 @@
+from .beam import EllipticalGaussianBeam
+from .beam_shape import BeamShapeArray
+
+from .chunked_array import ChunkedArrayWriter, get_inputs_hash, open_array, read_metadata
+import numpy as np
+
+def save_beam_shapes(path: str, shapes: BeamShapeArray, metadata: dict = None, chunk_size: int = None):
+    """Writes a shape array, e.g. a trace, to a .npy file with the shape (4, ...) and a JSON sidecar (c.f. ChunkedArrayWriter).
+
+    Args:
+        path (str): The path of the .npy file.
+        shapes (BeamShapeArray): The shapes to be written; a memory mapped array is copied chunk by chunk.
+        metadata (dict, optional): Additional JSON serializable information stored in the sidecar.
+        chunk_size (int, optional): The number of shapes along the first axis of the shape array written at once, by default all of them.
+    """
+    shape = shapes.data.shape
+    chunk_size = shape[1] if chunk_size is None else chunk_size
+    writer = ChunkedArrayWriter(path, shape, shapes.data.dtype, axis=1, chunk_size=max(1, chunk_size), metadata=metadata, resume=False)
+    for i in writer.get_missing_chunks():
+        writer.write_chunk(i, shapes.data[writer.get_chunk_slice(i)])
+
+def load_beam_shapes(path: str, mode: str = "r") -> BeamShapeArray:
+    """Opens a shape array written by save_beam_shapes as a memory map, without reading it."""
+    return BeamShapeArray.from_data(open_array(path, mode))
+
+def render_intensity_to_file(beam: EllipticalGaussianBeam,
+                             path: str,
+                             x: np.ndarray,
+                             y: np.ndarray,
+                             z: np.ndarray,
+                             lenses: dict = None,
+                             dtype = np.float32,
+                             chunk_size: int = None,
+                             power: float = 1,
+                             resume: bool = True,
+                             overwrite: bool = False) -> np.memmap:
+    """Renders the intensity of a beam (c.f. EllipticalGaussianBeam.render_intensity) directly into a .npy file,
+    one chunk of planes along z at a time. An interrupted render is resumed from the chunks that are missing.
+
+    The grids are stored in the sidecar, so that the volume can be plotted lazily with plot_transverse_beam, together with the
+    digest of the beam and the lenses. An existing file rendered with different grids, beam, lenses or power raises a ValueError
+    rather than being resumed, unless overwrite is set (c.f. ChunkedArrayWriter).
+
+    Returns:
+        np.memmap: The intensity volume with the shape (Nz, Ny, Nx), opened as a read only memory map.
+    """
+    x, y, z = [np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (x, y, z)]
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // max(1, len(x) * len(y)))
+
+    # The chunks only see part of z, so the lenses at indices into z are placed at the corresponding positions instead
+    lenses = {(float(z[k]) if isinstance(k, (int, np.integer)) else k): l for k, l in (lenses or {}).items()}
+    lens_inputs = [(k, l.phase_adjustment_matrix) for k, ls in lenses.items() for l in (ls if isinstance(ls, (list, tuple)) else [ls])]
+
+    writer = ChunkedArrayWriter(
+        path, (len(z), len(y), len(x)), dtype, axis=0, chunk_size=chunk_size,
+        metadata={"x": x.tolist(), "y": y.tolist(), "z": z.tolist(), "power": power},
+        inputs_hash=get_inputs_hash(beam.B_mat, beam.wavelength, beam.m2, *[v for i in lens_inputs for v in i]),
+        resume=resume, overwrite=overwrite
+    )
+    for i in writer.get_missing_chunks():
+        chunk = writer.get_chunk_slice(i)
+        beam.render_intensity(x, y, z[chunk[0]], lenses, out=writer.array[chunk], chunk_size=chunk_size, power=power)
+        writer.write_chunk(i)
+    return open_array(path)
+
+def get_grids(path: str) -> dict:
+    """Returns the grids stored in the sidecar of a file written by render_intensity_to_file or sweep_cylindrical_lens_pair."""
+    return {k: np.array(v) for k, v in read_metadata(path)["metadata"].items() if isinstance(v, list)}
@@ -0,0 +1,255 @@
+from .beam import EllipticalGaussianBeam
+from .elliptical_lens import EllipticalLens, _get_phase_adjustment_matrices
+from .cylindrical_lens import CylindricalLens
+from .spherical_lens import SphericalLens
+from .optical_table import OpticalTable, Edge
+from .propagation_plan import RouteGraph
+
+from concurrent.futures import Executor
+import numpy as np
+import hashlib
+import zipfile
+import json
+import os
+
+TABLE_FORMAT_VERSION = 1 # The version of the layout of the files written by save_table
+LENS_TYPES = {c.__name__: c for c in (EllipticalLens, CylindricalLens, SphericalLens)} # The lens classes restored by load_table
+
+def get_table_hash(table: OpticalTable) -> str:
+    """Returns the SHA-256 digest of the definition of a table: its nodes, lenses, edges, beam paths with their input beams, and
+    whether it is chromatic. Two tables with the same digest have the same beams at every node, so the digest addresses the
+    evaluated states of a table (c.f. TableCache). The evaluated states themselves are not part of the digest."""
+    header, arrays = _get_definition(table)
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    for name in sorted(arrays.keys()):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f"{name}{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+def save_table(path: str, table: OpticalTable, states: bool = True):
+    """Writes the definition of a table, and optionally its evaluated states, to an uncompressed .npz file.
+
+    The file holds one array per kind of element, e.g. the parameters of all the lenses or the node indices of all the edges, and
+    a small JSON header with the ids, the lens types and the digest of the table (c.f. get_table_hash). With the states, the file
+    also holds the expanded routes of every beam path and all their states (c.f. RouteGraph), so that a loaded table is evaluated
+    as it was, and only the changes made after loading are propagated by evolve_beams.
+
+    Args:
+        path (str): The path of the .npz file. It is written through a temporary file, so that an interrupted save leaves no partial file.
+        table (OpticalTable): The table to be written.
+        states (bool): Whether to evaluate the table (c.f. OpticalTable.evolve_beams) and write its states; only the parts that
+            changed since the last evaluation are propagated.
+    """
+    header, arrays = _get_definition(table)
+    header["table_hash"] = get_table_hash(table)
+    header["route_graphs"], header["path_route_graphs"] = [], []
+    if states:
+        table.evolve_beams()
+        arrays["B_states"], arrays["Binv_states"] = table.B_states, table.Binv_states
+
+        graph_index = {}
+        plan = table._plan
+        for p, beam_path in enumerate(table.beam_paths):
+            route_graph, (B_states, Binv_states) = table._path_states[beam_path.get_id()]
+            if id(route_graph) not in graph_index:
+                g = graph_index[id(route_graph)] = len(header["route_graphs"])
+                header["route_graphs"].append([plan.node_index[beam_path.get_initial_node().get_id()], beam_path.is_forward()])
+                for name in ("nodes", "anchors", "offsets", "transitions"):
+                    arrays[f"route_graph_{g}_{name}"] = getattr(route_graph, name)
+            header["path_route_graphs"].append(graph_index[id(route_graph)])
+            arrays[f"path_{p}_B_states"], arrays[f"path_{p}_Binv_states"] = B_states, Binv_states
+    header["evaluated"] = states
+
+    arrays["header"] = np.frombuffer(json.dumps(header).encode(), dtype=np.uint8)
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(path + ".tmp", path)
+
+def read_table_header(path: str) -> dict:
+    """Returns the header of a file written by save_table, e.g. its digest under "table_hash", without reading any array."""
+    with np.load(path) as data:
+        return json.loads(data["header"].tobytes())
+
+def load_table(path: str, mmap: bool = True) -> OpticalTable:
+    """Rebuilds a table written by save_table, without evaluating it again.
+
+    Args:
+        path (str): The path of the .npz file.
+        mmap (bool): Whether to memory map the states rather than reading them, so that only the states that are accessed are read
+            from the disk. The maps are copy on write, so the table can be tuned and evaluated again without changing the file.
+
+    Returns:
+        OpticalTable: The table, evaluated if its states were written.
+    """
+    table = OpticalTable()
+    with np.load(path) as data:
+        header = json.loads(data["header"].tobytes())
+        assert header["format_version"] == TABLE_FORMAT_VERSION, f"Unsupported table format version: {header['format_version']}."
+        table.chromatic = header["chromatic"]
+
+        nodes = [table.get_node(table.add_node(id)) for id in header["node_ids"]]
+
+        # The phase adjustment matrices of all the lenses are evaluated at once
+        lens_parameters = data["lens_parameters"]
+        phase_matrices = _get_phase_adjustment_matrices(*lens_parameters[:, [0, 3, 1, 2]].T)
+        lenses = [
+            LENS_TYPES.get(type_name, EllipticalLens)._from_phase_adjustment_matrix(theta, wavelength, fx, fy, phase_matrices[i])
+            for i, (type_name, (theta, fx, fy, wavelength)) in enumerate(zip(header["lens_types"], lens_parameters.tolist()))
+        ]
+        for n, l in data["lens_nodes"].tolist():
+            nodes[n].add_elliptical_lens(lenses[l])
+
+        # The edges are restored in the order of both the forward and the backward edges of every node, which sets the order of the routes
+        edges = [Edge(nodes[n1], nodes[n2], distance) for (n1, n2), distance in zip(data["edges"].tolist(), data["distances"].tolist())]
+        for e in edges:
+            e.n1.add_forward_edge(e)
+        for j in data["backward_edges"].tolist():
+            edges[j].n2.add_backward_edge(edges[j])
+
+        B_mats, Binv_mats, parameters = data["beam_B_mats"], data["beam_Binv_mats"], data["beam_parameters"].tolist()
+        for p, (path_id, n, forward) in enumerate(zip(header["beam_path_ids"], data["beam_path_nodes"].tolist(), data["beam_path_forward"].tolist())):
+            beam = EllipticalGaussianBeam._from_Bmats(B_mats[p], Binv_mats[p], *parameters[p])
+            table.add_beam_path(beam, nodes[n].get_id(), path_id, forward)
+
+        if header["evaluated"]:
+            route_graphs = [
+                RouteGraph(*[data[f"route_graph_{g}_{name}"].tolist() for name in ("nodes", "anchors", "offsets", "transitions")])
+                for g in range(len(header["route_graphs"]))
+            ]
+    if header["evaluated"]:
+        read = (lambda name: _open_npz_array(path, name)) if mmap else (lambda name: _read_npz_array(path, name))
+        _restore_states(
+            table, read("B_states"), read("Binv_states"), list(zip(map(tuple, header["route_graphs"]), route_graphs)),
+            [(route_graphs[g], (read(f"path_{p}_B_states"), read(f"path_{p}_Binv_states"))) for p, g in enumerate(header["path_route_graphs"])]
+        )
+    return table
+
+
+class TableCache:
+    """A directory of evaluated tables, each addressed by the digest of its definition (c.f. get_table_hash), so that a table
+    that was already evaluated once, e.g. by another process, is restored rather than evaluated again."""
+
+    directory: str
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, table_hash: str) -> str:
+        return os.path.join(self.directory, table_hash + ".npz")
+
+    def contains(self, table: OpticalTable) -> bool:
+        return self.is_valid(get_table_hash(table))
+
+    def load(self, table_hash: str, mmap: bool = True) -> OpticalTable:
+        """Returns the cached table with the given digest, or None if it is not in the cache or its file is stale (c.f. is_valid)."""
+        path = self.get_path(table_hash)
+        return load_table(path, mmap) if self.is_valid(table_hash) else None
+
+    def is_valid(self, table_hash: str) -> bool:
+        """Whether the cache holds evaluated states for the given digest. A file written in another format, without states,
+        or for another definition, e.g. copied over or written by an older version of get_table_hash, is stale."""
+        path = self.get_path(table_hash)
+        if not os.path.exists(path):
+            return False
+        header = read_table_header(path)
+        return header["format_version"] == TABLE_FORMAT_VERSION and header["evaluated"] and header["table_hash"] == table_hash
+
+    def evolve_beams(self, table: OpticalTable, executor: Executor = None, mmap: bool = True) -> bool:
+        """Evaluates a table like OpticalTable.evolve_beams, but restores its states from the cache if a table with the same
+        definition was cached, and caches them otherwise.
+
+        A stale file for the digest of the table (c.f. is_valid) is replaced.
+
+        Returns:
+            bool: Whether the states were restored from the cache.
+        """
+        table_hash = get_table_hash(table)
+        path = self.get_path(table_hash)
+        if self.is_valid(table_hash):
+            cached = load_table(path, mmap)
+            _restore_states(table, cached.B_states, cached.Binv_states, list(cached._plan.route_graphs.items()), [
+                cached._path_states[p.get_id()] for p in cached.beam_paths
+            ])
+            return True
+
+        table.evolve_beams(executor)
+        save_table(path, table)
+        return False
+
+
+def _get_definition(table: OpticalTable):
+    """Returns the JSON header and the arrays that define a table, in the order of its nodes, edges and beam paths."""
+    node_index = {n.get_id(): i for i, n in enumerate(table.nodes)}
+    lenses, lens_index, lens_nodes = [], {}, []
+    for i, n in enumerate(table.nodes):
+        for l in n.elliptical_lenses:
+            if id(l) not in lens_index:
+                lens_index[id(l)] = len(lenses)
+                lenses.append(l)
+            lens_nodes.append((i, lens_index[id(l)]))
+
+    edges = [e for n in table.nodes for e in n.get_forward_edges()]
+    edge_index = {id(e): j for j, e in enumerate(edges)}
+    beams = [p.get_beam() for p in table.beam_paths]
+
+    header = {
+        "format_version": TABLE_FORMAT_VERSION,
+        "chromatic": bool(table.chromatic),
+        "node_ids": [n.get_id() for n in table.nodes],
+        "lens_types": [type(l).__name__ for l in lenses],
+        "beam_path_ids": [p.get_id() for p in table.beam_paths]
+    }
+    arrays = {
+        "lens_parameters": np.array([(l.theta, l.fx, l.fy, l.wavelength) for l in lenses], dtype=np.float64).reshape(-1, 4),
+        "lens_nodes": np.array(lens_nodes, dtype=np.int64).reshape(-1, 2),
+        "edges": np.array([(node_index[e.n1.get_id()], node_index[e.n2.get_id()]) for e in edges], dtype=np.int64).reshape(-1, 2),
+        "distances": np.array([e.get_distance() for e in edges], dtype=np.float64),
+        "backward_edges": np.array([edge_index[id(e)] for n in table.nodes for e in n.get_backward_edges()], dtype=np.int64),
+        "beam_B_mats": np.array([b.B_mat for b in beams], dtype=np.complex128).reshape(-1, 2, 2),
+        "beam_Binv_mats": np.array([b.Binv_mat for b in beams], dtype=np.complex128).reshape(-1, 2, 2),
+        "beam_parameters": np.array([(b.wavelength, b.m2) for b in beams], dtype=np.float64).reshape(-1, 2),
+        "beam_path_nodes": np.array([node_index[p.get_initial_node().get_id()] for p in table.beam_paths], dtype=np.int64),
+        "beam_path_forward": np.array([p.is_forward() for p in table.beam_paths], dtype=bool)
+    }
+    return header, arrays
+
+def _restore_states(table: OpticalTable, B_states: np.ndarray, Binv_states: np.ndarray, route_graphs: list, path_states: list):
+    """Sets the results of an evaluation of a table with the same definition, as if the table had been evaluated.
+
+    Args:
+        route_graphs (list): The ((initial node index, forward), RouteGraph) pairs of the beam paths.
+        path_states (list): The (RouteGraph, (B_states, Binv_states)) of every beam path, in the order of beam_paths.
+    """
+    table._invalidate_plan()
+    plan = table._plan = table.compile()
+    for key, route_graph in route_graphs:
+        route_graph.node_ids = plan.node_ids
+        plan.route_graphs[key] = route_graph
+    table.B_states, table.Binv_states = B_states, Binv_states
+    table._path_states = {p.get_id(): states for p, states in zip(table.beam_paths, path_states)}
+
+def _read_npz_array(path: str, name: str) -> np.ndarray:
+    with np.load(path) as data:
+        return data[name]
+
+def _open_npz_array(path: str, name: str) -> np.memmap:
+    """Memory maps an array of an uncompressed .npz file as copy on write, from the offset of its .npy member in the archive."""
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo(name + ".npy")
+    assert info.compress_type == zipfile.ZIP_STORED, f"The array {name} of {path} is compressed and cannot be memory mapped."
+
+    with open(path, "rb") as file:
+        # The data of a member follows its 30 byte local header, its file name and its extra field
+        file.seek(info.header_offset)
+        local_header = file.read(30)
+        file.seek(info.header_offset + 30 + int.from_bytes(local_header[26:28], "little") + int.from_bytes(local_header[28:30], "little"))
+        version = np.lib.format.read_magic(file)
+        read_array_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_array_header(file)
+        offset = file.tell()
+
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape, order="F" if fortran_order else "C")
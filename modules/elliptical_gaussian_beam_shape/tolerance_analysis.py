@@ -0,0 +1,219 @@
+from .elliptical_lens import _get_phase_adjustment_matrices
+from .propagation_plan import RouteGraph, _propagate_route_graph
+from ._linalg import eigvals2, eigvalsh2
+
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, Union
+import numpy as np
+import warnings
+import copy
+
+TOLERANCE_QUANTITIES = ("radius_major", "radius_minor", "ellipticity", "waist_positions")
+
+@dataclass
+class ToleranceAnalysis:
+    """The distributions of the beams of an OpticalTable over random mounting errors (c.f. analyze_tolerances). Every quantity has
+    the shape (n_beam_paths, n_nodes, n_samples) in the order of beam_path_ids and node_ids, and is NaN where a beam path does not
+    reach a node."""
+
+    beam_path_ids: list
+    node_ids: list
+    radius_major: np.ndarray # The larger radius of the beam after the lenses of the node in m
+    radius_minor: np.ndarray # The smaller radius of the beam after the lenses of the node in m
+    ellipticity: np.ndarray
+    waist_positions: np.ndarray # The distances from the node to the waists of the two modes of the beam in m, in ascending order, with the shape (..., 2)
+
+    def __len__(self) -> int:
+        return self.ellipticity.shape[-1]
+
+    def get_percentiles(self, q: tuple = (5, 50, 95)) -> dict:
+        """Returns the percentiles of every quantity (c.f. TOLERANCE_QUANTITIES) over the samples, as a map from the name of the
+        quantity to an array with the shape (len(q), n_beam_paths, n_nodes), with a trailing axis of 2 for the waist positions."""
+        # The nodes that a beam path does not reach only have NaN samples
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return {
+                name: np.nanpercentile(np.moveaxis(getattr(self, name), 2, -1), q, axis=-1)
+                for name in TOLERANCE_QUANTITIES
+            }
+
+    def get_node_summary(self, beam_path_id: str, node_id: str, q: tuple = (5, 50, 95)) -> dict:
+        """Returns the mean, standard deviation and percentiles of every quantity of one beam path at one node."""
+        p, n = self.beam_path_ids.index(beam_path_id), self.node_ids.index(node_id)
+        summary = {}
+        for name in TOLERANCE_QUANTITIES:
+            samples = np.moveaxis(getattr(self, name)[p, n], 0, -1)
+            summary[name] = {"mean": np.nanmean(samples, axis=-1), "std": np.nanstd(samples, axis=-1), "percentiles": np.nanpercentile(samples, q, axis=-1)}
+        return summary
+
+
+def analyze_tolerances(table,
+                       n_samples: int,
+                       theta: Union[float, Callable] = 0,
+                       focal_length: Union[float, Callable] = 0,
+                       distance: Union[float, Callable] = 0,
+                       chunk_size: int = 2**13,
+                       executor: Executor = None,
+                       seed: int = None,
+                       dtype = np.float64) -> ToleranceAnalysis:
+    """Evaluates every beam path of an OpticalTable over random instances of the table with mounting errors, all at once.
+
+    Every sample perturbs the angle of every lens, the focal lengths of every lens (both axes by the same relative error, so that
+    spherical lenses stay spherical) and the distance of every edge independently. The samples are drawn and evaluated in chunks
+    of chunk_size: the lenses of each chunk are summed into per sample phase matrices, the free space offsets of the routes of
+    every beam path (c.f. RouteGraph) are recomputed from the perturbed distances, and the whole chunk is propagated as one batch
+    (c.f. PropagationPlan.propagate). Routes that are merged in the nominal table, e.g. the arms of a diamond of equal lengths,
+    have different lengths once their distances are perturbed, so they are split again by the edges they traverse (c.f.
+    _split_route_graph). The lenses are evaluated as in the table, c.f. OpticalTable.chromatic.
+
+    Each error is either the standard deviation of a normal distribution with zero mean, or a function (rng, shape) -> np.ndarray
+    drawing the errors from a numpy Generator, e.g. lambda rng, shape: rng.uniform(-1e-3, 1e-3, shape). Every chunk has its own
+    random stream spawned from the seed, so the results do not depend on the executor; with a ProcessPoolExecutor the functions
+    have to be picklable, i.e. defined at the top level of a module.
+
+    Args:
+        table (OpticalTable): The nominal table. It is not modified.
+        n_samples (int): The number of random instances of the table.
+        theta (Union[float, Callable]): The errors of the angles of the lenses in rad.
+        focal_length (Union[float, Callable]): The relative errors of the focal lengths of the lenses.
+        distance (Union[float, Callable]): The errors of the distances of the edges in m.
+        chunk_size (int): The number of samples evaluated at once; chunks of a few thousand samples keep the batches in the cache.
+        executor (Executor, optional): A concurrent.futures executor on which the chunks are evaluated concurrently.
+        seed (int, optional): The seed of the random streams.
+        dtype: The floating point type of the results, e.g. np.float32 to halve their memory.
+
+    Returns:
+        ToleranceAnalysis: The radii, ellipticities and waist positions of every sample.
+    """
+    assert n_samples > 0 and chunk_size > 0, f"The number of samples and the chunk size must be positive, got {n_samples} and {chunk_size}."
+    plan = table.compile()
+    n_nodes = len(plan.node_ids)
+
+    lenses = [(i, l) for i, n in enumerate(table.nodes) for l in n.elliptical_lenses]
+    lens_arrays = {
+        "nodes": np.array([i for i, _ in lenses], dtype=int),
+        "theta": np.array([l.theta for _, l in lenses], dtype=np.float64),
+        "fx": np.array([l.fx for _, l in lenses], dtype=np.float64),
+        "fy": np.array([l.fy for _, l in lenses], dtype=np.float64),
+        "wavelength": np.array([l.wavelength for _, l in lenses], dtype=np.float64)
+    }
+
+    beam_paths = []
+    for p in table.beam_paths:
+        route_graph = plan.get_route_graph(p.get_initial_node().get_id(), p.is_forward())
+        beam = p.get_beam()
+        beam_paths.append((*_split_route_graph(route_graph, len(plan.edges)), np.array(beam.B_mat), beam.wavelength, beam.m2))
+
+    shape = (len(beam_paths), n_nodes, n_samples)
+    results = [np.full(shape + ((2,) if name == "waist_positions" else ()), np.nan, dtype=dtype) for name in TOLERANCE_QUANTITIES]
+
+    starts = range(0, n_samples, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    jobs = [
+        (s, min(chunk_size, n_samples - start), lens_arrays, plan.distances, plan.has_lens, beam_paths, n_nodes, table.chromatic, (theta, focal_length, distance))
+        for s, start in zip(seeds, starts)
+    ]
+    if executor is None:
+        chunks = map(_evaluate_chunk, jobs)
+    else:
+        chunks = [f.result() for f in [executor.submit(_evaluate_chunk, job) for job in jobs]]
+
+    for start, chunk in zip(starts, chunks):
+        for result, values in zip(results, chunk):
+            result[:, :, start:start + values.shape[2]] = values
+    return ToleranceAnalysis([p.get_id() for p in table.beam_paths], list(plan.node_ids), *results)
+
+def _split_route_graph(route_graph: RouteGraph, n_edges: int) -> tuple:
+    """Splits the merged states of a route graph by the edges traversed between their anchor and themselves, so that every state
+    of the result has a single multiset of edges, and returns the split route graph together with how often every edge is
+    traversed between the anchor of every state and the state, with the shape (n_states, n_edges). The offsets of the split
+    route graph for any distances are then edge_counts @ distances.
+
+    The states are expanded in topological order, since a merged state can be reached after it was expanded (c.f.
+    RouteGraph._get_last_states), and the transitions keep the order of the ones they are split from, so that the last route to
+    arrive at every node is the same as in the merged route graph.
+    """
+    outgoing, incoming = [[] for _ in range(len(route_graph))], [0] * len(route_graph)
+    for k, (s, j, t) in enumerate(route_graph.transitions.tolist()):
+        outgoing[s].append((k, j, t))
+        incoming[t] += 1
+
+    nodes, anchors, offsets, edges = [int(route_graph.nodes[0])], [-1], [0.0], [()]
+    splits = [[] for _ in range(len(route_graph))] # The split states of every merged state
+    splits[0].append(0)
+    state_index, transitions = {}, []
+    ready = [0]
+    while len(ready) > 0:
+        s = ready.pop()
+        for k, j, t in outgoing[s]:
+            for split in splits[s]:
+                # The merged graph anchors the states after an anchor state at that state, and the split graph at its split
+                anchor, route_edges = (split, (j,)) if route_graph.anchors[t] == s else (anchors[split], tuple(sorted(edges[split] + (j,))))
+                key = (t, anchor, route_edges)
+                if key not in state_index:
+                    state_index[key] = len(nodes)
+                    splits[t].append(state_index[key])
+                    nodes.append(int(route_graph.nodes[t]))
+                    anchors.append(anchor)
+                    offsets.append(float(route_graph.offsets[t]))
+                    edges.append(route_edges)
+                transitions.append((k, split, j, state_index[key]))
+            incoming[t] -= 1
+            if incoming[t] == 0:
+                ready.append(t)
+
+    edge_counts = np.zeros((len(nodes), n_edges))
+    for s, route_edges in enumerate(edges):
+        np.add.at(edge_counts[s], list(route_edges), 1)
+    transitions = [t[1:] for t in sorted(transitions, key=lambda t: t[0])]
+    return RouteGraph(nodes, anchors, offsets, transitions, route_graph.node_ids), edge_counts
+
+def _draw_errors(rng: np.random.Generator, error, shape: tuple) -> np.ndarray:
+    if callable(error):
+        return np.broadcast_to(np.asarray(error(rng, shape), dtype=np.float64), shape)
+    if error == 0:
+        return np.zeros(shape)
+    return rng.normal(0, error, shape)
+
+def _evaluate_chunk(job: tuple):
+    """Draws and evaluates one chunk of samples (c.f. analyze_tolerances). It only depends on its arguments, so that it can also run
+    in worker processes, and returns the quantities of TOLERANCE_QUANTITIES with the shape (n_beam_paths, n_nodes, n, ...)."""
+    seed, n, lenses, distances, has_lens, beam_paths, n_nodes, chromatic, (theta, focal_length, distance) = job
+    rng = np.random.default_rng(seed)
+
+    n_lenses = len(lenses["nodes"])
+    lens_theta = lenses["theta"][:, None] + _draw_errors(rng, theta, (n_lenses, n))
+    scale = 1 + _draw_errors(rng, focal_length, (n_lenses, n))
+    fx, fy = lenses["fx"][:, None] * scale, lenses["fy"][:, None] * scale
+    distances = distances[:, None] + _draw_errors(rng, distance, (len(distances), n))
+
+    def get_phase_matrices(wavelength):
+        phase_matrices = np.zeros((n_nodes, n, 2, 2), dtype=np.complex128)
+        for i in range(n_lenses):
+            phase_matrices[lenses["nodes"][i]] += _get_phase_adjustment_matrices(lens_theta[i], wavelength[i], fx[i], fy[i])
+        return phase_matrices
+
+    shared_phase_matrices = None if chromatic else get_phase_matrices(lenses["wavelength"])
+    results = [np.full((len(beam_paths), n_nodes, n) + ((2,) if name == "waist_positions" else ()), np.nan) for name in TOLERANCE_QUANTITIES]
+    for p, (route_graph, edge_counts, B_mat, wavelength, m2) in enumerate(beam_paths):
+        phase_matrices = get_phase_matrices(np.full(n_lenses, wavelength)) if chromatic else shared_phase_matrices
+
+        # The route graph is shared by all the chunks, so the perturbed offsets are set on a shallow copy
+        perturbed_graph = copy.copy(route_graph)
+        perturbed_graph.offsets = edge_counts @ distances
+        B_states, _ = _propagate_route_graph(
+            perturbed_graph, phase_matrices, has_lens, np.broadcast_to(B_mat, (n, 2, 2)), np.full(n, 1j * wavelength * m2 / np.pi)
+        )
+
+        nodes = np.fromiter(route_graph.last_states.keys(), dtype=int)
+        B_nodes = B_states[np.fromiter(route_graph.last_states.values(), dtype=int)]
+        # Only the principal radii are needed, so the eigenvectors of Re(B) are skipped (c.f. _get_beam_shape_arrays)
+        eigenvalues = eigvalsh2(B_nodes.real)
+        results[0][p, nodes], results[1][p, nodes] = 1 / np.sqrt(eigenvalues[..., 0]), 1 / np.sqrt(eigenvalues[..., 1])
+        results[2][p, nodes] = np.sqrt(eigenvalues[..., 0] / eigenvalues[..., 1])
+
+        # The waist of a mode with the eigenvalue e of B is at the distance Im(1 / conj(e)) / (lambda m2 / pi) from the node
+        z_1, z_2 = [np.pi / (wavelength * m2) * (1 / e.conj()).imag for e in eigvals2(B_nodes)]
+        results[3][p, nodes, :, 0], results[3][p, nodes, :, 1] = np.minimum(z_1, z_2), np.maximum(z_1, z_2)
+    return results
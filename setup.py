@@ -4,7 +4,7 @@ setup(
     name="beam_shaping",
     version="1.0.0",
     url="https://github.com/TQT-RAAQS/beam_shaping",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
    # install_requires=["numpy", "sympy", "scipy", "matplotlib"],
     python_requires=">=3",
 
@@ -0,0 +1,53 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, CylindricalLens, OpticalTable
+
+import pytest
+
+WAVELENGTH = 1064e-9
+BEAM_PARAMETERS = dict(initial_z=0, z0_x=0.1, z0_y=0.15, theta=0.3, w0_x=300e-6, w0_y=200e-6, wavelength=WAVELENGTH)
+
+def _make_beam(**changes) -> EllipticalGaussianBeam:
+    """Returns the beam of the tests, with the given parameters of EllipticalGaussianBeam changed."""
+    return EllipticalGaussianBeam(**dict(BEAM_PARAMETERS, **changes))
+
+def _make_table(edges: list, lens_nodes: tuple = ()) -> OpticalTable:
+    """Returns a table with the given (id1, id2, distance) edges, a cylindrical lens at every node of lens_nodes, and the beam
+    of the tests starting at the first node."""
+    table = OpticalTable()
+    for id in dict.fromkeys(id for edge in edges for id in edge[:2]):
+        table.add_node(id)
+    for id1, id2, distance in edges:
+        table.connect_two_nodes(id1, id2, distance)
+    for id in lens_nodes:
+        table.get_node(id).add_elliptical_lens(CylindricalLens(0.3, WAVELENGTH, 0.1))
+    table.add_beam_path(_make_beam(), edges[0][0])
+    return table
+
+def _make_chain_table(n_nodes: int, n_beam_paths: int = 1) -> OpticalTable:
+    """Returns a chain of n_nodes, 5 cm apart, with a cylindrical lens at every other node, and n_beam_paths beam paths with
+    different orientations from its first node."""
+    table = OpticalTable()
+    ids = [table.add_node(f"n{i}") for i in range(n_nodes)]
+    for i, id in enumerate(ids):
+        if i % 2 == 0:
+            table.get_node(id).add_elliptical_lens(CylindricalLens(0.1 * i, WAVELENGTH, 0.2))
+    for id1, id2 in zip(ids[:-1], ids[1:]):
+        table.connect_two_nodes(id1, id2, 0.05)
+    for i in range(n_beam_paths):
+        table.add_beam_path(_make_beam(theta = 0.3 + 0.1 * i), ids[0])
+    return table
+
+@pytest.fixture
+def wavelength() -> float:
+    return WAVELENGTH
+
+@pytest.fixture
+def make_beam():
+    return _make_beam
+
+@pytest.fixture
+def make_table():
+    return _make_table
+
+@pytest.fixture
+def make_chain_table():
+    return _make_chain_table
@@ -0,0 +1,89 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble, CylindricalLens
+from modules.elliptical_gaussian_beam_shape.beam import _get_beam_shape_arrays
+
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize("theta", [0, 0.3, np.pi / 2, 2.5])
+@pytest.mark.parametrize("w0", [(300e-6, 200e-6), (200e-6, 200e-6), (200e-6, 200e-6 * (1 + 1e-12))])
+def test_get_beam_shape_matches_the_stacked_shapes(theta, w0, make_beam, wavelength):
+    beam = make_beam(theta = theta, w0_x = w0[0], w0_y = w0[1])
+    beam.apply_elliptical_lens(CylindricalLens(0.7, wavelength, 0.2))
+    for z in (0, 0.05, 0.2):
+        beam.evolve(z)
+        shape = beam.get_beam_shape()
+        expected = [v[0] for v in _get_beam_shape_arrays(beam.B_mat[None])]
+        np.testing.assert_allclose(
+            [shape.radius_x, shape.radius_y, shape.orientation, shape.ellipticity], expected, rtol=1e-12, atol=1e-15
+        )
+
+@pytest.mark.parametrize("theta", [0, 0.3, 2.5])
+@pytest.mark.parametrize("w0, z0", [((300e-6, 200e-6), (0.1, 0.15)), ((200e-6, 300e-6), (0.1, 0.15)), ((200e-6, 300e-6), (0.15, -0.1))])
+def test_beam_waists_are_paired_with_their_locations(theta, w0, z0, make_beam):
+    beam = make_beam(theta = theta, w0_x = w0[0], w0_y = w0[1], z0_x = z0[0], z0_y = z0[1])
+    beam.evolve(0.05)
+    order = np.argsort(w0)
+    np.testing.assert_allclose(beam.get_beam_waists(), np.array(w0)[order], rtol=1e-12)
+    np.testing.assert_allclose(beam.get_beam_waist_locations(), np.array(z0)[order] - 0.05, rtol=1e-9, atol=1e-12)
+
+    ensemble = EllipticalGaussianBeamEnsemble.from_beams([beam, beam])
+    np.testing.assert_allclose(np.array(ensemble.get_beam_waists())[:, 0], beam.get_beam_waists(), rtol=1e-12)
+    np.testing.assert_allclose(np.array(ensemble.get_beam_waist_locations())[:, 0], beam.get_beam_waist_locations(), rtol=1e-12)
+
+def _get_stepped_shapes(beam, z: np.ndarray, lenses: dict) -> list:
+    """Returns the shapes of a copy of a beam evolved from one position of z to the next, with the lenses at indices into z
+    applied after the evolution to their position, as the trace was computed before EllipticalGaussianBeam.trace."""
+    beam = EllipticalGaussianBeam.copy(beam)
+    shapes = []
+    for i in range(len(z)):
+        beam.evolve(z[i] - (z[i - 1] if i > 0 else 0))
+        if i in lenses:
+            beam.apply_elliptical_lens(lenses[i])
+        shapes.append(beam.get_beam_shape())
+    return shapes
+
+def _assert_shapes_match(shapes, expected: list):
+    for name in ("radius_x", "radius_y", "ellipticity"):
+        np.testing.assert_allclose(getattr(shapes, name), [getattr(s, name) for s in expected], rtol=1e-9)
+    orientation_errors = np.angle(np.exp(2j * (shapes.orientation - [s.orientation for s in expected]))) / 2
+    np.testing.assert_allclose(orientation_errors, 0, atol=1e-7)
+
+@pytest.mark.parametrize("lens_positions", [(), (500,), (120, 2000)])
+def test_trace_matches_the_stepped_beam(lens_positions):
+    # The beam and the lens of the demonstration notebook
+    beam = EllipticalGaussianBeam(0, 0, 0, 89.9 * np.pi / 180, -10e-6, -20e-6, 420e-9)
+    z = np.arange(0, 20e-3, 0.005e-3)
+    lenses = {i: CylindricalLens(np.pi / 3 + i, beam.wavelength, f=1e-3) for i in lens_positions}
+    _assert_shapes_match(beam.trace(z, lenses), _get_stepped_shapes(beam, z, lenses))
+
+def test_trace_places_lenses_at_positions(make_beam, wavelength):
+    beam = make_beam()
+    z = np.linspace(0, 0.3, 61)
+    lens = CylindricalLens(0.4, wavelength, 0.1)
+    # A lens at a position affects all the positions from it on, as a lens at the index of the first of them
+    np.testing.assert_allclose(beam.trace(z, {0.1: lens}).data, beam.trace(z, {20: lens}).data, rtol=1e-12)
+    _assert_shapes_match(beam.trace(z, {0.1: lens}), _get_stepped_shapes(beam, z, {20: lens}))
+
+@pytest.mark.parametrize("tolerance", [1e-2, 1e-3])
+def test_trace_adaptive_interpolates_the_uniform_trace(tolerance, wavelength):
+    # A tight focus behind a strong cylindrical lens, with a far field an order of magnitude longer
+    beam = EllipticalGaussianBeam(0, 0, 0, 0.3, 1e-3, 0.8e-3, wavelength)
+    lenses = {0.05: CylindricalLens(1.0, wavelength, 0.02)}
+    z, shapes = beam.trace_adaptive(0, 1, lenses, tolerance = tolerance)
+    assert np.all(np.diff(z) > 0) and z[0] == 0 and z[-1] == 1 and 0.05 in z
+
+    # The adaptive points are the points of the uniform trace
+    np.testing.assert_allclose(shapes.data, beam.trace(z, lenses).data, rtol=1e-12)
+
+    # Between them the principal radii are linear to within the tolerance, with some margin as only the midpoints are checked
+    z_uniform = np.linspace(0, 1, 200001)
+    expected = beam.trace(z_uniform, lenses)
+    expected_max, expected_min = np.maximum(expected.radius_x, expected.radius_y), np.minimum(expected.radius_x, expected.radius_y)
+    def get_error(z, shapes):
+        r_max, r_min = np.maximum(shapes.radius_x, shapes.radius_y), np.minimum(shapes.radius_x, shapes.radius_y)
+        return max(np.max(np.abs(np.interp(z_uniform, z, r) - r_expected) / expected_max) for r, r_expected in ((r_max, expected_max), (r_min, expected_min)))
+    assert get_error(z, shapes) < 2 * tolerance
+
+    # A uniform trace with as many points, including the lens plane, is much less accurate
+    z_coarse = np.union1d(np.linspace(0, 1, len(z)), [0.05])
+    assert get_error(z_coarse, beam.trace(z_coarse, lenses)) > 5 * get_error(z, shapes)
@@ -0,0 +1,78 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, EllipticalGaussianBeamEnsemble, CylindricalLens, SphericalLens
+
+import numpy as np
+import pytest
+
+N_BEAMS = 50
+
+@pytest.fixture
+def parameters(wavelength) -> dict:
+    rng = np.random.default_rng(0)
+    return dict(
+        initial_z = rng.uniform(-0.1, 0.1, N_BEAMS), z0_x = rng.uniform(-0.2, 0.2, N_BEAMS), z0_y = rng.uniform(-0.2, 0.2, N_BEAMS),
+        theta = rng.uniform(0, np.pi, N_BEAMS), w0_x = rng.uniform(50e-6, 500e-6, N_BEAMS), w0_y = rng.uniform(50e-6, 500e-6, N_BEAMS),
+        wavelength = wavelength * rng.uniform(0.5, 1.5, N_BEAMS), m2 = rng.uniform(1, 2, N_BEAMS)
+    )
+
+def _get_beams(parameters: dict) -> list:
+    return [EllipticalGaussianBeam(**{name: v[i] for name, v in parameters.items()}) for i in range(N_BEAMS)]
+
+def _assert_matches_beams(ensemble: EllipticalGaussianBeamEnsemble, beams: list):
+    np.testing.assert_allclose(ensemble.B_mat, [b.B_mat for b in beams], rtol=1e-10, atol=1e-10 * np.abs(ensemble.B_mat).max())
+    np.testing.assert_allclose(ensemble.Binv_mat, [b.Binv_mat for b in beams], rtol=1e-10, atol=1e-10 * np.abs(ensemble.Binv_mat).max())
+
+    shapes = ensemble.get_beam_shapes()
+    for name in ("radius_x", "radius_y", "ellipticity"):
+        np.testing.assert_allclose(getattr(shapes, name), [getattr(b.get_beam_shape(), name) for b in beams], rtol=1e-9)
+    # The orientations are compared modulo 180 degrees, since the axes of nearly round beams are labelled either way
+    orientation_errors = np.angle(np.exp(2j * (shapes.orientation - [b.get_beam_shape().orientation for b in beams]))) / 2
+    np.testing.assert_allclose(orientation_errors, 0, atol=1e-8)
+    np.testing.assert_allclose(np.transpose(ensemble.get_beam_waists()), [b.get_beam_waists() for b in beams], rtol=1e-9)
+    np.testing.assert_allclose(np.transpose(ensemble.get_beam_waist_locations()), [b.get_beam_waist_locations() for b in beams], rtol=1e-9, atol=1e-12)
+
+def test_initialization_matches_the_beams(parameters):
+    _assert_matches_beams(EllipticalGaussianBeamEnsemble(**parameters), _get_beams(parameters))
+
+def test_propagation_matches_the_beams(parameters, wavelength):
+    ensemble, beams = EllipticalGaussianBeamEnsemble(**parameters), _get_beams(parameters)
+    rng = np.random.default_rng(1)
+    z, axis_z, axis_theta = rng.uniform(0, 0.3, N_BEAMS), rng.uniform(0, 0.1, N_BEAMS), rng.uniform(0, np.pi, N_BEAMS)
+    lenses = [CylindricalLens(t, wavelength, f) for t, f in zip(rng.uniform(0, np.pi, N_BEAMS), rng.uniform(0.05, 0.5, N_BEAMS))]
+    shared_lens = SphericalLens(wavelength, 0.2)
+
+    ensemble.evolve(z)
+    ensemble.apply_elliptical_lens(lenses)
+    ensemble.evolve_along_axis(axis_z, axis_theta)
+    ensemble.apply_elliptical_lens(shared_lens)
+    ensemble.evolve(0.1)
+    for i, b in enumerate(beams):
+        b.evolve(z[i])
+        b.apply_elliptical_lens(lenses[i])
+        b.evolve_along_axis(axis_z[i], axis_theta[i])
+        b.apply_elliptical_lens(shared_lens)
+        b.evolve(0.1)
+    _assert_matches_beams(ensemble, beams)
+
+def test_beams_round_trip_through_the_ensemble(parameters):
+    beams = _get_beams(parameters)
+    ensemble = EllipticalGaussianBeamEnsemble.from_beams(beams)
+    for i, b in enumerate(beams):
+        np.testing.assert_array_equal(ensemble.get_beam(i).B_mat, b.B_mat)
+        assert ensemble.get_beam(i).wavelength == b.wavelength and ensemble.get_beam(i).m2 == b.m2
+
+def test_chromatic_lenses_match_the_lenses_made_for_every_beam(parameters, wavelength):
+    lens = CylindricalLens(0.7, wavelength, 0.2)
+    ensemble, beams = EllipticalGaussianBeamEnsemble(**parameters), _get_beams(parameters)
+    ensemble.apply_elliptical_lens(lens, chromatic = True)
+    for b in beams:
+        b.apply_elliptical_lens(CylindricalLens(lens.theta, b.wavelength, lens.fx))
+    _assert_matches_beams(ensemble, beams)
+
+def test_chromatic_lenses_at_their_own_wavelength_are_achromatic(parameters, wavelength):
+    parameters = dict(parameters, wavelength = wavelength)
+    lenses = [CylindricalLens(0.7, wavelength, 0.2), SphericalLens(wavelength, 0.3)]
+    chromatic, achromatic = EllipticalGaussianBeamEnsemble(**parameters), EllipticalGaussianBeamEnsemble(**parameters)
+    for lens in lenses:
+        chromatic.apply_elliptical_lens(lens, chromatic = True)
+        achromatic.apply_elliptical_lens(lens)
+    np.testing.assert_allclose(chromatic.B_mat, achromatic.B_mat, rtol=1e-14)
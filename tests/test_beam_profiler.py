@@ -0,0 +1,43 @@
+from modules.elliptical_gaussian_beam_shape import CylindricalLens, profile_images
+
+import numpy as np
+import pytest
+
+PIXEL_SIZE = 10e-6
+CENTER = (120, 140) # The pixel of the beam axis in (x, y)
+
+@pytest.fixture
+def caustic(make_beam, wavelength):
+    """A trace of an astigmatic beam and its rendered frames, with the beam axis at CENTER."""
+    beam = make_beam()
+    z = np.linspace(0, 0.3, 7)
+    lenses = {0: CylindricalLens(0.9, wavelength, 0.2)}
+    x, y = (np.arange(256) - CENTER[0]) * PIXEL_SIZE, (np.arange(280) - CENTER[1]) * PIXEL_SIZE
+    return beam.trace(z, lenses), beam.render_intensity(x, y, z, lenses)
+
+def _assert_profile_matches(profile, shapes):
+    for name in ("radius_x", "radius_y", "ellipticity"):
+        np.testing.assert_allclose(getattr(profile.shapes, name), getattr(shapes, name), rtol=1e-3)
+    orientation_errors = np.angle(np.exp(2j * (profile.shapes.orientation - shapes.orientation))) / 2
+    np.testing.assert_allclose(orientation_errors, 0, atol=1e-3)
+    np.testing.assert_allclose(profile.centroids, np.broadcast_to(np.multiply(CENTER, PIXEL_SIZE), profile.centroids.shape), atol=1e-3 * PIXEL_SIZE)
+
+@pytest.mark.parametrize("batch_size", [256, 3])
+def test_profile_matches_the_trace(caustic, batch_size):
+    shapes, images = caustic
+    profile = profile_images(images, PIXEL_SIZE, background=None, batch_size=batch_size)
+    assert np.all(profile.converged)
+    _assert_profile_matches(profile, shapes)
+
+def test_profile_subtracts_the_background(caustic):
+    shapes, images = caustic
+    offset = 0.01 * images.max()
+    _assert_profile_matches(profile_images(images + offset, PIXEL_SIZE), shapes)
+    _assert_profile_matches(profile_images(iter(images + offset), PIXEL_SIZE, background=offset), shapes)
+
+def test_fitted_beams_have_the_measured_shapes(caustic, wavelength):
+    shapes, images = caustic
+    profile = profile_images(images, PIXEL_SIZE, background=None, wavelength=wavelength)
+    fitted = profile.beams.get_beam_shapes()
+    np.testing.assert_allclose(fitted.data, profile.shapes.data, rtol=1e-12)
+    np.testing.assert_allclose(profile.beams.B_mat.imag, 0)
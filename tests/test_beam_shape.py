@@ -0,0 +1,56 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, CylindricalLens, BeamShapeArray, unwrap_orientation
+
+import numpy as np
+import pytest
+
+def _unwrap_stepwise(shapes: list) -> list:
+    """The unwrapping loop of the demonstration notebook before unwrap_orientation, applied to a list of BeamShape."""
+    shapes = [type(s)(s.radius_x, s.radius_y, s.orientation, s.ellipticity) for s in shapes]
+    for i in range(1, len(shapes)):
+        sh = shapes[i]
+        if i > 1:
+            if np.abs(sh.orientation - last_angle) > np.pi / 4:
+                candidates = np.arange(-2, 3)
+                k = np.argmin(np.abs(candidates * np.pi / 2 + sh.orientation - last_angle))
+                if k % 2 == 1:
+                    sh.radius_x, sh.radius_y = sh.radius_y, sh.radius_x
+                sh.orientation += candidates[k] * np.pi / 2
+        last_angle = sh.orientation
+    return shapes
+
+def _assert_shapes_equal(shapes: BeamShapeArray, expected: list):
+    np.testing.assert_allclose(shapes.data, BeamShapeArray.from_shapes(expected).data, rtol=1e-12, atol=1e-15)
+
+@pytest.fixture
+def notebook_trace() -> BeamShapeArray:
+    # The beam, lens and positions of the demonstration notebook
+    beam = EllipticalGaussianBeam(0, 0, 0, 89.9 * np.pi / 180, -10e-6, -20e-6, 420e-9)
+    z = np.arange(0, 20e-3, 0.005e-3)
+    return beam.trace(z, {500: CylindricalLens(np.pi / 3, beam.wavelength, f=1e-3)})
+
+def test_unwrap_matches_the_stepwise_unwrap(notebook_trace):
+    expected = _unwrap_stepwise(notebook_trace.to_shapes())
+    # The axes of the scenario cross the 90 degree boundary, so the unwrap is not trivial
+    assert not np.allclose(notebook_trace.data, BeamShapeArray.from_shapes(expected).data)
+    _assert_shapes_equal(unwrap_orientation(notebook_trace), expected)
+
+def test_trace_unwraps_as_the_stepwise_unwrap(notebook_trace):
+    beam = EllipticalGaussianBeam(0, 0, 0, 89.9 * np.pi / 180, -10e-6, -20e-6, 420e-9)
+    z = np.arange(0, 20e-3, 0.005e-3)
+    shapes = beam.trace(z, {500: CylindricalLens(np.pi / 3, beam.wavelength, f=1e-3)}, unwrap=True)
+    _assert_shapes_equal(shapes, _unwrap_stepwise(notebook_trace.to_shapes()))
+
+def test_unwrap_along_the_batch_axis_matches_every_trace(make_beam, wavelength):
+    z = np.linspace(0, 0.5, 301)
+    traces = [
+        make_beam(theta = theta).trace(z, {100: CylindricalLens(theta + 0.8, wavelength, 0.05)})
+        for theta in (0.3, 1.2, 2.5)
+    ]
+    # Traces along the last axis, and along the first axis once transposed
+    batch = BeamShapeArray.from_data(np.stack([t.data for t in traces], axis=1))
+    transposed = BeamShapeArray.from_data(np.ascontiguousarray(np.swapaxes(batch.data, 1, 2)))
+    unwrapped, unwrapped_transposed = unwrap_orientation(batch), unwrap_orientation(transposed, axis=0)
+    for i, t in enumerate(traces):
+        expected = _unwrap_stepwise(t.to_shapes())
+        _assert_shapes_equal(unwrapped[i], expected)
+        _assert_shapes_equal(unwrapped_transposed[:, i], expected)
@@ -0,0 +1,69 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, BeamShapeArray, fit_caustics
+from modules.elliptical_gaussian_beam_shape.caustic_fit import _get_moments_from_shapes
+
+import numpy as np
+import pytest
+
+N_BEAMS = 20
+
+@pytest.fixture
+def parameters(wavelength) -> dict:
+    """Simple astigmatic beams, with theta in [0, pi/2) so that their axes are labelled as in the fit."""
+    rng = np.random.default_rng(0)
+    return dict(
+        z0_x = rng.uniform(-0.1, 0.3, N_BEAMS), z0_y = rng.uniform(-0.1, 0.3, N_BEAMS), theta = rng.uniform(0.05, np.pi / 2 - 0.05, N_BEAMS),
+        w0_x = rng.uniform(100e-6, 400e-6, N_BEAMS), w0_y = rng.uniform(100e-6, 400e-6, N_BEAMS),
+        wavelength = wavelength * rng.uniform(0.5, 1.5, N_BEAMS), m2 = rng.uniform(1, 2, N_BEAMS)
+    )
+
+def _get_caustics(parameters: dict, z: np.ndarray) -> BeamShapeArray:
+    """Returns the traces of the beams along z as a shape array with the shape (N, n_z)."""
+    traces = [
+        EllipticalGaussianBeam(0, **{name: v[i] for name, v in parameters.items()}).trace(z)
+        for i in range(N_BEAMS)
+    ]
+    return BeamShapeArray.from_data(np.stack([t.data for t in traces], axis=1))
+
+def _assert_fit_matches(fit, parameters: dict):
+    assert np.all(fit.valid)
+    np.testing.assert_allclose(fit.z0, np.stack([parameters["z0_x"], parameters["z0_y"]], axis=-1), rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(fit.w0, np.stack([parameters["w0_x"], parameters["w0_y"]], axis=-1), rtol=1e-6)
+    np.testing.assert_allclose(fit.theta, parameters["theta"], atol=1e-6)
+    np.testing.assert_allclose(fit.m2, parameters["m2"], rtol=1e-6)
+    np.testing.assert_allclose(fit.m2_axes, np.stack([parameters["m2"]] * 2, axis=-1), rtol=1e-6)
+
+def test_fit_recovers_the_beams(parameters):
+    z = np.linspace(-0.4, 0.6, 15)
+    fit = fit_caustics(z, _get_caustics(parameters, z), parameters["wavelength"])
+    _assert_fit_matches(fit, parameters)
+    np.testing.assert_allclose(fit.residuals, 0, atol=1e-18)
+    assert np.all(fit.n_points == len(z))
+
+def test_fit_of_moments_skips_the_missing_planes(parameters):
+    z = np.linspace(-0.4, 0.6, 15)
+    moments = _get_moments_from_shapes(_get_caustics(parameters, z))
+    moments[::2, 3] = np.nan
+    moments[1::3, 7, 0, 1] = np.nan
+    fit = fit_caustics(z, moments, parameters["wavelength"])
+    _assert_fit_matches(fit, parameters)
+    expected = np.full(N_BEAMS, len(z))
+    expected[::2] -= 1
+    expected[1::3] -= 1
+    np.testing.assert_array_equal(fit.n_points, expected)
+
+def test_fitted_beams_reproduce_the_caustics(parameters):
+    z = np.linspace(-0.4, 0.6, 15)
+    caustics = _get_caustics(parameters, z)
+    beams = fit_caustics(z, caustics, parameters["wavelength"]).get_beams(initial_z = z[0])
+    for i in range(len(z)):
+        beams.evolve(z[i] - z[i - 1] if i > 0 else 0)
+        shapes = beams.get_beam_shapes()
+        for name in ("radius_x", "radius_y"):
+            np.testing.assert_allclose(getattr(shapes, name), getattr(caustics, name)[:, i], rtol=1e-6)
+
+def test_series_with_too_few_planes_are_not_valid(parameters):
+    z = np.linspace(-0.4, 0.6, 15)
+    moments = _get_moments_from_shapes(_get_caustics(parameters, z))
+    moments[0, 2:] = np.nan
+    fit = fit_caustics(z, moments, parameters["wavelength"])
+    assert not fit.valid[0] and np.all(fit.valid[1:])
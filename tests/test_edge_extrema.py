@@ -0,0 +1,75 @@
+from modules.elliptical_gaussian_beam_shape import CylindricalLens
+from modules.elliptical_gaussian_beam_shape.edge_extrema import _get_free_space_extrema
+from modules.elliptical_gaussian_beam_shape._linalg import inv2
+
+import numpy as np
+import pytest
+
+DISTANCE = 0.5
+Z = np.linspace(0, DISTANCE, 20001)
+STEP = Z[1] - Z[0]
+
+def _get_dense_B_mats(beam) -> np.ndarray:
+    """Returns the B matrices of a beam sampled along Z with the shape (n_z, 2, 2)."""
+    return inv2(beam.Binv_mat + 1j * (beam.wavelength * beam.m2 / np.pi * Z)[:, None, None] * np.eye(2))
+
+def _get_extrema(beam):
+    return _get_free_space_extrema(beam.Binv_mat[None], np.array([beam.wavelength * beam.m2 / np.pi]), np.array([DISTANCE]))
+
+def _assert_min_radius_matches(beam, s, min_radius):
+    shapes = beam.trace(Z)
+    rms_radii = np.sqrt((shapes.radius_x**2 + shapes.radius_y**2) / 2)
+    i = np.argmin(rms_radii)
+    assert abs(s - Z[i]) <= STEP
+    # The closed form minimum lies below every sample, and the samples next to it are only quadratically larger
+    assert min_radius <= rms_radii[i] * (1 + 1e-12)
+    np.testing.assert_allclose(min_radius, rms_radii[i], rtol=1e-6)
+
+def _assert_roots_match(roots, signed: np.ndarray):
+    """Checks that the roots are the sign changes of a function sampled along Z, up to one sampling step."""
+    crossings = Z[1:][np.diff(np.sign(signed)) != 0]
+    roots = roots[np.isfinite(roots)]
+    assert len(roots) == len(crossings)
+    np.testing.assert_allclose(roots, crossings, atol=STEP)
+
+@pytest.mark.parametrize("theta, f", [(0.3, 0.1), (0.3, -0.2), (1.1, 0.08), (2.0, 1e3)])
+def test_extrema_of_simple_astigmatic_beams_match_the_samples(theta, f, make_beam, wavelength):
+    # A cylindrical lens along one of the axes of the beam keeps its astigmatism simple, with fixed axes
+    beam = make_beam(theta = theta)
+    beam.apply_elliptical_lens(CylindricalLens(theta + np.pi / 2, wavelength, f))
+    s, min_radii, round_positions, round_ellipticities, stigmatic_positions = [v[0] for v in _get_extrema(beam)]
+    _assert_min_radius_matches(beam, s, min_radii)
+
+    # Along the fixed axes the traceless parts of Re(B) and Im(B) are multiples of one direction, whose signs change at the roots
+    B_mat = _get_dense_B_mats(beam)
+    axis = np.array([np.cos(2 * theta), np.sin(2 * theta)])
+    traceless = lambda M: np.stack([(M[:, 0, 0] - M[:, 1, 1]) / 2, M[:, 0, 1]], axis=-1) @ axis
+    _assert_roots_match(round_positions, traceless(B_mat.real))
+    _assert_roots_match(stigmatic_positions, traceless(B_mat.imag))
+    np.testing.assert_allclose(round_ellipticities[np.isfinite(round_positions)], 1, rtol=1e-9)
+
+def test_min_radius_of_general_astigmatic_beams_matches_the_samples(make_beam, wavelength):
+    beam = make_beam()
+    beam.apply_elliptical_lens(CylindricalLens(1.0, wavelength, 0.15))
+    s, min_radii, round_positions, round_ellipticities, _ = [v[0] for v in _get_extrema(beam)]
+    _assert_min_radius_matches(beam, s, min_radii)
+
+    # The beam is never exactly round, and the closest it gets along the edge is near the returned positions
+    ellipticities = beam.trace(Z).ellipticity
+    assert ellipticities.max() < 1
+    for position, ellipticity in zip(round_positions[np.isfinite(round_positions)], round_ellipticities[np.isfinite(round_positions)]):
+        i = int(round(position / STEP))
+        np.testing.assert_allclose(ellipticity, ellipticities[i], rtol=1e-3)
+
+def test_table_extrema_match_the_samples_along_every_edge(make_chain_table):
+    table = make_chain_table(5, 2)
+    table.evolve_beams()
+    extrema = table.get_edge_extrema()
+    for p, path in enumerate(table.beam_paths):
+        for j, edge in enumerate(extrema.edges):
+            beam = edge.get_nodes()[0].get_beam(path.get_id())
+            z = np.linspace(0, edge.get_distance(), 5001)
+            shapes = beam.trace(z)
+            rms_radii = np.sqrt((shapes.radius_x**2 + shapes.radius_y**2) / 2)
+            assert abs(extrema.min_radius_positions[p, j] - z[np.argmin(rms_radii)]) <= z[1]
+            np.testing.assert_allclose(extrema.min_radii[p, j], rms_radii.min(), rtol=1e-6)
@@ -0,0 +1,22 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalLens, CylindricalLens, SphericalLens
+
+import numpy as np
+import pytest
+
+@pytest.fixture(params=["elliptical", "cylindrical", "spherical"])
+def lens(request, wavelength) -> EllipticalLens:
+    return {
+        "elliptical": lambda: EllipticalLens(0.4, wavelength, 0.1, -0.3),
+        "cylindrical": lambda: CylindricalLens(1.2, wavelength, 0.2),
+        "spherical": lambda: SphericalLens(wavelength, 0.5)
+    }[request.param]()
+
+def test_lens_at_its_own_wavelength_is_the_achromatic_lens(lens, wavelength):
+    np.testing.assert_array_equal(lens.get_phase_adjustment_matrix(), lens.phase_adjustment_matrix)
+    np.testing.assert_allclose(lens.get_phase_adjustment_matrix(wavelength), lens.phase_adjustment_matrix, rtol=1e-15)
+    np.testing.assert_allclose(lens.get_phase_adjustment_matrix(np.full(3, wavelength)), np.broadcast_to(lens.phase_adjustment_matrix, (3, 2, 2)), rtol=1e-15)
+
+def test_lens_at_other_wavelengths_is_the_lens_made_for_them(lens, wavelength):
+    wavelengths = wavelength * np.array([[0.5, 1], [1.5, 2]])
+    expected = [[EllipticalLens(lens.theta, w, lens.fx, lens.fy).phase_adjustment_matrix for w in row] for row in wavelengths]
+    np.testing.assert_allclose(lens.get_phase_adjustment_matrix(wavelengths), expected, rtol=1e-14)
@@ -0,0 +1,36 @@
+from modules.elliptical_gaussian_beam_shape import profile
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+def test_thread_pool_workers_are_recorded(make_chain_table):
+    with profile() as serial:
+        make_chain_table(20, 16).evolve_beams()
+    with ThreadPoolExecutor(8) as executor, profile() as threaded:
+        make_chain_table(20, 16).evolve_beams(executor)
+
+    assert threaded.node_states == serial.node_states
+    assert threaded.calls == serial.calls
+    assert threaded.matrices == serial.matrices
+    assert threaded.allocated_bytes == serial.allocated_bytes
+
+def test_concurrent_updates_are_not_lost():
+    A = np.zeros((3, 2, 2))
+    with profile() as p:
+        def record(_):
+            for _ in range(2000):
+                p._add_call("inv2", A)
+                p._add_states(["n0", "n1"], 1e-6)
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(record, range(8)))
+
+    assert p.calls["inv2"] == 16000
+    assert p.matrices["inv2"] == 48000
+    assert p.node_states == {"n0": 16000, "n1": 16000}
+
+def test_summary_lists_the_edge_expansion_times(make_chain_table):
+    with profile() as p:
+        make_chain_table(20).evolve_beams()
+    assert len(p.edge_expansion_timings) == 19
+    assert p.get_hot_edges(1)[0][0] in p.edge_traversals
+    assert "Slowest edges to expand:" in p.get_summary()
@@ -0,0 +1,47 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeamEnsemble
+from modules.elliptical_gaussian_beam_shape.lens_pair_solver import solve_cylindrical_lens_pair, SWEEP_AXES
+
+import numpy as np
+import pytest
+
+INITIAL = dict(f1=0.2, f2=0.2, theta1=0.5, theta2=1.5, separation=0.1, z=0.2)
+
+def _get_random_beams(n_beams: int, seed: int = 2) -> EllipticalGaussianBeamEnsemble:
+    rng = np.random.default_rng(seed)
+    return EllipticalGaussianBeamEnsemble(
+        0, rng.uniform(-0.1, 0.1, n_beams), rng.uniform(-0.1, 0.1, n_beams), rng.uniform(0, 3, n_beams),
+        rng.uniform(1e-4, 3e-4, n_beams), rng.uniform(1e-4, 3e-4, n_beams), 780e-9, 1.2
+    )
+
+@pytest.mark.parametrize("target_radius, free", [
+    (None, ("f1", "f2", "theta1", "theta2", "separation")),
+    (1e-4, SWEEP_AXES)
+])
+def test_solutions_have_non_negative_distances(target_radius, free):
+    beams = _get_random_beams(20)
+    solution = solve_cylindrical_lens_pair(beams, INITIAL, free = free, target_radius = target_radius)
+    assert np.all(solution.parameters["separation"] >= 0)
+    assert np.all(solution.parameters["z"] >= 0)
+
+    # The converged solutions do turn the beams into round and stigmatic waists
+    for i in np.flatnonzero(solution.converged):
+        beam, (lens1, lens2) = beams.get_beam(i), solution.get_lenses(i)
+        beam.apply_elliptical_lens(lens1)
+        beam.evolve(solution.parameters["separation"][i])
+        beam.apply_elliptical_lens(lens2)
+        beam.evolve(solution.parameters["z"][i])
+        assert beam.get_beam_shape().ellipticity == pytest.approx(1, abs=1e-6)
+        assert np.abs(beam.B_mat.imag).max() <= 1e-6 * np.abs(beam.B_mat.real).max()
+
+def test_default_solve_converges():
+    solution = solve_cylindrical_lens_pair(_get_random_beams(50), INITIAL)
+    assert solution.converged.mean() > 0.9
+    assert np.all(solution.parameters["z"] >= 0)
+
+def test_solutions_converge_with_free_distances():
+    solution = solve_cylindrical_lens_pair(_get_random_beams(20), INITIAL, free = SWEEP_AXES, target_radius = 1e-4)
+    assert solution.converged.mean() > 0.9
+
+def test_negative_initial_distances_are_rejected():
+    with pytest.raises(AssertionError):
+        solve_cylindrical_lens_pair(_get_random_beams(2), {**INITIAL, "separation": -0.1})
@@ -0,0 +1,87 @@
+from modules.elliptical_gaussian_beam_shape._linalg import det2, inv2, eigvals2, eigh2, eigvalsh2
+
+import numpy as np
+import pytest
+
+rng = np.random.default_rng(0)
+
+def _symmetric(a, b, c):
+    return np.array([[a, b], [b, c]], dtype=np.float64)
+
+# Generic, degenerate (circular), near circular and diagonal symmetric matrices, with both signs of the off diagonal entry
+SYMMETRIC_MATRICES = {
+    "generic": _symmetric(3.0, 1.2, -0.7),
+    "negative_off_diagonal": _symmetric(1.5, -0.4, 2.5),
+    "circular": _symmetric(2.0, 0.0, 2.0),
+    "near_circular": _symmetric(2.0, 1e-12, 2.0 + 1e-12),
+    "near_circular_rotated": _symmetric(1e8, 1e-4, 1e8),
+    "diagonal": _symmetric(4.0, 0.0, 1.0),
+    "diagonal_swapped": _symmetric(1.0, 0.0, 4.0),
+    "beam_scale": _symmetric(1 / 300e-6**2, 2e6, 1 / 200e-6**2)
+}
+
+GENERAL_MATRICES = {
+    **{name: S.astype(np.complex128) for name, S in SYMMETRIC_MATRICES.items()},
+    "complex_symmetric": np.array([[1 + 2j, 0.5 - 1j], [0.5 - 1j, 3 - 0.5j]]),
+    "complex_nonsymmetric": np.array([[1 + 2j, 0.3], [-2j, 3 - 0.5j]]),
+    "degenerate_complex": np.array([[1 + 1j, 0], [0, 1 + 1j]]),
+    "real_nonsymmetric": np.array([[0.0, 1.0], [-1.0, 0.0]]) # Purely imaginary eigenvalues
+}
+
+def _as_inputs(A: np.ndarray) -> list:
+    """Returns A as a single matrix and within a stack, so that both the scalar and the stacked kernels are checked."""
+    stack = np.stack([A, 2 * A, A.T])
+    return [(A, A), (stack, stack)]
+
+@pytest.mark.parametrize("name", GENERAL_MATRICES.keys())
+def test_det2_matches_numpy(name):
+    for A, reference in _as_inputs(GENERAL_MATRICES[name]):
+        np.testing.assert_allclose(det2(A), np.linalg.det(reference), rtol=1e-12, atol=1e-12 * np.abs(reference).max()**2)
+
+@pytest.mark.parametrize("name", GENERAL_MATRICES.keys())
+def test_inv2_matches_numpy(name):
+    for A, reference in _as_inputs(GENERAL_MATRICES[name]):
+        Ainv = inv2(A)
+        assert Ainv.shape == A.shape
+        np.testing.assert_allclose(Ainv, np.linalg.inv(reference), rtol=1e-9, atol=1e-12 * np.abs(np.linalg.inv(reference)).max())
+
+def test_inv2_raises_on_a_singular_matrix():
+    with pytest.raises(np.linalg.LinAlgError):
+        inv2(np.array([[1.0, 2.0], [2.0, 4.0]]))
+
+@pytest.mark.parametrize("name", GENERAL_MATRICES.keys())
+def test_eigvals2_matches_numpy(name):
+    for A, reference in _as_inputs(GENERAL_MATRICES[name]):
+        eigenvalues = np.stack(eigvals2(A), axis=-1)
+        expected = np.linalg.eigvals(reference)
+        key = lambda e: np.sort_complex(np.round(e, 9))
+        scale = np.abs(expected).max()
+        np.testing.assert_allclose(key(eigenvalues / scale), key(expected / scale), atol=1e-8)
+
+@pytest.mark.parametrize("name", SYMMETRIC_MATRICES.keys())
+def test_eigh2_matches_numpy(name):
+    for S, reference in _as_inputs(SYMMETRIC_MATRICES[name]):
+        eigenvalues, eigenvectors = eigh2(S)
+        expected_eigenvalues, _ = np.linalg.eigh(reference)
+        scale = np.abs(expected_eigenvalues).max()
+        np.testing.assert_allclose(eigenvalues, expected_eigenvalues, rtol=1e-12, atol=1e-12 * scale)
+        np.testing.assert_allclose(eigvalsh2(S), expected_eigenvalues, rtol=1e-12, atol=1e-12 * scale)
+
+        # The eigenvectors are only defined up to their sign, and arbitrary for degenerate matrices, so they are checked as an
+        # orthonormal basis that diagonalizes S
+        np.testing.assert_allclose(np.swapaxes(eigenvectors, -1, -2) @ eigenvectors, np.broadcast_to(np.eye(2), eigenvectors.shape), atol=1e-12)
+        np.testing.assert_allclose(S @ eigenvectors, eigenvectors * eigenvalues[..., None, :], rtol=1e-9, atol=1e-9 * scale)
+
+def test_eigh2_returns_the_reference_axes_of_circular_matrices():
+    for S, _ in _as_inputs(SYMMETRIC_MATRICES["circular"]):
+        _, eigenvectors = eigh2(S)
+        np.testing.assert_array_equal(np.abs(eigenvectors), np.broadcast_to(np.eye(2)[::-1], eigenvectors.shape))
+
+def test_scalar_and_stacked_kernels_agree():
+    A = rng.normal(size=(64, 2, 2)) + 1j * rng.normal(size=(64, 2, 2))
+    S = A.real + np.swapaxes(A.real, -1, -2)
+    for i in range(len(A)):
+        np.testing.assert_allclose(inv2(A[i]), inv2(A)[i], rtol=1e-12)
+        np.testing.assert_allclose(np.stack(eigvals2(A[i])), np.stack(eigvals2(A), axis=-1)[i], rtol=1e-12, atol=1e-12)
+        for single, stacked in zip(eigh2(S[i]), eigh2(S)):
+            np.testing.assert_allclose(single, stacked[i], rtol=1e-12, atol=1e-12)
@@ -0,0 +1,198 @@
+from modules.elliptical_gaussian_beam_shape import (
+    EllipticalGaussianBeam, SphericalLens, OpticalTable, profile
+)
+
+import numpy as np
+import pytest
+
+def _assert_matches_full_evaluation(table: OpticalTable):
+    """Checks the incremental states of a table against a full evaluation from scratch."""
+    B_states = np.array(table.get_states())
+    table._invalidate_plan()
+    table.evolve_beams()
+    np.testing.assert_allclose(B_states, table.get_states(), rtol=1e-12)
+
+def _count_recomputed_states(table: OpticalTable, change) -> int:
+    table.evolve_beams()
+    with profile() as p:
+        change()
+        table.evolve_beams()
+    return sum(p.node_states.values())
+
+@pytest.mark.parametrize("set_distance", [
+    lambda edge, distance: setattr(edge, "distance", distance),
+    lambda edge, distance: edge.set_distance(distance)
+])
+def test_changing_a_distance_only_recomputes_the_states_downstream(set_distance, make_chain_table):
+    table = make_chain_table(40)
+    last_edge, middle_edge = table.get_node("n38").forward_edges[0], table.get_node("n10").forward_edges[0]
+
+    assert _count_recomputed_states(table, lambda: set_distance(last_edge, 0.07)) == 1
+    _assert_matches_full_evaluation(table)
+    assert _count_recomputed_states(table, lambda: set_distance(middle_edge, 0.02)) == 29
+    _assert_matches_full_evaluation(table)
+
+@pytest.mark.parametrize("change", [
+    lambda lenses, lens: lenses.append(lens),
+    lambda lenses, lens: lenses.insert(0, lens),
+    lambda lenses, lens: lenses.extend([lens]),
+    lambda lenses, lens: lenses.__iadd__([lens])
+])
+def test_changing_the_lens_list_of_a_node_in_place_is_evaluated(change, make_chain_table, wavelength):
+    table = make_chain_table(8)
+    node, lens = table.get_node("n5"), SphericalLens(wavelength, 0.3)
+
+    assert _count_recomputed_states(table, lambda: change(node.elliptical_lenses, lens)) == 3
+    _assert_matches_full_evaluation(table)
+
+    # The lens added to the list is registered with the node, so tuning it is evaluated too
+    assert _count_recomputed_states(table, lambda: lens.set_focal_lengths(0.5)) == 3
+    _assert_matches_full_evaluation(table)
+
+    del node.elliptical_lenses[:]
+    assert node not in lens._nodes
+    table.evolve_beams()
+    _assert_matches_full_evaluation(table)
+
+def test_assigning_the_lens_list_of_a_node_is_evaluated(make_chain_table, wavelength):
+    table = make_chain_table(8)
+    node, lens = table.get_node("n2"), SphericalLens(wavelength, 0.3)
+    previous = list(node.elliptical_lenses)
+    table.evolve_beams()
+
+    node.elliptical_lenses = [lens]
+    table.evolve_beams()
+    _assert_matches_full_evaluation(table)
+    assert node in lens._nodes and all(node not in l._nodes for l in previous)
+
+def _get_reference_beams(table: OpticalTable, beam_path_id: str) -> dict:
+    """Evaluates a beam path as the original evaluation of the tables did: a breadth-first walk over all the routes, without
+    merging them, in which the last beam to arrive at a node is kept."""
+    beam_path = table.beam_paths_dict[beam_path_id]
+    beams, queue = {}, [(beam_path.get_initial_node(), EllipticalGaussianBeam.copy(beam_path.get_beam()))]
+    while len(queue) > 0:
+        node, beam = queue.pop(0)
+        for l in node.elliptical_lenses:
+            beam.apply_elliptical_lens(l)
+        beams[node.get_id()] = beam
+        for edge in (node.get_forward_edges() if beam_path.is_forward() else node.get_backward_edges()):
+            next_beam = EllipticalGaussianBeam.copy(beam)
+            next_beam.evolve(edge.get_distance())
+            queue.append((edge.get_nodes()[int(beam_path.is_forward())], next_beam))
+    return beams
+
+def _assert_matches_reference(table: OpticalTable):
+    table.evolve_beams()
+    for id in table.beam_paths_dict.keys():
+        reference = _get_reference_beams(table, id)
+        beams = {n.get_id(): n.get_beam(id) for n in table.nodes if n.get_beam(id) is not None}
+        assert beams.keys() == reference.keys()
+        for node_id, beam in reference.items():
+            np.testing.assert_allclose(beams[node_id].B_mat, beam.B_mat, rtol=1e-9, err_msg=node_id)
+
+def test_get_beam_returns_the_last_route_to_arrive(make_beam, make_table):
+    # s -> {a: 0.1, b: 0.2, c: 0.1} -> d: the routes through a and c merge, and the route through c arrives last
+    table = make_table([("s", "a", 0.1), ("s", "b", 0.2), ("s", "c", 0.1), ("a", "d", 0.1), ("b", "d", 0.1), ("c", "d", 0.1)])
+    table.evolve_beams()
+    expected = make_beam()
+    expected.evolve(0.2)
+    np.testing.assert_allclose(table.get_node("d").get_beam("beam_0").B_mat, expected.B_mat, rtol=1e-12)
+    _assert_matches_reference(table)
+
+def test_get_beam_follows_the_longest_route_through_merged_states(make_table):
+    # The state at x is reached through routes of one and two edges, the latter arriving at n after the route through w and z
+    table = make_table([
+        ("s", "w", 0.1), ("s", "y", 0.1), ("s", "x", 0.2), ("w", "z", 0.05), ("y", "x", 0.1), ("x", "n", 0.1), ("z", "n", 0.1)
+    ])
+    _assert_matches_reference(table)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_tables_match_the_reference(seed, make_table):
+    rng = np.random.default_rng(seed)
+    n_nodes = 10
+    edges = [
+        (f"n{i}", f"n{j}", float(rng.choice([0.1, 0.2, 0.3])))
+        for i in range(n_nodes) for j in range(i + 1, n_nodes) if rng.uniform() < 0.3
+    ]
+    edges = [("n0", "n1", 0.1)] + [e for e in edges if e[:2] != ("n0", "n1")]
+    lens_nodes = [f"n{i}" for i in range(n_nodes) if rng.uniform() < 0.3 and any(f"n{i}" in e[:2] for e in edges)]
+    _assert_matches_reference(make_table(edges, lens_nodes))
+
+def test_get_beam_is_not_changed_by_later_evaluations(make_chain_table):
+    table = make_chain_table(4)
+    table.evolve_beams()
+    beam = table.get_node("n3").get_beam("beam_0")
+    B_mat, shape = np.array(beam.B_mat), beam.get_beam_shape()
+
+    table.get_node("n2").elliptical_lenses[0].set_focal_lengths(0.5)
+    table.evolve_beams()
+    np.testing.assert_array_equal(beam.B_mat, B_mat)
+    assert beam.get_beam_shape().radius_x == shape.radius_x
+    assert table.get_node("n3").get_beam("beam_0").get_beam_shape().radius_x != shape.radius_x
+
+def test_beams_dict_lists_the_beams_of_the_node(make_beam, make_chain_table):
+    table = make_chain_table(4)
+    table.add_beam_path(make_beam(), "n2", "backward", forward=False)
+    table.evolve_beams()
+    assert set(table.get_node("n1").beams_dict.keys()) == {"beam_0", "backward"}
+    assert set(table.get_node("n3").beams_dict.keys()) == {"beam_0"}
+    np.testing.assert_array_equal(table.get_node("n3").beams_dict["beam_0"].B_mat, table.get_node("n3").get_beam("beam_0").B_mat)
+
+def test_add_beam_stores_the_beam_after_the_lenses_of_the_node(make_beam, make_chain_table):
+    table = make_chain_table(4)
+    table.evolve_beams()
+    node, beam = table.get_node("n2"), make_beam()
+    with pytest.warns(DeprecationWarning):
+        node.add_beam("beam_0", beam)
+
+    expected = EllipticalGaussianBeam.copy(beam)
+    for l in node.elliptical_lenses:
+        expected.apply_elliptical_lens(l)
+    np.testing.assert_allclose(node.get_beam("beam_0").B_mat, expected.B_mat, rtol=1e-12)
+    np.testing.assert_allclose(node.beams_dict["beam_0"].B_mat, expected.B_mat, rtol=1e-12)
+    # The beam given is not modified
+    np.testing.assert_allclose(beam.B_mat, make_beam().B_mat, rtol=0)
+
+@pytest.mark.parametrize("forward", [True, False])
+def test_compiled_plan_is_not_changed_by_later_connections(forward, make_beam, make_chain_table):
+    table = make_chain_table(4)
+    start = "n0" if forward else "n3"
+    # The routes of a plan are only expanded when it first propagates from a node
+    plan = table.compile()
+    expected = table.compile().propagate(make_beam(), start, forward)
+
+    table.add_node("m")
+    table.connect_two_nodes("n1", "m", 0.1)
+    table.connect_two_nodes("n2", "n3", 0.2)
+    beams = plan.propagate(make_beam(), start, forward)
+    assert beams.keys() == expected.keys()
+    for id, beam in expected.items():
+        np.testing.assert_allclose(beams[id].B_mat, beam.B_mat, rtol=1e-12)
+
+    # The table compiles the new connections
+    table.evolve_beams()
+    assert table.get_node("m").get_beam("beam_0") is not None
+
+def test_chromatic_table_at_the_wavelength_of_the_lenses_is_achromatic(make_chain_table):
+    chromatic, achromatic = make_chain_table(10, 3), make_chain_table(10, 3)
+    chromatic.chromatic = True
+    chromatic.evolve_beams()
+    achromatic.evolve_beams()
+    np.testing.assert_allclose(chromatic.get_states(), achromatic.get_states(), rtol=1e-14)
+
+def test_chromatic_table_matches_the_lenses_made_for_every_wavelength(make_beam, make_chain_table, wavelength):
+    wavelengths = wavelength * np.array([0.5, 1, 1.5])
+    chromatic = make_chain_table(10)
+    chromatic.chromatic = True
+    for w in wavelengths:
+        chromatic.add_beam_path(make_beam(wavelength = w), "n0", f"{w}")
+    chromatic.evolve_beams()
+
+    for w in wavelengths:
+        table = make_chain_table(10)
+        for n in table.get_nodes().values():
+            n.elliptical_lenses = [type(l)(l.theta, w, l.fx) for l in n.elliptical_lenses]
+        id = table.add_beam_path(make_beam(wavelength = w), "n0")
+        table.evolve_beams()
+        for n in table.get_nodes():
+            np.testing.assert_allclose(chromatic.get_node(n).get_beam(f"{w}").B_mat, table.get_node(n).get_beam(id).B_mat, rtol=1e-12)
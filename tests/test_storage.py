@@ -0,0 +1,68 @@
+from modules.elliptical_gaussian_beam_shape import EllipticalGaussianBeam, CylindricalLens, ChunkedArrayWriter
+from modules.elliptical_gaussian_beam_shape import render_intensity_to_file, sweep_cylindrical_lens_pair
+from modules.elliptical_gaussian_beam_shape.chunked_array import read_metadata
+
+import numpy as np
+import pytest
+import os
+
+GRIDS = dict(f1=[0.1, 0.2, 0.3], f2=[0.2, 0.3], theta1=[0.5], theta2=[1.5], separation=[0.05, 0.1], z=[0.2])
+
+def _render(path: str, beam: EllipticalGaussianBeam, **kwargs) -> np.ndarray:
+    x = y = np.linspace(-5e-4, 5e-4, 8)
+    z = np.linspace(0, 0.2, 6)
+    return render_intensity_to_file(beam, path, x, y, z, chunk_size = 2, **kwargs)
+
+def test_writer_resumes_missing_chunks(tmp_path):
+    path = os.path.join(tmp_path, "array.npy")
+    writer = ChunkedArrayWriter(path, (5, 3), chunk_size = 2, metadata = {"x": [1, 2]}, inputs_hash = "a")
+    writer.write_chunk(1, np.ones((2, 3)))
+
+    writer = ChunkedArrayWriter(path, (5, 3), chunk_size = 2, metadata = {"x": [1, 2]}, inputs_hash = "a")
+    assert writer.get_missing_chunks() == [0, 2]
+    assert np.all(writer.array[2:4] == 1)
+
+@pytest.mark.parametrize("changes", [
+    dict(shape = (6, 3)),
+    dict(chunk_size = 1),
+    dict(metadata = {"x": [1, 3]}),
+    dict(inputs_hash = "b")
+])
+def test_writer_refuses_to_resume_a_different_array(tmp_path, changes):
+    path = os.path.join(tmp_path, "array.npy")
+    arguments = dict(shape = (5, 3), chunk_size = 2, metadata = {"x": [1, 2]}, inputs_hash = "a")
+    ChunkedArrayWriter(path, **arguments).write_chunk(0, np.ones((2, 3)))
+
+    with pytest.raises(ValueError):
+        ChunkedArrayWriter(path, **dict(arguments, **changes))
+    # The existing file is left untouched
+    assert read_metadata(path)["completed"] == [0]
+
+    writer = ChunkedArrayWriter(path, **dict(arguments, **changes), overwrite = True)
+    assert writer.completed == set()
+    assert read_metadata(path)["completed"] == []
+
+def test_render_refuses_to_resume_a_different_beam(tmp_path, make_beam, wavelength):
+    path = os.path.join(tmp_path, "volume.npy")
+    _render(path, make_beam())
+    for beam, kwargs in [(make_beam(w0_y = 300e-6), {}), (make_beam(), dict(power = 2)), (make_beam(), dict(lenses = {0.1: CylindricalLens(0.2, wavelength, 0.5)}))]:
+        with pytest.raises(ValueError):
+            _render(path, beam, **kwargs)
+
+    expected = np.array(_render(os.path.join(tmp_path, "expected.npy"), make_beam(w0_y = 300e-6)))
+    np.testing.assert_array_equal(_render(path, make_beam(w0_y = 300e-6), overwrite = True), expected)
+    # The same inputs are resumed
+    np.testing.assert_array_equal(_render(path, make_beam(w0_y = 300e-6)), expected)
+
+def test_sweep_refuses_to_resume_a_different_beam(tmp_path, make_beam):
+    path = os.path.join(tmp_path, "sweep")
+    sweep_cylindrical_lens_pair(make_beam(), **GRIDS, chunk_size = 4, path = path)
+    with pytest.raises(ValueError):
+        sweep_cylindrical_lens_pair(make_beam(w0_y = 300e-6), **GRIDS, chunk_size = 4, path = path)
+    with pytest.raises(ValueError):
+        sweep_cylindrical_lens_pair(make_beam(), **dict(GRIDS, z = [0.3]), chunk_size = 4, path = path)
+
+    sweep = sweep_cylindrical_lens_pair(make_beam(w0_y = 300e-6), **GRIDS, chunk_size = 4, path = path, overwrite = True)
+    expected = sweep_cylindrical_lens_pair(make_beam(w0_y = 300e-6), **GRIDS, chunk_size = 4)
+    np.testing.assert_allclose(sweep.astigmatism, expected.astigmatism)
+    np.testing.assert_allclose(sweep.shapes.data, expected.shapes.data)
@@ -0,0 +1,95 @@
+from modules.elliptical_gaussian_beam_shape import TableCache, save_table, load_table, read_table_header, get_table_hash, profile
+
+import numpy as np
+import pytest
+import shutil
+import os
+
+def _assert_tables_match(table, expected):
+    """Checks the states and node beams of a table against those of another table, which is evaluated if it was not."""
+    expected.evolve_beams()
+    np.testing.assert_array_equal(table.get_states(), expected.get_states())
+    for id, n in expected.get_nodes().items():
+        for p in expected.beam_paths:
+            np.testing.assert_array_equal(table.get_node(id).get_beam(p.get_id()).B_mat, n.get_beam(p.get_id()).B_mat)
+
+def _make_table(make_chain_table):
+    table = make_chain_table(12, 3)
+    table.connect_two_nodes("n3", "n7", 0.12)
+    return table
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_loaded_table_is_the_saved_table(tmp_path, mmap, make_chain_table):
+    path = os.path.join(tmp_path, "table.npz")
+    table = _make_table(make_chain_table)
+    save_table(path, table)
+
+    loaded = load_table(path, mmap)
+    assert get_table_hash(loaded) == get_table_hash(table) == read_table_header(path)["table_hash"]
+    # The loaded states are used as they are, without any evaluation
+    with profile() as p:
+        loaded.evolve_beams()
+    assert sum(p.node_states.values()) == 0
+    _assert_tables_match(loaded, table)
+
+def test_loaded_table_is_evaluated_again_after_changes(tmp_path, make_chain_table):
+    path = os.path.join(tmp_path, "table.npz")
+    save_table(path, _make_table(make_chain_table))
+    loaded, expected = load_table(path), _make_table(make_chain_table)
+    for t in (loaded, expected):
+        t.get_node("n4").elliptical_lenses[0].set_focal_length(0.3)
+        t.get_node("n9").forward_edges[0].set_distance(0.02)
+        t.evolve_beams()
+    np.testing.assert_allclose(loaded.get_states(), expected.get_states(), rtol=1e-12)
+    # The file is copy on write and is left unchanged
+    _assert_tables_match(load_table(path), _make_table(make_chain_table))
+
+def test_table_saved_without_states_is_evaluated_on_load(tmp_path, make_chain_table):
+    path = os.path.join(tmp_path, "table.npz")
+    save_table(path, _make_table(make_chain_table), states = False)
+    loaded = load_table(path)
+    loaded.evolve_beams()
+    _assert_tables_match(loaded, _make_table(make_chain_table))
+
+def test_cache_restores_the_evaluated_table(tmp_path, make_chain_table):
+    cache = TableCache(str(tmp_path))
+    table = _make_table(make_chain_table)
+    assert not cache.contains(table) and not cache.evolve_beams(table)
+
+    restored = _make_table(make_chain_table)
+    assert cache.contains(restored)
+    with profile() as p:
+        assert cache.evolve_beams(restored)
+    assert sum(p.node_states.values()) == 0
+    _assert_tables_match(restored, table)
+    _assert_tables_match(cache.load(get_table_hash(table)), table)
+
+def test_cache_is_not_used_for_a_changed_table(tmp_path, make_chain_table):
+    cache = TableCache(str(tmp_path))
+    cache.evolve_beams(_make_table(make_chain_table))
+
+    table = _make_table(make_chain_table)
+    table.get_node("n4").elliptical_lenses[0].set_focal_length(0.3)
+    assert not cache.contains(table) and not cache.evolve_beams(table)
+    expected = _make_table(make_chain_table)
+    expected.get_node("n4").elliptical_lenses[0].set_focal_length(0.3)
+    _assert_tables_match(table, expected)
+
+@pytest.mark.parametrize("stale", ["other table", "no states"])
+def test_cache_rejects_a_stale_file(tmp_path, stale, make_chain_table):
+    cache = TableCache(str(tmp_path))
+    table = _make_table(make_chain_table)
+    table_hash = get_table_hash(table)
+    if stale == "other table":
+        # E.g. a file written by another version of the digest, for another definition
+        other = make_chain_table(12, 3)
+        cache.evolve_beams(other)
+        shutil.copy(cache.get_path(get_table_hash(other)), cache.get_path(table_hash))
+    else:
+        save_table(cache.get_path(table_hash), _make_table(make_chain_table), states = False)
+
+    assert not cache.contains(table) and cache.load(table_hash) is None
+    assert not cache.evolve_beams(table)
+    _assert_tables_match(table, _make_table(make_chain_table))
+    # The stale file is replaced
+    assert cache.contains(_make_table(make_chain_table))
@@ -0,0 +1,48 @@
+from modules.elliptical_gaussian_beam_shape import OpticalTable, analyze_tolerances
+
+import numpy as np
+import pytest
+
+def _assert_matches_perturbed_table(table: OpticalTable, errors: np.ndarray):
+    """Checks the tolerance analysis with fixed distance errors against the table with those errors applied to its edges."""
+    analysis = analyze_tolerances(table, 2, distance = lambda rng, shape: errors[:, None])
+
+    for edge, error in zip(table.compile().edges, errors):
+        edge.distance += error
+    table.evolve_beams()
+    for n, node_id in enumerate(analysis.node_ids):
+        beam = table.get_node(node_id).get_beam("beam_0")
+        if beam is None:
+            assert np.all(np.isnan(analysis.radius_major[0, n]))
+            continue
+        radii = 1 / np.sqrt(np.linalg.eigvalsh(beam.B_mat.real))
+        np.testing.assert_allclose(analysis.radius_major[0, n], radii[0], rtol=1e-9, err_msg=node_id)
+        np.testing.assert_allclose(analysis.radius_minor[0, n], radii[1], rtol=1e-9, err_msg=node_id)
+
+@pytest.mark.parametrize("lens_nodes", [(), ("s",), ("s", "a", "d")])
+def test_distance_errors_of_merged_routes_are_propagated(lens_nodes, make_table):
+    # s -> {a: 0.1, b: 0.2, c: 0.1} -> d: the routes through a and c merge in the nominal table, and the route through c arrives last
+    table = make_table([("s", "a", 0.1), ("s", "b", 0.2), ("s", "c", 0.1), ("a", "d", 0.1), ("b", "d", 0.1), ("c", "d", 0.1)], lens_nodes)
+    edges = [tuple(n.get_id() for n in e.get_nodes()) for e in table.compile().edges]
+
+    # Only the second arm of the merged routes is perturbed
+    errors = np.zeros(len(edges))
+    errors[edges.index(("c", "d"))] = 0.05
+    nominal = analyze_tolerances(table, 1)
+    perturbed = analyze_tolerances(table, 1, distance = lambda rng, shape: errors[:, None])
+    d = nominal.node_ids.index("d")
+    assert abs(perturbed.radius_major[0, d, 0] - nominal.radius_major[0, d, 0]) > 1e-3 * nominal.radius_major[0, d, 0]
+
+    _assert_matches_perturbed_table(table, errors)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_tables_match_the_perturbed_tables(seed, make_table):
+    rng = np.random.default_rng(seed)
+    n_nodes = 8
+    edges = [
+        (f"n{i}", f"n{j}", float(rng.choice([0.1, 0.2])))
+        for i in range(n_nodes) for j in range(i + 1, n_nodes) if rng.uniform() < 0.4
+    ]
+    edges = [("n0", "n1", 0.1)] + [e for e in edges if e[:2] != ("n0", "n1")]
+    lens_nodes = [f"n{i}" for i in range(n_nodes) if rng.uniform() < 0.3 and any(f"n{i}" in e[:2] for e in edges)]
+    _assert_matches_perturbed_table(make_table(edges, lens_nodes), rng.uniform(0, 0.02, len(edges)))
@@ -1,24 +1,36 @@
-import yaml
-import re
-from dataclasses import dataclass
-import platform
 import os
 
 CONFIG_ADDRESSES_ADDRESS = os.path.join(os.path.dirname(__file__), "addresses.yaml")
 
-## YAML reader set up
-yaml.SafeLoader.add_implicit_resolver(
-    u'tag:yaml.org,2002:float',
-    re.compile(u'''^(?:
-     [-+]?(?:[0-9][0-9_]*)\\.[0-9_]*(?:[eE][-+]?[0-9]+)?
-    |[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)
-    |\\.[0-9_]+(?:[eE][-+][0-9]+)?
-    |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\\.[0-9_]*
-    |[-+]?\\.(?:inf|Inf|INF)
-    |\\.(?:nan|NaN|NAN))$''', re.X),
-    list(u'-+0123456789.'))
+# The addresses and the properties are only read on the first access to one of the attributes of the package (c.f. __getattr__),
+# so that importing it, e.g. through toolkits.plotting_helper, neither imports yaml nor reads any file.
+_loaded = False
+_yaml_resolver_added = False
+
+def _add_yaml_float_resolver(yaml):
+    ## YAML reader set up
+    import re
+    global _yaml_resolver_added
+    if _yaml_resolver_added:
+        return
+    yaml.SafeLoader.add_implicit_resolver(
+        u'tag:yaml.org,2002:float',
+        re.compile(u'''^(?:
+         [-+]?(?:[0-9][0-9_]*)\\.[0-9_]*(?:[eE][-+]?[0-9]+)?
+        |[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)
+        |\\.[0-9_]+(?:[eE][-+][0-9]+)?
+        |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\\.[0-9_]*
+        |[-+]?\\.(?:inf|Inf|INF)
+        |\\.(?:nan|NaN|NAN))$''', re.X),
+        list(u'-+0123456789.'))
+    _yaml_resolver_added = True
 
 def setup_addresses():
+    from dataclasses import dataclass
+    import platform
+    import yaml
+    _add_yaml_float_resolver(yaml)
+
     try:
         user = os.getlogin()
     except:
@@ -37,9 +49,9 @@ def setup_addresses():
             value = config_data["global_addresses"][k + f"_{platform.system().lower()}"]
             for kg, vg in global_addresses.items():
                 value = value.replace("$" + kg.upper() + "$", vg)
-            
+
             global_addresses[k] = value
-    
+
     addresses = {}
     for k in config_data["addresses"].keys():
         ad = config_data["addresses"][k]
@@ -57,7 +69,7 @@ def setup_addresses():
             modified_ad = modified_ad.replace("/", "\\")
         addresses[k] = modified_ad
 
-    
+
     Addresses = dataclass(type("Addresses", (), addresses))
     if "dated" in config_data:
         for var in config_data["dated"]:
@@ -67,18 +79,36 @@ def setup_addresses():
             ))
     return Addresses, config_data.get("properties", [])
 
-Addresses, properties = setup_addresses()
-package_names = []
-for property in properties:
-    package_name = "".join([s[0].upper() + s[1:] for s in property.split("_")])
-    package_names.append(package_name)
-    address = getattr(Addresses, property)
-    with open(address) as file:
-        properties_dict = yaml.safe_load(file)
-    exec(f"global {package_name}")
-    exec(f"{package_name} = dataclass(type('{package_name}', (), properties_dict))")
-
-__all__ = [
-    "Addresses",
-    *package_names
-]
\ No newline at end of file
+def _load():
+    """Reads the addresses and every properties file, and stores them, their package names and __all__ as globals of the package."""
+    from dataclasses import dataclass
+    import yaml
+    global _loaded
+    Addresses, properties = setup_addresses()
+    names = {"Addresses": Addresses, "properties": properties}
+    package_names = []
+    for property in properties:
+        package_name = "".join([s[0].upper() + s[1:] for s in property.split("_")])
+        package_names.append(package_name)
+        address = getattr(Addresses, property)
+        with open(address) as file:
+            properties_dict = yaml.safe_load(file)
+        names[package_name] = dataclass(type(package_name, (), properties_dict))
+
+    names["package_names"] = package_names
+    names["__all__"] = ["Addresses", *package_names]
+    globals().update(names)
+    _loaded = True
+
+def __getattr__(name: str):
+    # Only called for the attributes that are not defined yet, i.e. before the first load or for names that do not exist
+    if not _loaded and (name == "__all__" or not name.startswith("__")):
+        _load()
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    if not _loaded:
+        _load()
+    return sorted(globals().keys())
@@ -24,6 +24,11 @@ def plot_profile(
     else:
         raise Exception("Invalid units")
 
+    # A path to a .npy file is opened as a memory map, and only the plotted slice is read
+    if isinstance(I_xy, str):
+        I_xy = np.load(I_xy, mmap_mode="r")
+    I_xy = np.asarray(I_xy)
+
     Lx *= m
     Ly *= m
 
@@ -74,13 +79,17 @@ def plot_transverse_beam(
     flag_show=True,
     **styles
 ):
+    # A path to a .npy file (c.f. render_intensity_to_file) is opened as a memory map, so that only the slices are read
+    if isinstance(I_profile, str):
+        I_profile = np.load(I_profile, mmap_mode="r")
+
     # Get array dimensions
     Nz, Ny, Nx = I_profile.shape
 
     # Extract middle slices
-    I_xy = I_profile[Nz // 2, :, :]
-    I_xz = I_profile[:, Ny // 2, :].T
-    I_yz = I_profile[:, :, Nx // 2].T
+    I_xy = np.asarray(I_profile[Nz // 2, :, :])
+    I_xz = np.asarray(I_profile[:, Ny // 2, :]).T
+    I_yz = np.asarray(I_profile[:, :, Nx // 2]).T
 
     # Create figure and axes if needed
     if fig is None or ax is None:
@@ -1,15 +1,24 @@
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-from toolkits.configs import Addresses
+from toolkits import configs
 
-styles=[Addresses.mpl_style]
+# The style is only looked up in the configs when the first figure is drawn, c.f. getStyles
+_styles = None
 
 def getStyles():
-    return styles
+    global _styles
+    if _styles is None:
+        _styles = [configs.Addresses.mpl_style]
+    return _styles
+
+def __getattr__(name: str):
+    if name == "styles":
+        return getStyles()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def getStylishFigureAxes(nrows, ncols, axes_list = False, **style):
-    with plt.style.context(styles):
+    with plt.style.context(getStyles()):
         fig, axes = plt.subplots(nrows, ncols, **style)
 
     fig.set_size_inches((4.3 / 2.54 * ncols, 2.8 / 2.54 * nrows))
@@ -45,7 +54,7 @@ def getStylishFigureAxesWithTotalCount(num: int, nrows = None, ncols = None, **a
     return fig, ax
     
 def getTwinAxis(ax, **style):
-    with plt.style.context(styles):
+    with plt.style.context(getStyles()):
         ax2 = ax.twinx()
     return ax2
 
@@ -85,7 +94,7 @@ class GenericPlotter:
         self.title_font["size"] = self.title_font.get("size", 7)
 
     def draw(self):
-        with plt.style.context(styles):
+        with plt.style.context(getStyles()):
             result = self._draw()
             
         if self.grid: